@@ -3,37 +3,149 @@
 # Third-party imports
 from flask import Flask  # Web framework
 from flask_sqlalchemy import SQLAlchemy  # Database ORM
-from flask_login import LoginManager  # User session management
+from flask_login import LoginManager, user_logged_in, user_logged_out  # User session management
 from .celery_app import make_celery  # Async task queue
-import secrets  # Secure token generation
+from .engine import install_sqlite_pragmas, sqlite_engine_options, sqlite_pragmas  # SQLite tuning
+from .sessions import SQLiteSessionInterface, load_secret_key, regenerate_session  # Shared key and session store
+import os  # Environment variable access
 
 # Initialize Flask application instance
 app = Flask(__name__)
 
 # Application configuration settings
-app.config['SECRET_KEY'] = secrets.token_hex(16)  # Generate secure random key
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///books.db'  # Database location
+app.config['SECRET_KEY'] = load_secret_key(app.instance_path)  # Same key in every worker and across restarts
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///books.db')  # Database location
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False  # Disable expensive tracking
+app.config['SQLITE_PROFILE'] = os.environ.get('SQLITE_PROFILE', 'concurrent')  # See app/engine.py
+app.config['SQLITE_PRAGMAS'] = {}  # Per-pragma overrides of the profile, e.g. {'cache_size': -64000}
+app.config['SQLITE_POOL_SIZE'] = int(os.environ.get('SQLITE_POOL_SIZE', 8))  # Connections kept open per process
+app.config['SQLITE_MAX_OVERFLOW'] = 8  # Extra connections under bursts
+app.config['SQLITE_POOL_TIMEOUT'] = 30  # Seconds to wait for a free connection
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_engine_options(app.config)
 app.config['ERROR_404_HELP'] = False
 app.config['ERROR_401_HELP'] = False
 app.url_map.strict_slashes = False
 
+# Session storage: 'cookie' (signed client-side cookie) or 'sqlite' (server-side)
+app.config['SESSION_BACKEND'] = os.environ.get('SESSION_BACKEND', 'cookie')
+app.config['SESSION_SQLITE_PATH'] = os.environ.get(  # Shared session file
+    'SESSION_SQLITE_PATH', os.path.join(app.instance_path, 'sessions.db'))
+if app.config['SESSION_BACKEND'] == 'sqlite':
+    app.session_interface = SQLiteSessionInterface(app.config['SESSION_SQLITE_PATH'])
+user_logged_in.connect(regenerate_session, app)  # New session id on every login and logout
+user_logged_out.connect(regenerate_session, app)
+
+# Password hashing (werkzeug method string; older hashes are upgraded at login)
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+app.config['PASSWORD_HASH_SALT_LENGTH'] = 16
+app.config['PASSWORD_VERIFY_CONCURRENCY'] = int(os.environ.get('PASSWORD_VERIFY_CONCURRENCY', 0))  # Verifications at once per process; 0 is unlimited
+
+# Per-process cache used by the Flask-Login user loader
+app.config['USER_CACHE_TTL'] = 30  # Seconds before a cached user is re-read
+app.config['USER_CACHE_MAX_ENTRIES'] = 10000  # LRU bound
+
+# Pagination settings for book listings
+app.config['BOOKS_PER_PAGE'] = 50  # Default page size
+app.config['BOOKS_MAX_PER_PAGE'] = 200  # Upper bound for the ?limit= parameter
+
+# Rendered books page cache (see app/services/fragments.py)
+app.config['FRAGMENT_CACHE_BACKEND'] = os.environ.get('FRAGMENT_CACHE_BACKEND', 'memory')  # 'memory' or 'sqlite'
+app.config['FRAGMENT_CACHE_PATH'] = os.path.join(app.instance_path, 'fragment_cache.db')  # Shared sqlite cache file
+app.config['FRAGMENT_CACHE_TTL'] = 3600  # Seconds an unused page or book fragment is kept
+app.config['FRAGMENT_CACHE_MAX_ENTRIES'] = 2048  # LRU bound, pages and book fragments together
+
+# Bulk import/export settings
+app.config['BULK_IMPORT_CHUNK_SIZE'] = 1000  # Rows per INSERT/commit
+app.config['BULK_IMPORT_MAX_ERRORS'] = 1000  # Row errors reported in detail
+app.config['EXPORT_BATCH_SIZE'] = 1000  # Rows read per query when exporting
+app.config['BOOKS_BATCH_MAX_ITEMS'] = 1000  # Items per PATCH/DELETE /api/books/batch request
+
+# AI recommendation client settings
+app.config['OPENAI_BASE_URL'] = os.environ.get('OPENAI_BASE_URL')  # None means api.openai.com
+app.config['AI_HTTP_MAX_CONNECTIONS'] = 20  # Connection pool size
+app.config['AI_HTTP_MAX_KEEPALIVE'] = 10  # Idle connections kept open
+app.config['AI_HTTP_KEEPALIVE_EXPIRY'] = 60  # Seconds an idle connection is kept
+app.config['AI_HTTP_TIMEOUT'] = 30.0  # Seconds per request
+app.config['AI_HTTP_CONNECT_TIMEOUT'] = 5.0  # Seconds to establish a connection
+app.config['AI_MAX_RETRIES'] = 3  # Retries on 429/5xx with exponential backoff (without a local fallback)
+app.config['AI_RECOMMENDER'] = os.environ.get('AI_RECOMMENDER', 'openai')  # 'openai' or 'local' (offline)
+app.config['AI_LOCAL_FALLBACK'] = True  # Answer from the local recommender when the upstream fails
+app.config['AI_FALLBACK_TIMEOUT'] = 10.0  # Seconds for the single upstream attempt when a fallback is available
+app.config['AI_UPSTREAM_COOLDOWN'] = 60  # Seconds to answer locally after a rate limit or outage
+app.config['AI_LOCAL_REFRESH_INTERVAL'] = 5  # Seconds between checks for changed catalogs
+
+# AI recommendation cache settings
+app.config['AI_CACHE_BACKEND'] = os.environ.get('AI_CACHE_BACKEND', 'memory')  # 'memory' or 'sqlite'
+app.config['AI_CACHE_PATH'] = os.path.join(app.instance_path, 'ai_cache.db')  # Shared sqlite cache file
+app.config['AI_CACHE_TTL'] = 3600  # Seconds a recommendation stays fresh
+app.config['AI_CACHE_MAX_ENTRIES'] = 1024  # LRU bound
+app.config['AI_SINGLEFLIGHT_LOCK_DIR'] = os.environ.get('AI_SINGLEFLIGHT_LOCK_DIR')  # Cross-process lock files (optional)
+app.config['AI_JOB_PATH'] = os.environ.get(  # Job registry shared by all worker processes
+    'AI_JOB_PATH', os.path.join(app.instance_path, 'ai_jobs.db'))
+app.config['AI_JOB_TTL'] = 600  # Seconds an identical request reuses a queued or finished job
+
+# Rate limiting (counters shared by all worker processes)
+app.config['RATELIMIT_STORAGE_URI'] = os.environ.get(  # e.g. redis://localhost:6379/1
+    'RATELIMIT_STORAGE_URI', 'sqlite:///' + os.path.join(app.instance_path, 'ratelimit.db'))
+app.config['RATELIMIT_STRATEGY'] = 'sliding-window-counter'  # Registered in app/ratelimit.py
+
+# Outgoing mail (queued in an SQLite outbox, sent in batches by the flush_outbox task)
+app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'localhost')
+app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 1025))  # Local debugging server by default
+app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', '').lower() in ('1', 'true', 'yes')
+app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME')
+app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
+app.config['MAIL_TIMEOUT'] = 10  # Seconds per SMTP command
+app.config['MAIL_DEFAULT_SENDER'] = os.environ.get(
+    'MAIL_DEFAULT_SENDER', 'Book Management System <noreply@localhost>')
+app.config['MAIL_CONTACT_RECIPIENT'] = os.environ.get('MAIL_CONTACT_RECIPIENT', 'contact@localhost')
+app.config['MAIL_OUTBOX_PATH'] = os.environ.get(  # Shared outbox file
+    'MAIL_OUTBOX_PATH', os.path.join(app.instance_path, 'mail_outbox.db'))
+app.config['MAIL_BATCH_SIZE'] = 100  # Messages claimed per batch
+app.config['MAIL_FLUSH_DELAY'] = 1  # Seconds a new message waits for others to join its batch
+app.config['MAIL_FLUSH_TIME_BUDGET'] = 50  # Seconds one flush may keep sending
+app.config['MAIL_CLAIM_LEASE'] = 300  # Seconds before messages claimed by a lost worker are retried
+app.config['MAIL_MAX_ATTEMPTS'] = 8  # Attempts before a message is marked dead
+app.config['MAIL_RETRY_BASE'] = 30  # Seconds before the first retry, doubled each attempt
+app.config['MAIL_RETRY_MAX'] = 3600  # Longest wait between attempts
+app.config['MAIL_DOMAIN_RATE_LIMIT'] = '600 per minute'  # Per recipient domain
+app.config['MAIL_DOMAIN_RATE_LIMITS'] = {}  # Overrides, e.g. {'example.com': '60 per minute'}
+app.config['MAIL_SENT_RETENTION'] = 86400  # Seconds sent messages are kept for metrics
+
+# Metrics exposed at /metrics in Prometheus text format
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+app.config['METRICS_PATH'] = os.environ.get(  # Totals shared by all processes on the host
+    'METRICS_PATH', os.path.join(app.instance_path, 'metrics.db'))
+app.config['METRICS_FLUSH_INTERVAL'] = 5  # Seconds between a process's flushes to the shared totals
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')  # Bearer token required to scrape, if set
+
+# SQL profiling for development and test runs (see app/profiling.py)
+app.config['SQL_PROFILING'] = os.environ.get('SQL_PROFILING', '').lower() in ('1', 'true', 'yes')
+app.config['SQL_SLOW_QUERY_MS'] = float(os.environ.get('SQL_SLOW_QUERY_MS', 100))  # Logged with their query plan
+app.config['SQL_N_PLUS_ONE_THRESHOLD'] = 5  # Distinct parameter sets before a repeated statement is flagged
+app.config['SQL_QUERY_BUDGET'] = 10  # Statements per request allowed by the query_budget test fixture
+
 # Celery task queue configuration
 app.config.update(
-    CELERY_BROKER_URL='redis://localhost:6379/0',  # Redis message broker
-    result_backend='redis://localhost:6379/0',  # Redis result storage
+    CELERY_BROKER_URL=os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0'),  # Redis message broker
+    result_backend=os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0'),  # Redis result storage
     broker_connection_retry_on_startup=True,  # Enable retry on startup
     broker_connection_max_retries=None,  # Retry indefinitely
     broker_connection_retry=True,  # Enable connection retry
-    broker_connection_retry_delay=5  # 5 seconds between retries
+    broker_connection_retry_delay=5,  # 5 seconds between retries
+    beat_schedule={  # Run by `celery beat`
+        'flush-mail-outbox': {'task': 'app.tasks.flush_outbox', 'schedule': 30.0},  # Retries and stragglers
+    },
 )
 
 # Initialize Flask extensions
 db = SQLAlchemy(app)  # Database handler
+with app.app_context():
+    install_sqlite_pragmas(db.engine, sqlite_pragmas(app.config))  # Applied to each new connection
 login_manager = LoginManager(app)  # User session manager
 login_manager.login_view = 'login'  # Redirect unauthorized users to login
 login_manager.login_message_category = 'info'  # Flash message category
 celery = make_celery(app)  # Task queue handler
 
 # Import routes after app initialization to avoid circular imports
-from app import routes, errors, models, api  # Register blueprints and models
\ No newline at end of file
+from app import routes, errors, models, api, migrations, metrics, profiling  # Register blueprints, models, migrations and instrumentation
\ No newline at end of file
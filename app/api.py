@@ -1,11 +1,22 @@
 # app/api.py
+import json
 from sqlite3 import IntegrityError
-from flask_restx import Api, Resource, fields, Namespace
-from flask import request
+from flask_restx import Api, Resource, fields, marshal, Namespace
+from flask import request, Response, stream_with_context
+from werkzeug.exceptions import HTTPException
 from flask_login import current_user, login_required
 from app import app, db
 from app.models.book import Book
-from app.services.ai_service import AIRecommendationService
+from app.services.ai_service import get_ai_service
+from app.services.pagination import paginate_books, parse_limit
+from app.services.search import search_books
+from app.services.serialization import BOOK_ROW_COLUMNS, encode_book_rows
+from app.services.stats import get_catalog_stats
+from app.services.batch import batch_delete, batch_update
+from app.services.bulk_import import BulkImporter, FORMATS, parse_rows, parse_year
+from app.services.catalog import as_utc, catalog_version, make_etag, not_modified, validator_headers
+from app.services.export import EXPORT_FORMATS, export_books
+from app.services.jobs import get_job, job_accepted, submit_recommendation_job, wants_job_mode
 
 api = Api(app, version='1.0', 
     title='Book Management API',
@@ -26,6 +37,55 @@ book_model = api.model('Book', {
     'user_id': fields.Integer(readonly=True, description='User ID')
 })
 
+row_error_model = api.model('RowError', {
+    'row': fields.Integer(description='Row number in the upload (1-based, header excluded)'),
+    'error': fields.String(description='Why the row was rejected')
+})
+
+bulk_import_report = api.model('BulkImportReport', {
+    'created': fields.Integer(description='Number of books created'),
+    'failed': fields.Integer(description='Number of rejected rows'),
+    'errors': fields.List(fields.Nested(row_error_model)),
+    'errors_truncated': fields.Boolean(description='True when not every failed row is listed')
+})
+
+stat_group_model = api.model('StatGroup', {
+    'value': fields.String(description='Genre, author or decade (null when not set)'),
+    'count': fields.Integer(description='Number of books in the group')
+})
+
+catalog_stats_model = api.model('CatalogStats', {
+    'total': fields.Integer(description='Number of books'),
+    'by_genre': fields.List(fields.Nested(stat_group_model)),
+    'by_author': fields.List(fields.Nested(stat_group_model)),
+    'by_decade': fields.List(fields.Nested(stat_group_model), description='Decades such as "1990s"'),
+    'recent': fields.List(fields.Nested(book_model), description='Most recently added books')
+})
+
+batch_update_request = api.model('BatchUpdateRequest', {
+    'books': fields.List(fields.Raw, required=True,
+                         description='Changes: objects with an id and the fields to update',
+                         example=[{'id': 1, 'genre': 'Fantasy'}, {'id': 2, 'year': 1999}])
+})
+
+batch_delete_request = api.model('BatchDeleteRequest', {
+    'ids': fields.List(fields.Integer, required=True, description='Ids of the books to delete',
+                       example=[1, 2, 3])
+})
+
+batch_item_result = api.model('BatchItemResult', {
+    'id': fields.Integer(description='Book id from the request'),
+    'success': fields.Boolean(description='Whether the change was applied'),
+    'status': fields.Integer(description='HTTP status the single-item endpoint would return'),
+    'error': fields.String(description='Why the item was rejected')
+})
+
+batch_report = api.model('BatchReport', {
+    'succeeded': fields.Integer(description='Number of items applied'),
+    'failed': fields.Integer(description='Number of rejected items'),
+    'results': fields.List(fields.Nested(batch_item_result), description='One entry per item, in request order')
+})
+
 preference_model = api.model('Preferences', {
     'genres': fields.List(fields.String, description='List of preferred book genres', 
                          example=['fantasy', 'science fiction']),
@@ -46,14 +106,56 @@ recommendation_response = api.model('RecommendationResponse', {
     'message': fields.String(description='Response message')
 })
 
+job_accepted_model = api.model('JobAccepted', {
+    'success': fields.Boolean(description='Operation success status'),
+    'job_id': fields.String(description='Job identifier'),
+    'status': fields.String(description='Job status'),
+    'status_url': fields.String(description='URL to poll for the result')
+})
+
+job_model = api.model('RecommendationJob', {
+    'job_id': fields.String(description='Job identifier'),
+    'status': fields.String(description='pending, running, done or failed'),
+    'recommendations': fields.List(fields.Nested(recommendation_model), skip_none=True),
+    'message': fields.String(description='Failure reason')
+})
+
 @books_ns.route('/')
 class BookList(Resource):
-    @books_ns.doc('list_books')
-    @books_ns.marshal_list_with(book_model)
+    @books_ns.doc('list_books', params={
+        'cursor': 'Opaque cursor from the X-Next-Cursor header of the previous page',
+        'limit': 'Page size (capped by BOOKS_MAX_PER_PAGE)'
+    })
+    @books_ns.response(200, 'Success', [book_model])
+    @books_ns.response(304, 'Not modified since the ETag in If-None-Match')
     @login_required
     def get(self):
-        """List all books"""
-        return Book.query.filter_by(user_id=current_user.id).all()
+        """List books one page at a time"""
+        cursor = request.args.get('cursor')
+        try:
+            limit = parse_limit(request.args.get('limit'))
+        except ValueError as e:
+            api.abort(400, str(e))
+
+        # Answer unchanged polls from the version counter, before loading the page
+        version, modified_at = catalog_version(current_user.id)
+        etag = make_etag('books', current_user.id, version, cursor, limit)
+        unchanged = not_modified(etag, modified_at)
+        if unchanged:
+            return unchanged
+
+        try:
+            # Column tuples, encoded directly: no ORM objects, no per-field marshalling
+            rows, next_cursor = paginate_books(current_user.id, cursor, limit, columns=BOOK_ROW_COLUMNS)
+        except ValueError as e:
+            api.abort(400, str(e))
+
+        headers = validator_headers(etag, modified_at)
+        if next_cursor:
+            # Hand the continuation to the client without changing the list payload
+            headers['X-Next-Cursor'] = next_cursor
+            headers['Link'] = f'<{request.base_url}?cursor={next_cursor}&limit={limit}>; rel="next"'
+        return Response(encode_book_rows(rows), mimetype='application/json', headers=headers)
 
     @books_ns.doc('create_book')
     @books_ns.expect(book_model)
@@ -62,6 +164,10 @@ class BookList(Resource):
     def post(self):
         """Create a new book"""
         data = request.json
+        try:
+            year = parse_year(data['year'])
+        except ValueError as e:
+            api.abort(400, str(e))
         # Check for existing ISBN for the current user
         existing_book = Book.query.filter_by(isbn=data['isbn'], user_id=current_user.id).first()
         if existing_book:
@@ -70,7 +176,7 @@ class BookList(Resource):
             title=data['title'],
             author=data['author'],
             isbn=data['isbn'],
-            year=data['year'],
+            year=year,
             genre=data.get('genre', ''),
             user_id=current_user.id
         )
@@ -78,18 +184,128 @@ class BookList(Resource):
         db.session.commit()
         return book, 201
 
+@books_ns.route('/search')
+class BookSearch(Resource):
+    @books_ns.doc('search_books', params={
+        'q': 'Words to match in title, author or genre (prefixes allowed)',
+        'limit': 'Maximum number of results (capped by BOOKS_MAX_PER_PAGE)'
+    })
+    @books_ns.marshal_list_with(book_model)
+    @login_required
+    def get(self):
+        """Search books by title, author or genre"""
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            return search_books(current_user.id, request.args.get('q', ''), limit)
+        except ValueError as e:
+            api.abort(400, str(e))
+
+@books_ns.route('/bulk')
+class BookBulkImport(Resource):
+    @books_ns.doc('bulk_import_books', description=
+        'Stream a text/csv (header: title,author,isbn,year,genre) or '
+        'application/x-ndjson body; rows are committed in chunks.')
+    @books_ns.response(200, 'Import report', bulk_import_report)
+    @books_ns.response(415, 'Unsupported content type')
+    @login_required
+    def post(self):
+        """Import many books from a CSV or NDJSON upload"""
+        fmt = FORMATS.get(request.mimetype)
+        if not fmt:
+            api.abort(415, f"Content-Type must be one of: {', '.join(FORMATS)}")
+        return BulkImporter(current_user.id).run(parse_rows(request.stream, fmt))
+
+@books_ns.route('/export')
+class BookExport(Resource):
+    @books_ns.doc('export_books', params={
+        'format': 'ndjson (default) or csv'
+    }, description='Streams the whole catalog; gzip-encoded when the client accepts it.')
+    @books_ns.response(200, 'Catalog stream')
+    @login_required
+    def get(self):
+        """Download the current user's whole catalog"""
+        fmt = request.args.get('format', 'ndjson')
+        if fmt not in EXPORT_FORMATS:
+            api.abort(400, f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+        mimetype, extension = EXPORT_FORMATS[fmt]
+        compress = request.accept_encodings['gzip'] > 0  # gzip;q=0 refuses it
+
+        body = export_books(current_user.id, fmt, compress)
+        response = Response(stream_with_context(body), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename=books.{extension}'
+        response.headers['Vary'] = 'Accept-Encoding'
+        if compress:
+            response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+@books_ns.route('/stats')
+class BookStats(Resource):
+    @books_ns.doc('book_stats', params={'recent': 'Number of recent additions to include (default 5)'})
+    @books_ns.response(200, 'Success', catalog_stats_model)
+    @books_ns.response(304, 'Not modified since the ETag in If-None-Match')
+    @login_required
+    def get(self):
+        """Catalog totals by genre, author and decade"""
+        try:
+            recent = min(max(int(request.args.get('recent', 5)), 0), app.config['BOOKS_MAX_PER_PAGE'])
+        except ValueError:
+            api.abort(400, 'recent must be an integer')
+
+        version, modified_at = catalog_version(current_user.id)
+        etag = make_etag('stats', current_user.id, version, recent)
+        unchanged = not_modified(etag, modified_at)
+        if unchanged:
+            return unchanged
+        stats = get_catalog_stats(current_user.id, recent)
+        return marshal(stats, catalog_stats_model), 200, validator_headers(etag, modified_at)
+
+def batch_items(key: str) -> list:
+    """The list under `key` in a JSON batch body, or abort with 400"""
+    data = request.get_json(silent=True)
+    items = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        api.abort(400, f'Request body must be a JSON object with a non-empty "{key}" list')
+    if len(items) > app.config['BOOKS_BATCH_MAX_ITEMS']:
+        api.abort(400, f"A batch can hold at most {app.config['BOOKS_BATCH_MAX_ITEMS']} items")
+    return items
+
+@books_ns.route('/batch')
+class BookBatch(Resource):
+    @books_ns.doc('batch_update_books')
+    @books_ns.expect(batch_update_request)
+    @books_ns.marshal_with(batch_report)
+    @login_required
+    def patch(self):
+        """Update many books in one transaction"""
+        return batch_update(current_user.id, batch_items('books'))
+
+    @books_ns.doc('batch_delete_books')
+    @books_ns.expect(batch_delete_request)
+    @books_ns.marshal_with(batch_report)
+    @login_required
+    def delete(self):
+        """Delete many books in one transaction"""
+        return batch_delete(current_user.id, batch_items('ids'))
+
 @books_ns.route('/<int:id>')
 @books_ns.response(404, 'Book not found')
 class BookItem(Resource):
     @books_ns.doc('get_book')
-    @books_ns.marshal_with(book_model)
+    @books_ns.response(200, 'Success', book_model)
+    @books_ns.response(304, 'Not modified since the ETag in If-None-Match')
     @login_required
     def get(self, id):
         """Get a book by ID"""
         book = Book.query.get_or_404(id)
         if book.user_id != current_user.id:
             api.abort(403, 'Not authorized to access this book.')
-        return book
+
+        modified_at = as_utc(book.updated_at or book.created_at)
+        etag = make_etag('book', book.id, modified_at.isoformat() if modified_at else '')
+        unchanged = not_modified(etag, modified_at)
+        if unchanged:
+            return unchanged
+        return marshal(book, book_model), 200, validator_headers(etag, modified_at)
     
     @books_ns.expect(book_model)
     @books_ns.marshal_with(book_model)
@@ -101,7 +317,11 @@ class BookItem(Resource):
             api.abort(403, "Not authorized to update this book.")
 
         data = request.json
-        
+        try:
+            year = parse_year(data['year'])
+        except ValueError as e:
+            api.abort(400, str(e))
+
         # Check if ISBN changed and already exists for the current user
         if data['isbn'] != book.isbn:
             existing_book = Book.query.filter_by(isbn=data['isbn'], user_id=current_user.id).first()
@@ -112,7 +332,7 @@ class BookItem(Resource):
             book.title = data['title']
             book.author = data['author']
             book.isbn = data['isbn']
-            book.year = data['year']
+            book.year = year
             book.genre = data.get('genre', '')
             db.session.commit()
             return book
@@ -132,40 +352,101 @@ class BookItem(Resource):
         db.session.commit()
         return '', 204
 
+def recommendation_preferences() -> dict:
+    """The validated preferences from a recommendation request, or abort with 400"""
+    if not request.is_json:
+        api.abort(400, "Request must be JSON")
+
+    data = request.json
+
+    if not isinstance(data.get('genres', []), list) or \
+       not isinstance(data.get('authors', []), list):
+        api.abort(400, "genres and authors must be arrays")
+
+    if not data.get('genres') and not data.get('authors'):
+        api.abort(400, "At least one genre or author required")
+    return data
+
+def recommendation_events(books, sse: bool):
+    """Encode streamed recommendations as SSE events or NDJSON lines"""
+    count = 0
+    try:
+        for book in books:
+            count += 1
+            payload = json.dumps(marshal(book, recommendation_model))
+            yield f'event: recommendation\ndata: {payload}\n\n' if sse else payload + '\n'
+        done = json.dumps({'done': True, 'count': count})
+        yield f'event: done\ndata: {done}\n\n' if sse else done + '\n'
+    except Exception as e:
+        app.logger.error(f"Recommendation stream failed: {str(e)}")
+        error = json.dumps({'error': str(e), 'count': count})
+        yield f'event: error\ndata: {error}\n\n' if sse else error + '\n'
+
 @ai_ns.route('/book-recommendation')
 class BookRecommendation(Resource):
     @ai_ns.doc('get_recommendations',
+        params={'async': 'Set to true to run as a background job and poll /api/ai/jobs/<id>'},
         responses={
             200: ('Success', recommendation_response),
+            202: ('Job accepted', job_accepted_model),
             400: 'Validation Error',
             401: 'Unauthorized',
             429: 'Too Many Requests',
             500: 'Server Error'
         })
     @ai_ns.expect(preference_model)
-    @ai_ns.marshal_with(recommendation_response)
     @login_required
     def post(self):
         """Get AI-powered book recommendations based on user preferences"""
         try:
-            if not request.is_json:
-                api.abort(400, "Request must be JSON")
+            data = recommendation_preferences()
 
-            data = request.json
-            
-            if not isinstance(data.get('genres', []), list) or \
-               not isinstance(data.get('authors', []), list):
-                api.abort(400, "genres and authors must be arrays")
-                
-            if not data.get('genres') and not data.get('authors'):
-                api.abort(400, "At least one genre or author required")
-
-            recommendations = AIRecommendationService().get_recommendations(data)
+            if wants_job_mode(request.args):
+                accepted = job_accepted(submit_recommendation_job(data, current_user.id))
+                return accepted, 202, {'Location': accepted['status_url']}
+
+            recommendations = get_ai_service().get_recommendations(data)
             
-            return {
+            return marshal({
                 'success': True,
                 'recommendations': recommendations,
                 'message': f'Generated {len(recommendations)} recommendations'
-            }
+            }, recommendation_response)
+        except HTTPException:
+            raise
         except Exception as e:
-            api.abort(500, str(e))
\ No newline at end of file
+            api.abort(500, str(e))
+
+@ai_ns.route('/book-recommendation/stream')
+class BookRecommendationStream(Resource):
+    @ai_ns.doc('stream_recommendations', description=
+        'Sends each recommendation as soon as the model has produced it: Server-Sent Events '
+        '(event: recommendation / done / error) when the client accepts text/event-stream, '
+        'otherwise NDJSON lines ending with {"done": true, "count": n} or {"error": ...}.')
+    @ai_ns.expect(preference_model)
+    @ai_ns.response(200, 'Recommendation stream')
+    @login_required
+    def post(self):
+        """Stream AI-powered book recommendations as they are generated"""
+        data = recommendation_preferences()
+        sse = request.accept_mimetypes.best_match(
+            ['application/x-ndjson', 'text/event-stream']) == 'text/event-stream'
+        books = get_ai_service().stream_recommendations(data)
+        response = Response(stream_with_context(recommendation_events(books, sse)),
+                            mimetype='text/event-stream' if sse else 'application/x-ndjson')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'  # Stop proxies from holding back events
+        return response
+
+@ai_ns.route('/jobs/<string:job_id>')
+@ai_ns.response(404, 'Job not found')
+class RecommendationJob(Resource):
+    @ai_ns.doc('get_recommendation_job')
+    @ai_ns.marshal_with(job_model, skip_none=True)
+    @login_required
+    def get(self, job_id):
+        """Poll a background recommendation job"""
+        job = get_job(job_id, current_user.id)
+        if job is None:
+            api.abort(404, 'Job not found.')
+        return job
\ No newline at end of file
@@ -16,11 +16,11 @@ def make_celery(app: Flask) -> Celery:
     Returns:
         Configured Celery instance
     """
-    # Initialize Celery with Redis backend/broker
+    # Initialize Celery with the configured backend/broker (Redis by default)
     celery = Celery(
         app.import_name,  # Use Flask app name
-        backend='redis://localhost:6379/0',  # Results storage
-        broker='redis://localhost:6379/0'  # Message broker
+        backend=app.config['result_backend'],  # Results storage
+        broker=app.config['CELERY_BROKER_URL']  # Message broker
     )
 
     # Update Celery config from Flask config
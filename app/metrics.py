@@ -0,0 +1,346 @@
+# app/metrics.py - Request, SQL and task metrics in Prometheus text format
+# Flask hooks time every request, SQLAlchemy cursor events count and time
+# queries, and Celery signals time tasks. Observations go into in-process
+# counters and histograms (a dict update under a lock, a few microseconds).
+# Every METRICS_FLUSH_INTERVAL seconds a process adds what it recorded since
+# its last flush to shared totals in an SQLite file, so /metrics reports the
+# sum over all web and worker processes on the host. Forked children start
+# from zero so nothing inherited from the parent is counted twice.
+
+# Standard library imports
+import bisect  # Histogram bucket lookup
+import json  # Label serialization
+import os  # Fork handling, storage directory
+import sqlite3  # Shared totals
+import threading  # Locks and per-thread state
+import time  # Timing
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple  # Type hints
+
+# Third-party imports
+from celery.signals import task_postrun, task_prerun  # Task hooks
+from flask import request  # Route labels
+from sqlalchemy import event  # Query hooks
+
+# Local imports
+from app import app, db
+from app.services.mail import get_outbox  # Outbox gauges
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+LabelValues = Tuple[str, ...]
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self) -> Iterable[Tuple[str, List[Tuple[str, str]], float]]:
+        with self._lock:
+            values = dict(self._values)
+        for labelvalues, value in values.items():
+            yield self.name, list(zip(self.labels, labelvalues)), value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(Counter):
+    """Distribution over fixed buckets (upper bounds, le semantics)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)  # First bucket with value <= bound
+        with self._lock:
+            series = self._values.get(labelvalues)
+            if series is None:
+                series = self._values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self) -> Iterable[Tuple[str, List[Tuple[str, str]], float]]:
+        with self._lock:
+            values = {key: list(series) for key, series in self._values.items()}
+        bounds = [format_value(bound) for bound in self.buckets] + ['+Inf']
+        for labelvalues, series in values.items():
+            labels = list(zip(self.labels, labelvalues))
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                yield f'{self.name}_bucket', labels + [('le', bound)], cumulative
+            yield f'{self.name}_sum', labels, series[-1]
+            yield f'{self.name}_count', labels, cumulative
+
+
+class MetricsRegistry:
+    """In-process metrics plus the shared SQLite totals they are flushed into"""
+
+    def __init__(self, path: str, flush_interval: float = 5):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._metrics: Dict[str, Counter] = {}
+        self._flushed: Dict[Tuple[str, str], float] = {}  # (sample, labels) -> value at last flush
+        self._flushed_at = time.monotonic()
+        self._flush_lock = threading.Lock()
+        self._local = threading.local()
+        self._collectors: List[Callable[[], Iterable[Tuple]]] = []
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute("""CREATE TABLE IF NOT EXISTS metric_families (
+            name TEXT PRIMARY KEY, kind TEXT NOT NULL, help TEXT NOT NULL)""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS metric_samples (
+            family TEXT NOT NULL, sample TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL,
+            PRIMARY KEY (family, sample, labels)) WITHOUT ROWID""")
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _after_fork(self) -> None:
+        """Drop what the parent recorded and its SQLite connection"""
+        for metric in self._metrics.values():
+            metric.reset()
+        self._flushed = {}
+        self._local = threading.local()
+        self._flush_lock = threading.Lock()
+
+    # Definitions
+    def _register(self, metric: Counter) -> Counter:
+        self._metrics[metric.name] = metric
+        self._connection().execute("""
+            INSERT INTO metric_families (name, kind, help) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET kind = excluded.kind, help = excluded.help""",
+            (metric.name, metric.kind, metric.help))
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def collector(self, fn: Callable[[], Iterable[Tuple]]) -> Callable:
+        """Register fn() -> [(name, kind, help, [(labels, value), ...])], evaluated
+        at scrape time for values that are already shared (e.g. queue depth)"""
+        self._collectors.append(fn)
+        return fn
+
+    # Sharing
+    def flush(self) -> None:
+        """Add everything recorded since the last flush to the shared totals"""
+        with self._flush_lock:
+            self._flushed_at = time.monotonic()
+            current, deltas = {}, []
+            for metric in self._metrics.values():
+                for sample, labels, value in metric.samples():
+                    key = (sample, json.dumps(labels))
+                    current[key] = value
+                    delta = value - self._flushed.get(key, 0)
+                    if delta:
+                        deltas.append((metric.name, sample, key[1], delta))
+            if deltas:
+                conn = self._connection()
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    conn.executemany("""
+                        INSERT INTO metric_samples (family, sample, labels, value) VALUES (?, ?, ?, ?)
+                        ON CONFLICT (family, sample, labels) DO UPDATE SET value = value + excluded.value""",
+                        deltas)
+                    conn.execute('COMMIT')
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+            self._flushed = current
+
+    def maybe_flush(self) -> None:
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def clear(self) -> None:
+        """Forget all recorded values, locally and in the shared totals"""
+        with self._flush_lock:
+            for metric in self._metrics.values():
+                metric.reset()
+            self._flushed = {}
+            self._connection().execute('DELETE FROM metric_samples')
+
+    # Exposition
+    def render(self) -> str:
+        """All processes' totals plus collector values in Prometheus text format 0.0.4"""
+        self.flush()
+        conn = self._connection()
+        families = {name: (kind, help) for name, kind, help in conn.execute(
+            'SELECT name, kind, help FROM metric_families')}
+        samples: Dict[str, List[Tuple[str, List, float]]] = {}
+        for family, sample, labels, value in conn.execute(
+                'SELECT family, sample, labels, value FROM metric_samples'):
+            samples.setdefault(family, []).append((sample, json.loads(labels), value))
+        for fn in self._collectors:
+            for name, kind, help, series in fn():
+                families[name] = (kind, help)
+                samples[name] = [(name, list(labels.items()), value) for labels, value in series]
+
+        lines = []
+        for name in sorted(samples):
+            kind, help = families.get(name, ('untyped', ''))
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for sample, labels, value in sorted(samples[name], key=sample_order):
+                lines.append(f'{sample}{format_labels(labels)} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+SUFFIX_ORDER = {'_bucket': 0, '_sum': 1, '_count': 2}
+
+
+def sample_order(item: Tuple[str, List, float]):
+    """Series together, then buckets by bound, _sum and _count"""
+    sample, labels, _ = item
+    series = [pair for pair in labels if pair[0] != 'le']
+    suffix = SUFFIX_ORDER.get(sample[sample.rfind('_'):], 0)
+    le = next((float(value) for key, value in labels if key == 'le'), 0.0)
+    return series, suffix, le
+
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labels: List) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in labels) + '}'
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# Application metrics
+registry = MetricsRegistry(app.config['METRICS_PATH'], app.config['METRICS_FLUSH_INTERVAL'])
+
+http_requests = registry.counter(
+    'http_requests_total', 'HTTP requests by route, method and status.', ('method', 'route', 'status'))
+http_latency = registry.histogram(
+    'http_request_duration_seconds', 'Time to produce a response, by route.', ('method', 'route'))
+http_queries = registry.histogram(
+    'http_request_db_queries', 'SQL statements executed per request, by route.', ('method', 'route'),
+    buckets=COUNT_BUCKETS)
+db_queries = registry.histogram(
+    'db_query_duration_seconds', 'SQL statement execution time by statement type.', ('operation',),
+    buckets=QUERY_BUCKETS)
+task_runs = registry.counter(
+    'celery_tasks_total', 'Celery task runs by task and final state.', ('task', 'state'))
+task_latency = registry.histogram(
+    'celery_task_duration_seconds', 'Celery task run time by task.', ('task',), buckets=TASK_BUCKETS)
+user_loads = registry.counter(
+    'user_loader_lookups_total',
+    'Flask-Login user loads by source: cache (database query saved) or query.', ('source',))
+ai_upstream_calls = registry.counter(
+    'ai_upstream_calls_total', 'Recommendation calls sent to the upstream model API.')
+ai_upstream_calls_saved = registry.counter(
+    'ai_upstream_calls_saved_total',
+    'Recommendation requests answered without an upstream call, by reason (cache, coalesced, local).',
+    ('reason',))
+
+_state = threading.local()  # Per-thread request start time and query count
+_task_started: Dict[str, float] = {}
+OPERATIONS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'}
+
+
+# Flask hooks (the start hook runs before any other, including the rate limiter)
+def _start_request() -> None:
+    _state.started = time.perf_counter()
+    _state.queries = 0
+
+
+def _finish_request(response):
+    started = getattr(_state, 'started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    _state.started = None
+    method = request.method
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    http_requests.inc(method, route, str(response.status_code))
+    http_latency.observe(elapsed, method, route)
+    http_queries.observe(_state.queries, method, route)
+    registry.maybe_flush()
+    return response
+
+
+# SQLAlchemy hooks (the start time rides on the execution context, so failed
+# statements leave nothing behind)
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = context._metrics_started
+    operation = statement.lstrip()[:6].upper()
+    db_queries.observe(time.perf_counter() - started, operation if operation in OPERATIONS else 'OTHER')
+    if getattr(_state, 'started', None) is not None:
+        _state.queries += 1
+
+
+# Celery hooks
+def _task_prerun(task_id=None, **kwargs) -> None:
+    _task_started[task_id] = time.perf_counter()
+
+
+def _task_postrun(task_id=None, task=None, state=None, **kwargs) -> None:
+    started = _task_started.pop(task_id, None)
+    task_runs.inc(task.name, state or 'UNKNOWN')
+    if started is not None:
+        task_latency.observe(time.perf_counter() - started, task.name)
+    registry.maybe_flush()
+
+
+@registry.collector
+def _outbox_metrics():
+    """Outbox depth and delivery totals (already shared through the outbox file)"""
+    stats = get_outbox().metrics()
+    yield ('mail_outbox_messages', 'gauge', 'Messages in the mail outbox by state.',
+           [({'state': state}, stats[state]) for state in ('queued', 'waiting', 'in_flight', 'dead')])
+    yield ('mail_outbox_oldest_queued_seconds', 'gauge', 'Age of the oldest undelivered message.',
+           [({}, stats['oldest_queued_seconds'])])
+    yield ('mail_messages_total', 'counter', 'Mail delivery outcomes.',
+           [({'result': name[:-len('_total')]}, stats[name])
+            for name in ('sent_total', 'retried_total', 'dead_total', 'deferred_total')])
+
+
+if app.config['METRICS_ENABLED']:
+    app.before_request_funcs.setdefault(None, []).insert(0, _start_request)
+    app.after_request(_finish_request)
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+    task_prerun.connect(_task_prerun)
+    task_postrun.connect(_task_postrun)
@@ -0,0 +1,170 @@
+# app/migrations.py - Versioned schema migrations for the SQLite database
+# The applied version is stored in SQLite's PRAGMA user_version. Migrations are
+# idempotent so they can run against databases created by db.create_all() as
+# well as older databases such as instance/books.db.
+
+# Standard library imports
+from typing import Callable, Dict, List, Tuple  # Type hints
+
+# Third-party imports
+import click  # CLI output
+from sqlalchemy import event  # Schema lifecycle hooks
+from sqlalchemy.engine import Connection  # Type hint for migration steps
+
+# Local imports
+from app import app, db  # Flask app and database
+from app.services.catalog import install_catalog_version, drop_catalog_version  # Version counters
+from app.services.search import install_fts, drop_fts  # Full-text index DDL
+from app.services.stats import install_book_stats, drop_book_stats, rebuild_book_stats  # Stats counters
+
+
+# Migration steps
+def _add_book_indexes(conn: Connection) -> None:
+    """Composite indexes for per-user listing, ISBN checks and filters"""
+    for name, columns in [
+        ('ix_book_user_created', 'user_id, created_at, id'),
+        ('ix_book_user_isbn', 'user_id, isbn'),
+        ('ix_book_user_author', 'user_id, author'),
+        ('ix_book_user_genre', 'user_id, genre'),
+    ]:
+        conn.exec_driver_sql(f'CREATE INDEX IF NOT EXISTS {name} ON book ({columns})')
+
+
+def _add_book_updated_at(conn: Connection) -> None:
+    """updated_at column, backfilled from created_at"""
+    columns = {row[1] for row in conn.exec_driver_sql('PRAGMA table_info(book)')}
+    if 'updated_at' not in columns:  # create_all() already includes it
+        conn.exec_driver_sql('ALTER TABLE book ADD COLUMN updated_at DATETIME')
+    conn.exec_driver_sql('UPDATE book SET updated_at = created_at WHERE updated_at IS NULL')
+
+
+def _require_book_created_at(conn: Connection) -> None:
+    """created_at backfilled and kept NOT NULL, since keyset pagination and
+    export order by it (SQLite cannot add NOT NULL to an existing column)"""
+    conn.exec_driver_sql(
+        "UPDATE book SET created_at = COALESCE(updated_at, strftime('%Y-%m-%d %H:%M:%S.000000', 'now')) "
+        "WHERE created_at IS NULL")
+    for event_name in ('INSERT', 'UPDATE'):
+        conn.exec_driver_sql(
+            f'CREATE TRIGGER IF NOT EXISTS book_created_at_{event_name.lower()} '
+            f'BEFORE {event_name} ON book WHEN NEW.created_at IS NULL '
+            "BEGIN SELECT RAISE(ABORT, 'NOT NULL constraint failed: book.created_at'); END")
+
+
+# Ordered list of (version, description, step). Append only; never renumber.
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, 'composite indexes on book', _add_book_indexes),
+    (2, 'full-text search index on book', install_fts),
+    (3, 'updated_at on book', _add_book_updated_at),
+    (4, 'per-user catalog version counters', install_catalog_version),
+    (5, 'per-user catalog statistics', install_book_stats),
+    (6, 'created_at required on book', _require_book_created_at),
+]
+
+
+def current_version(conn: Connection) -> int:
+    """Return the schema version recorded in the database"""
+    return conn.exec_driver_sql('PRAGMA user_version').scalar()
+
+
+def upgrade(conn: Connection) -> List[int]:
+    """Apply all pending migrations on an open connection"""
+    applied = []
+    version = current_version(conn)
+    for target, description, step in MIGRATIONS:
+        if target <= version:
+            continue
+        app.logger.info(f"Applying migration {target}: {description}")
+        step(conn)
+        conn.exec_driver_sql(f'PRAGMA user_version = {target}')  # Record progress
+        applied.append(target)
+    return applied
+
+
+def upgrade_database() -> List[int]:
+    """Apply pending migrations to the application database"""
+    with db.engine.begin() as conn:
+        return upgrade(conn)
+
+
+# Keep freshly created and dropped schemas in step with the migration history
+@event.listens_for(db.metadata, 'after_create')
+def _upgrade_after_create(target, connection, **kw) -> None:
+    upgrade(connection)
+
+
+@event.listens_for(db.metadata, 'after_drop')
+def _reset_after_drop(target, connection, **kw) -> None:
+    drop_fts(connection)  # Not part of the metadata, so drop_all leaves these behind
+    drop_catalog_version(connection)
+    drop_book_stats(connection)
+    connection.exec_driver_sql('PRAGMA user_version = 0')
+
+
+# Hot queries and the parameters used to plan them
+HOT_QUERIES: Dict[str, Tuple[str, tuple]] = {
+    'list_first_page': (
+        'SELECT * FROM book WHERE user_id = ? ORDER BY created_at, id LIMIT ?',
+        (1, 51)),
+    'list_next_page': (
+        'SELECT * FROM book WHERE user_id = ? AND (created_at, id) > (?, ?) '
+        'ORDER BY created_at, id LIMIT ?',
+        (1, '2024-01-01 00:00:00.000000', 1, 51)),
+    'isbn_duplicate_check': (
+        'SELECT * FROM book WHERE isbn = ? AND user_id = ? LIMIT 1',
+        ('9780000000000', 1)),
+    'filter_by_author': (
+        'SELECT * FROM book WHERE user_id = ? AND author = ?',
+        (1, 'Author')),
+    'filter_by_genre': (
+        'SELECT * FROM book WHERE user_id = ? AND genre = ?',
+        (1, 'Fiction')),
+}
+
+
+def explain_hot_queries(conn: Connection) -> Dict[str, List[str]]:
+    """Return the EXPLAIN QUERY PLAN details for each hot query"""
+    return {
+        name: [row[-1] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}', params)]
+        for name, (sql, params) in HOT_QUERIES.items()
+    }
+
+
+def uses_index(plan: List[str]) -> bool:
+    """True when a plan seeks through an index and needs no sort step"""
+    return (any('USING' in step and 'INDEX' in step for step in plan)
+            and not any(step.startswith('SCAN book') and 'INDEX' not in step for step in plan)
+            and not any('TEMP B-TREE' in step for step in plan))
+
+
+def unindexed_hot_queries(conn: Connection) -> List[str]:
+    """Names of hot queries that fall back to a table scan or a sort"""
+    return [name for name, plan in explain_hot_queries(conn).items() if not uses_index(plan)]
+
+
+# Command line entry points
+@app.cli.command('db-upgrade')
+def db_upgrade_command() -> None:
+    """Apply pending schema migrations."""
+    applied = upgrade_database()
+    click.echo(f"Applied migrations: {applied}" if applied else "Database is up to date.")
+
+
+@app.cli.command('db-check-indexes')
+def db_check_indexes_command() -> None:
+    """Verify that every hot query is served by an index."""
+    with db.engine.connect() as conn:
+        for name, plan in explain_hot_queries(conn).items():
+            status = 'ok' if uses_index(plan) else 'SCAN'
+            click.echo(f"{status:4}  {name}: {' | '.join(plan)}")
+        if unindexed_hot_queries(conn):
+            raise click.ClickException("Some hot queries are not using an index")
+
+
+@app.cli.command('db-rebuild-stats')
+@click.option('--user-id', type=int, help='Only rebuild this user\'s counters.')
+def db_rebuild_stats_command(user_id) -> None:
+    """Recount the catalog statistics from the book table."""
+    with db.engine.begin() as conn:
+        rebuild_book_stats(conn, user_id)
+    click.echo(f"Rebuilt statistics for user {user_id}." if user_id else "Rebuilt statistics for all users.")
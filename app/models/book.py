@@ -4,6 +4,16 @@ from datetime import datetime, timezone
 from typing import Dict, Optional
 
 class Book(db.Model):
+    # Composite indexes for the per-user hot queries (listing, duplicate
+    # ISBN checks, author/genre filters). Existing databases receive them
+    # through app/migrations.py.
+    __table_args__ = (
+        db.Index('ix_book_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_book_user_isbn', 'user_id', 'isbn'),
+        db.Index('ix_book_user_author', 'user_id', 'author'),
+        db.Index('ix_book_user_genre', 'user_id', 'genre'),
+    )
+
     # Primary key
     id = db.Column(db.Integer, primary_key=True)
     
@@ -17,10 +27,16 @@ class Book(db.Model):
     genre = db.Column(db.String(50))
     
     # Metadata
-    created_at = db.Column(
-        db.DateTime, 
+    created_at = db.Column(  # Keyset pagination key, so never NULL
+        db.DateTime,
+        nullable=False,
         default=lambda: datetime.now(timezone.utc)
     )
+    updated_at = db.Column(  # Drives item ETags and Last-Modified
+        db.DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc)
+    )
     
     # Relationships
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -39,5 +55,6 @@ class Book(db.Model):
             'isbn': self.isbn,
             'genre': self.genre,
             'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'user_id': self.user_id
         }
\ No newline at end of file
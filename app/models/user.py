@@ -1,16 +1,40 @@
 # app/models/user.py
 
 # External imports
-from app import db, login_manager  # Database and login management
+from app import app, db, login_manager  # Database and login management
 from flask_login import UserMixin  # User authentication mixin
-from werkzeug.security import generate_password_hash, check_password_hash  # Password hashing
+from sqlalchemy import event  # Cache invalidation hooks
+from sqlalchemy.orm import make_transient_to_detached  # Rebuild users without a query
+from app.services.passwords import hash_password, needs_rehash, verify_password  # Password hashing
 from typing import Optional, List  # Type hints
+from app.services.cache import MemoryCache  # Per-process user cache
+from app.metrics import user_loads  # Shared counts of saved user queries
+
+# Column snapshots of recently loaded users, keyed by id. Each worker keeps its
+# own copy; the short TTL bounds how long another worker's edits go unseen.
+user_cache = MemoryCache(
+    default_ttl=app.config['USER_CACHE_TTL'],
+    max_entries=app.config['USER_CACHE_MAX_ENTRIES']
+)
 
 # User loader for Flask-Login
 @login_manager.user_loader
 def load_user(id: int) -> Optional['User']:
-    """Load user by ID for Flask-Login."""
-    return User.query.get(int(id))
+    """Load user by ID for Flask-Login, skipping the query on cache hits."""
+    user_id = int(id)
+    snapshot = user_cache.get(user_id)
+    if snapshot is None:
+        user_loads.inc('query')
+        user = db.session.get(User, user_id)
+        if user is not None:
+            user_cache.set(user_id, {c.key: getattr(user, c.key) for c in User.__table__.columns})
+        return user
+
+    user_loads.inc('cache')
+    # Attach a rebuilt instance to the session as if it had just been loaded
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
 
 # User model definition
 class User(UserMixin, db.Model):
@@ -20,7 +44,7 @@ class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)  # Primary key
     username = db.Column(db.String(64), unique=True, nullable=False)  # Unique username
     email = db.Column(db.String(120), unique=True, nullable=False)  # Unique email
-    password_hash = db.Column(db.String(128))  # Hashed password storage
+    password_hash = db.Column(db.String(256))  # Hashed password storage (scrypt hashes exceed 128)
 
     # Relationship definitions
     books = db.relationship(
@@ -33,13 +57,24 @@ class User(UserMixin, db.Model):
     # Password management methods
     def set_password(self, password: str) -> None:
         """Hash and store password."""
-        self.password_hash = generate_password_hash(password)  # Generate secure hash
+        self.password_hash = hash_password(password)  # Generate secure hash
 
     def check_password(self, password: str) -> bool:
         """Verify password matches hash."""
-        return check_password_hash(self.password_hash, password)  # Compare hash
+        return verify_password(self.password_hash, password)  # Compare hash
+
+    def password_needs_rehash(self) -> bool:
+        """Whether the stored hash predates the configured hash parameters."""
+        return needs_rehash(self.password_hash)
 
     # String representation
     def __repr__(self) -> str:
         """Display format for debugging."""
-        return f'<User {self.username}>'  # Show username in logs
\ No newline at end of file
+        return f'<User {self.username}>'  # Show username in logs
+
+# Drop cached snapshots whenever a user row changes (ids can be reused after deletes)
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_cached_user(mapper, connection, target: User) -> None:
+    user_cache.delete(target.id)
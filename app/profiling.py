@@ -0,0 +1,183 @@
+# app/profiling.py - SQL profiling for development and test runs
+# With SQL_PROFILING on, every statement a request executes is recorded with
+# its duration and the first application frame (or template line) that caused
+# it. At the end of the request the same statement run more than
+# SQL_N_PLUS_ONE_THRESHOLD times with different parameters is reported as a
+# likely N+1, and statements slower than SQL_SLOW_QUERY_MS are logged at once
+# with their EXPLAIN QUERY PLAN. Checks registered in `request_checks` (such as
+# the query_budget test fixture) run on each finished request's log.
+# The hooks stay installed but do nothing while profiling is off.
+
+# Standard library imports
+import os  # Project paths for call sites
+import sys  # Stack inspection
+import threading  # Per-thread active logs
+import time  # Timing
+from collections import defaultdict  # Grouping repeated statements
+from contextlib import contextmanager  # profile_queries()
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Tuple  # Type hints
+
+# Third-party imports
+from flask import g, request  # Per-request log
+from sqlalchemy import event  # Query hooks
+
+# Local imports
+from app import app, db
+
+PROJECT_ROOT = os.path.dirname(app.root_path) + os.sep
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+
+class QueryRecord(NamedTuple):
+    statement: str
+    parameters: Any
+    duration: float  # Seconds
+    call_site: str  # e.g. "app/routes.py:190 in books_list"
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised by the query_budget fixture when a request runs too many statements"""
+
+
+class QueryLog:
+    """Statements recorded while profiling one request or block"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.records: List[QueryRecord] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.records)
+
+    @property
+    def total_time(self) -> float:
+        return sum(record.duration for record in self.records)
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int, List[str]]]:
+        """(statement, distinct parameter sets, call sites) for statements run
+        with more than `threshold` different parameter sets"""
+        parameters: Dict[str, set] = defaultdict(set)
+        sites: Dict[str, Dict[str, None]] = defaultdict(dict)
+        for record in self.records:
+            parameters[record.statement].add(repr(record.parameters))
+            sites[record.statement][record.call_site] = None
+        return [(statement, len(values), list(sites[statement]))
+                for statement, values in parameters.items() if len(values) > threshold]
+
+    def summary(self, limit: int = 20) -> str:
+        """Readable listing of the recorded statements"""
+        lines = [f'{self.label}: {self.count} statements in {self.total_time * 1000:.1f} ms']
+        for record in self.records[:limit]:
+            lines.append(f'  {record.duration * 1000:7.2f} ms  {record.call_site}  '
+                         f'{" ".join(record.statement.split())[:160]}')
+        if self.count > limit:
+            lines.append(f'  ... {self.count - limit} more')
+        return '\n'.join(lines)
+
+
+_active = threading.local()  # Stack of QueryLogs recording on this thread
+request_checks: List[Callable[[QueryLog], None]] = []  # Run on each finished request's log
+
+
+def _logs() -> List[QueryLog]:
+    logs = getattr(_active, 'logs', None)
+    if logs is None:
+        logs = _active.logs = []
+    return logs
+
+
+@contextmanager
+def profile_queries(label: str = 'block') -> Iterator[QueryLog]:
+    """Record the statements executed on this thread inside the block"""
+    log = QueryLog(label)
+    logs = _logs()
+    logs.append(log)
+    try:
+        yield log
+    finally:
+        logs.remove(log)
+
+
+def call_site() -> str:
+    """First frame in the project's own code (templates included) outside this module"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(PROJECT_ROOT) and filename != __file__
+                and os.sep + 'site-packages' + os.sep not in filename):
+            return f'{filename[len(PROJECT_ROOT):]}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+def explain(cursor, statement: str, parameters: Any) -> List[str]:
+    """EXPLAIN QUERY PLAN details, run on the raw connection so it is not recorded"""
+    if statement.lstrip()[:6].upper() not in EXPLAINABLE:
+        return []
+    if isinstance(parameters, list):  # executemany: plan the first row
+        parameters = parameters[0] if parameters else ()
+    try:
+        return [row[-1] for row in cursor.connection.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+    except Exception as error:  # Plans are diagnostic only
+        return [f'(no plan: {error})']
+
+
+# SQLAlchemy hooks
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if getattr(_active, 'logs', None):
+        context._profiling_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    logs = getattr(_active, 'logs', None)
+    started = getattr(context, '_profiling_started', None)
+    if not logs or started is None:
+        return
+    duration = time.perf_counter() - started
+    record = QueryRecord(statement, parameters, duration, call_site())
+    for log in logs:
+        log.records.append(record)
+    if duration * 1000 >= app.config['SQL_SLOW_QUERY_MS']:
+        plan = explain(cursor, statement, parameters)
+        app.logger.warning(
+            f"Slow query ({duration * 1000:.1f} ms) at {record.call_site}:\n"
+            f"{statement}\nparameters: {parameters!r}\nplan: {' | '.join(plan)}")
+
+
+# Flask hooks
+def _start_request() -> None:
+    if app.config['SQL_PROFILING']:
+        g._query_profile = profile_queries(f'{request.method} {request.full_path.rstrip("?")}')
+        g._query_log = g._query_profile.__enter__()
+
+
+def _finish_request(response):
+    profile = g.pop('_query_profile', None)
+    if profile is None:
+        return response
+    profile.__exit__(None, None, None)
+    log = g.pop('_query_log')
+    response.headers['X-SQL-Queries'] = str(log.count)
+    response.headers['X-SQL-Time'] = f'{log.total_time * 1000:.2f}ms'
+    for statement, count, sites in log.repeated(app.config['SQL_N_PLUS_ONE_THRESHOLD']):
+        app.logger.warning(f"Possible N+1 in {log.label}: ran {count} times from "
+                           f"{', '.join(sites)}:\n{' '.join(statement.split())}")
+    for check in list(request_checks):
+        check(log)
+    return response
+
+
+def _abandon_request(error=None) -> None:
+    """Stop recording when the request ended without reaching after_request"""
+    profile = g.pop('_query_profile', None)
+    if profile is not None:
+        profile.__exit__(None, None, None)
+
+
+app.before_request_funcs.setdefault(None, []).insert(0, _start_request)  # Before the user loader runs
+app.after_request(_finish_request)
+app.teardown_request(_abandon_request)
+with app.app_context():
+    event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
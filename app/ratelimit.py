@@ -0,0 +1,209 @@
+# app/ratelimit.py - Shared storage, strategy and keys for Flask-Limiter
+# Registers an "sqlite://" storage scheme so every worker process on a host
+# shares one set of counters in a WAL-mode, memory-mapped SQLite file (use
+# RATELIMIT_STORAGE_URI=redis://... when Redis is available), and a
+# "sliding-window-counter" strategy that approximates a moving window from two
+# fixed-window counters instead of storing one entry per hit. On the SQLite
+# storage a hit is one conditional UPSERT that checks the weighted count and
+# increments it atomically, so concurrent workers cannot overshoot the limit.
+
+# Standard library imports
+import os  # Storage directory creation
+import sqlite3  # Counter storage
+import threading  # Per-thread connections
+import time  # Window arithmetic
+
+# Third-party imports
+from flask_login import current_user  # Per-user limit keys
+from flask_limiter.util import get_remote_address  # Client IP detection
+from limits import RateLimitItem  # Limit definitions
+from limits.storage import Storage  # Storage base class (auto-registers schemes)
+from limits.strategies import STRATEGIES, RateLimiter  # Strategy registry
+from limits.util import WindowStats  # Window statistics
+
+
+class SQLiteStorage(Storage):
+    """Rate limit counters in an SQLite file, e.g. sqlite:////var/run/app/ratelimit.db"""
+
+    STORAGE_SCHEME = ['sqlite']
+    PURGE_EVERY = 1000  # Increments between sweeps of expired counters
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, mmap_size: int = 8 << 20, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = uri[len('sqlite:///'):]  # Same convention as SQLAlchemy URLs
+        self.mmap_size = int(mmap_size)
+        self._local = threading.local()
+        self._increments = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute("""CREATE TABLE IF NOT EXISTS counters (
+            key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL NOT NULL)""")
+        # One row per sliding window key: the current fixed window and the one before
+        conn.execute("""CREATE TABLE IF NOT EXISTS sliding_windows (
+            key TEXT PRIMARY KEY, period INTEGER NOT NULL, current INTEGER NOT NULL,
+            previous INTEGER NOT NULL, expires_at REAL NOT NULL)""")
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit: each statement is its own short transaction
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')  # No fsync per hit
+            conn.execute(f'PRAGMA mmap_size={self.mmap_size}')  # Reads served from the mapping
+            self._local.conn = conn
+        return conn
+
+    def incr(self, key: str, expiry: int, elastic_expiry: bool = False, amount: int = 1) -> int:
+        """Increment a counter in one statement, restarting it once expired"""
+        now = time.time()
+        value = self._connection().execute("""
+            INSERT INTO counters (key, value, expires_at) VALUES (:key, :amount, :expires_at)
+            ON CONFLICT (key) DO UPDATE SET
+                value = CASE WHEN expires_at <= :now THEN :amount ELSE value + :amount END,
+                expires_at = CASE WHEN expires_at <= :now OR :elastic
+                             THEN :expires_at ELSE expires_at END
+            RETURNING value""", {
+                'key': key, 'amount': amount, 'expires_at': now + expiry,
+                'now': now, 'elastic': elastic_expiry
+            }).fetchone()[0]
+
+        self._purge(now)
+        return value
+
+    def _purge(self, now: float) -> None:
+        """Sweep expired counters every PURGE_EVERY increments"""
+        self._increments += 1
+        if self._increments % self.PURGE_EVERY == 0:
+            conn = self._connection()
+            conn.execute('DELETE FROM counters WHERE expires_at <= ?', (now,))
+            conn.execute('DELETE FROM sliding_windows WHERE expires_at <= ?', (now,))
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, window: int, period: int,
+                                     weight: float, amount: int = 1) -> bool:
+        """Count a hit in fixed window `period` unless the previous window's count
+        times `weight` plus the current count would exceed the limit. The check
+        and the increment are one statement; a rejected hit writes nothing."""
+        if amount > limit:
+            return False
+        previous = 'CASE period WHEN :period THEN previous WHEN :period - 1 THEN current ELSE 0 END'
+        current = 'CASE period WHEN :period THEN current ELSE 0 END'
+        row = self._connection().execute(f"""
+            INSERT INTO sliding_windows (key, period, current, previous, expires_at)
+            VALUES (:key, :period, :amount, 0, :expires_at)
+            ON CONFLICT (key) DO UPDATE SET
+                previous = {previous}, current = {current} + :amount,
+                period = :period, expires_at = :expires_at
+            WHERE {previous} * :weight + {current} + :amount <= :limit
+            RETURNING current""", {
+                'key': key, 'period': period, 'amount': amount, 'weight': weight,
+                'limit': limit, 'expires_at': (period + 2) * window  # Serves as the previous window next
+            }).fetchone()
+        if row is not None:
+            self._purge(time.time())
+        return row is not None
+
+    def get_sliding_window(self, key: str, period: int) -> tuple:
+        """(previous, current) fixed-window counts as seen from window `period`"""
+        row = self._connection().execute(
+            'SELECT period, current, previous FROM sliding_windows WHERE key = ?', (key,)).fetchone()
+        if row is None or row[0] < period - 1:
+            return 0, 0
+        if row[0] == period - 1:
+            return row[1], 0
+        return row[2], row[1]
+
+    def get(self, key: str) -> int:
+        row = self._connection().execute(
+            'SELECT value FROM counters WHERE key = ? AND expires_at > ?', (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> int:
+        row = self._connection().execute(
+            'SELECT expires_at FROM counters WHERE key = ?', (key,)).fetchone()
+        return int(row[0]) if row else int(time.time())
+
+    def check(self) -> bool:
+        try:
+            self._connection().execute('SELECT 1')
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int:
+        conn = self._connection()
+        return (conn.execute('DELETE FROM counters').rowcount
+                + conn.execute('DELETE FROM sliding_windows').rowcount)
+
+    def clear(self, key: str) -> None:
+        conn = self._connection()
+        conn.execute('DELETE FROM counters WHERE key = ?', (key,))
+        conn.execute('DELETE FROM sliding_windows WHERE key = ?', (key,))
+
+
+class SlidingWindowCounterRateLimiter(RateLimiter):
+    """Weights the previous fixed window by how much of it still overlaps the
+    sliding window, so bursts at window edges cannot double the limit.
+    SQLiteStorage does each hit in one atomic statement; other storages fall
+    back to reading both window counters and then incrementing."""
+
+    @staticmethod
+    def _window(item: RateLimitItem) -> tuple:
+        window = item.get_expiry()
+        now = time.time()
+        weight = 1 - (now % window) / window  # Share of the previous window still in range
+        return window, int(now // window), weight
+
+    def _counts(self, item: RateLimitItem, identifiers) -> tuple:
+        window, index, weight = self._window(item)
+        key = item.key_for(*identifiers)
+        current_key = f'{key}/{index}'
+        if isinstance(self.storage, SQLiteStorage):
+            previous, current = self.storage.get_sliding_window(key, index)
+        else:
+            previous, current = self.storage.get(f'{key}/{index - 1}'), self.storage.get(current_key)
+        return current_key, previous * weight + current, window, index
+
+    def hit(self, item: RateLimitItem, *identifiers: str, cost: int = 1) -> bool:
+        if isinstance(self.storage, SQLiteStorage):
+            window, index, weight = self._window(item)
+            return self.storage.acquire_sliding_window_entry(
+                item.key_for(*identifiers), item.amount, window, index, weight, cost)
+        current_key, weighted, window, _ = self._counts(item, identifiers)
+        if weighted + cost > item.amount:
+            return False  # Rejected hits are not counted
+        # Counters live for two windows so they can serve as the previous window
+        self.storage.incr(current_key, 2 * window, amount=cost)
+        return True
+
+    def test(self, item: RateLimitItem, *identifiers: str, cost: int = 1) -> bool:
+        _, weighted, _, _ = self._counts(item, identifiers)
+        return weighted + cost <= item.amount
+
+    def get_window_stats(self, item: RateLimitItem, *identifiers: str) -> WindowStats:
+        _, weighted, window, index = self._counts(item, identifiers)
+        return WindowStats(int((index + 1) * window), max(0, item.amount - int(weighted)))
+
+    def clear(self, item: RateLimitItem, *identifiers: str) -> None:
+        window = item.get_expiry()
+        index = int(time.time() // window)
+        key = item.key_for(*identifiers)
+        if isinstance(self.storage, SQLiteStorage):
+            self.storage.clear(key)
+            return
+        self.storage.clear(f'{key}/{index}')
+        self.storage.clear(f'{key}/{index - 1}')
+
+
+STRATEGIES['sliding-window-counter'] = SlidingWindowCounterRateLimiter
+
+
+def rate_limit_key() -> str:
+    """Limit signed-in users per account and anonymous clients per IP"""
+    if current_user.is_authenticated:
+        return f'user:{current_user.get_id()}'
+    return f'ip:{get_remote_address()}'
@@ -2,35 +2,40 @@
 
 # Standard library imports
 import re  # Regular expressions for validation
+import hmac  # Constant-time token comparison
 import os  # Operating system utilities
 
 # Third-party imports
-from flask import abort, render_template, redirect, url_for, flash, request, jsonify  # Flask web framework
+from flask import abort, render_template, redirect, url_for, flash, request, jsonify, make_response, session  # Flask web framework
 from flask_login import login_user, logout_user, login_required, current_user  # User session management
 from flask_limiter import Limiter  # API rate limiting
-from flask_limiter.util import get_remote_address  # Client IP detection
 from dotenv import load_dotenv  # Environment variable loading
 
 # Local imports
 from app import app, db  # Flask app and database
 from app.models.user import User  # User model
 from app.models.book import Book  # Book model
-from app.tasks import send_contact_email, send_registration_email  # Async email tasks
-from app.services.ai_service import AIRecommendationService  # AI recommendations
+from app.ratelimit import rate_limit_key  # Per-user limit keys and shared storage
+from app.metrics import registry as metrics_registry  # Request, SQL and task metrics
+from app.tasks import queue_contact_email, queue_registration_email  # Batched email outbox
+from app.services.ai_service import get_ai_service  # AI recommendations
+from app.services.catalog import catalog_version, make_etag, not_modified, validator_headers  # Conditional GETs
+from app.services.fragments import get_fragment_cache, page_key, render_books  # Rendered page cache
+from app.services.pagination import paginate_books, parse_limit  # Keyset pagination
+from app.services.search import search_books  # Full-text search
+from app.services.jobs import job_accepted, submit_recommendation_job, wants_job_mode  # Background AI jobs
 
 # Global variables
 books = []  # Temporary storage for books
 
 # Service initialization
-# This limiter uses in-memory storage for rate limiting only to demonstrate the concept.
+# Storage and strategy come from RATELIMIT_STORAGE_URI / RATELIMIT_STRATEGY
 limiter = Limiter(  # Rate limiter setup
     app=app,
-    key_func=get_remote_address,
+    key_func=rate_limit_key,
     default_limits=["100 per day", "10 per hour"]
 )
 
-ai_service = AIRecommendationService()  # AI service initialization
-
 # Basic page routes
 @app.route('/')
 def home():
@@ -40,6 +45,15 @@ def home():
 def about():
     return render_template('about.html')
 
+# Prometheus scrape endpoint (totals from every process on the host)
+@app.route('/metrics')
+@limiter.exempt
+def metrics():
+    token = app.config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(401)
+    return app.response_class(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
 # Contact form handling
 @app.route('/contact', methods=['GET', 'POST'])
 def contact():
@@ -50,8 +64,8 @@ def contact():
             email = request.form['email']  # Sender email
             message = request.form['message']  # Message content
             
-            # Queue async email task
-            send_contact_email.delay(name=name, email=email, message=message)
+            # Queue for the next batched send
+            queue_contact_email(name=name, email=email, message=message)
             
             flash('Thank you for your message! We will respond soon.')
             return redirect(url_for('contact'))
@@ -117,7 +131,7 @@ def register():
         db.session.commit()
         
         # Send welcome email
-        send_registration_email.delay(user.email, user.username)
+        queue_registration_email(user.email, user.username)
         
         flash('Registration successful! Check your email for confirmation.')
         return redirect(url_for('login'))
@@ -133,6 +147,9 @@ def login():
         # Verify credentials
         user = User.query.filter_by(username=request.form['username']).first()
         if user and user.check_password(request.form['password']):
+            if user.password_needs_rehash():  # Upgrade hashes made with older parameters
+                user.set_password(request.form['password'])
+                db.session.commit()
             login_user(user)
             return redirect(url_for('home'))
         flash('Invalid username or password')
@@ -149,9 +166,47 @@ def logout():
 @app.route('/books')
 @login_required
 def books_list():
-    # Get user's books
-    books = Book.query.filter_by(user_id=current_user.id).all()
-    return render_template('books/list.html', books=books)
+    query = request.args.get('q', '').strip()  # Search box contents
+    try:
+        limit = parse_limit(request.args.get('limit'))
+    except ValueError:
+        abort(400)
+
+    # Skip the queries and the render when the browser's copy is current.
+    # Pages carrying flash messages are one-off: never revalidated or cached.
+    version, modified_at = catalog_version(current_user.id)
+    etag = make_etag('books-page', current_user.id, current_user.username, version,
+                     request.args.get('cursor'), limit, query)
+    has_flashes = '_flashes' in session
+    fragments = get_fragment_cache()
+    key = page_key(current_user.id, etag)
+    if not has_flashes:
+        unchanged = not_modified(etag, modified_at)
+        if unchanged:
+            return unchanged
+        html = fragments.get(key)  # Rendered by an earlier view of this version
+        if html is not None:
+            response = make_response(html)
+            response.headers.update(validator_headers(etag, modified_at))
+            return response
+
+    try:
+        if query:
+            # Ranked search results fit on a single page
+            books, next_cursor = search_books(current_user.id, query, limit), None
+        else:
+            # Get one page of the user's books
+            books, next_cursor = paginate_books(current_user.id, request.args.get('cursor'), limit)
+    except ValueError:
+        abort(400)
+    html = render_template(
+        'books/list.html', book_fragments=render_books(books), next_cursor=next_cursor, query=query,
+        limit=limit, is_first_page=not (request.args.get('cursor') or query))
+    response = make_response(html)
+    if not has_flashes:
+        fragments.set(key, html)
+        response.headers.update(validator_headers(etag, modified_at))
+    return response
 
 @app.route('/books/add', methods=['GET', 'POST'])
 @login_required
@@ -229,12 +284,19 @@ def get_book_recommendations():
         if not data.get('genres') and not data.get('authors'):
             return jsonify({"error": "At least one genre or author required"}), 400
 
-        # Get AI recommendations
-        recommendations = ai_service.get_recommendations({
+        preferences = {
             'genres': data.get('genres', []),
             'authors': data.get('authors', []),
             'user_id': current_user.id
-        })
+        }
+
+        # Job mode: queue the work and let the client poll for the result
+        if wants_job_mode(request.args):
+            accepted = job_accepted(submit_recommendation_job(preferences, current_user.id))
+            return jsonify(accepted), 202, {'Location': accepted['status_url']}
+
+        # Get AI recommendations
+        recommendations = get_ai_service().get_recommendations(preferences)
 
         # Return successful response
         return jsonify({
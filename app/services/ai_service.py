@@ -1,25 +1,116 @@
 # app/services/ai_service.py
 # Error 429 will show up upon using AI Book Recommendation Service, since I have not paid for tokens to usae OpenAI services using my API key.
+# When it does, answers come from the local recommender (app/services/local_recommender.py) instead.
 
 # Standard library imports
 import os  # Operating system interface
 import json  # JSON parsing
-from typing import Dict, List  # Type hints
+import hashlib  # Cache key hashing
+import threading  # Counter updates from concurrent requests
+import time  # Upstream cooldown after failures
+from typing import Dict, Iterator, List, Optional  # Type hints
 
 # Third party imports
+import httpx  # Pooled HTTP transport for the OpenAI client
 from openai import OpenAI, OpenAIError  # OpenAI API client
 
+# Local imports
+from app import app  # Cache configuration
+from app.metrics import ai_upstream_calls, ai_upstream_calls_saved  # Shared upstream call counters
+from app.services.cache import BaseCache, make_cache  # Response cache
+from app.services.json_stream import JSONArrayStreamParser  # Incremental parsing of streamed output
+from app.services.local_recommender import LocalRecommender, get_local_recommender  # Offline fallback
+from app.services.singleflight import SingleFlight  # Concurrent call deduplication
+
+_service_lock = threading.Lock()
+
+def make_openai_client(transport: Optional[httpx.BaseTransport] = None) -> OpenAI:
+    """Build an OpenAI client on a keep-alive connection pool"""
+    # Get API key from environment
+    api_key = os.environ.get('OPENAI_API_KEY')
+    if not api_key:
+        raise ValueError("OpenAI API key not found in environment variables")
+
+    http_client = httpx.Client(
+        transport=transport,  # e.g. httpx.MockTransport or a local stub server adapter
+        limits=httpx.Limits(
+            max_connections=app.config['AI_HTTP_MAX_CONNECTIONS'],
+            max_keepalive_connections=app.config['AI_HTTP_MAX_KEEPALIVE'],
+            keepalive_expiry=app.config['AI_HTTP_KEEPALIVE_EXPIRY']
+        ),
+        timeout=httpx.Timeout(app.config['AI_HTTP_TIMEOUT'],
+                              connect=app.config['AI_HTTP_CONNECT_TIMEOUT'])
+    )
+    # The SDK retries 408/409/429/5xx with exponential backoff (honoring Retry-After)
+    return OpenAI(api_key=api_key, base_url=app.config['OPENAI_BASE_URL'],
+                  max_retries=app.config['AI_MAX_RETRIES'], http_client=http_client)
+
+def get_ai_service() -> 'AIRecommendationService':
+    """Return the app-wide recommendation service, creating it on first use"""
+    service = app.extensions.get('ai_service')
+    if service is None:
+        with _service_lock:
+            service = app.extensions.get('ai_service')
+            if service is None:
+                service = AIRecommendationService()
+                app.extensions['ai_service'] = service
+    return service
+
+def get_recommendation_cache() -> BaseCache:
+    """Return the app-wide recommendation cache, creating it on first use"""
+    cache = app.extensions.get('ai_cache')
+    if cache is None:
+        cache = make_cache(
+            app.config['AI_CACHE_BACKEND'],
+            path=app.config['AI_CACHE_PATH'],
+            default_ttl=app.config['AI_CACHE_TTL'],
+            max_entries=app.config['AI_CACHE_MAX_ENTRIES']
+        )
+        app.extensions['ai_cache'] = cache
+    return cache
+
+def get_singleflight() -> SingleFlight:
+    """Return the app-wide single-flight group for upstream calls"""
+    group = app.extensions.get('ai_singleflight')
+    if group is None:
+        group = SingleFlight(lock_dir=app.config['AI_SINGLEFLIGHT_LOCK_DIR'])
+        app.extensions['ai_singleflight'] = group
+    return group
+
+def normalize_preferences(preferences: Dict) -> Dict[str, List[str]]:
+    """Case-fold, trim, de-duplicate and sort genres and authors"""
+    def clean(values):
+        return sorted({' '.join(str(v).split()).casefold() for v in values or []} - {''})
+    return {'genres': clean(preferences.get('genres')), 'authors': clean(preferences.get('authors'))}
+
+def recommendation_cache_key(preferences: Dict) -> str:
+    """Order- and case-independent cache key for a set of preferences"""
+    normalized = json.dumps(normalize_preferences(preferences), sort_keys=True)
+    return 'recommendations:' + hashlib.sha256(normalized.encode()).hexdigest()
+
 class AIRecommendationService:
     """Service for getting AI-powered book recommendations"""
+
+    # Process-wide counters; /metrics reports the shared ai_upstream_calls_* totals
+    requests = 0
+    upstream_calls = 0
+    local_answers = 0
+    _counter_lock = threading.Lock()
     
-    def __init__(self):
-        # Get API key from environment
-        self.api_key = os.environ['OPENAI_API_KEY']
-        if not self.api_key:
-            raise ValueError("OpenAI API key not found in environment variables")
-            
-        # Initialize OpenAI client
-        self.client = OpenAI(api_key=self.api_key)
+    def __init__(self, client: Optional[OpenAI] = None, cache: Optional[BaseCache] = None,
+                 singleflight: Optional[SingleFlight] = None,
+                 local: Optional[LocalRecommender] = None):
+        # Responses and in-flight calls are shared app-wide unless given
+        self.cache = cache if cache is not None else get_recommendation_cache()
+        self.singleflight = singleflight if singleflight is not None else get_singleflight()
+        self.local = local if local is not None else get_local_recommender()
+        self.local_only = app.config['AI_RECOMMENDER'] == 'local'
+        self.upstream_blocked_until = 0.0  # Set after upstream failures (see _fallback)
+
+        # Initialize OpenAI client (one pooled client per service; none when running offline)
+        if client is None and not self.local_only:
+            client = make_openai_client()
+        self.client = client
 
     def get_recommendations(self, preferences: Dict) -> List[Dict]:
         """Get book recommendations based on user preferences"""
@@ -28,33 +119,33 @@ class AIRecommendationService:
             if not preferences.get('genres') and not preferences.get('authors'):
                 raise ValueError("At least one genre or author must be provided")
 
-            # Build prompt for AI
-            prompt = self._build_prompt(preferences)
-            
-            # Get AI response
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",  # Use GPT-3.5 model
-                messages=[{
-                    "role": "system",  # System message for context
-                    "content": "You are a knowledgeable book recommendation assistant. "
-                             "Provide recommendations in valid JSON format."
-                },
-                {
-                    "role": "user",  # User prompt with preferences
-                    "content": prompt
-                }],
-                max_tokens=500,  # Limit response length
-                temperature=0.7  # Control randomness
-            )
-            
-            # Parse and validate response
-            recommendations = self._parse_recommendations(response.choices[0].message.content)
-            
-            # Ensure valid format
-            if not isinstance(recommendations, list):
-                raise ValueError("Invalid recommendations format")
-                
-            return recommendations
+            self._count('requests')
+
+            if self.local_only or time.monotonic() < self.upstream_blocked_until:
+                ai_upstream_calls_saved.inc('local')
+                return self._local_recommendations(preferences)
+
+            # Serve repeated preference sets from the cache
+            cache_key = recommendation_cache_key(preferences)
+            cached = self.cache.get(cache_key)
+            if cached is None:
+                fetched = []
+
+                def fetch():
+                    fetched.append(True)
+                    return self._fetch_recommendations(cache_key, preferences)
+                try:
+                    # Concurrent identical requests wait for one upstream call
+                    cached = self.singleflight.do(cache_key, fetch)
+                except Exception as e:
+                    if not app.config['AI_LOCAL_FALLBACK']:
+                        raise
+                    return self._fallback(e, preferences)
+                if not fetched:
+                    ai_upstream_calls_saved.inc('coalesced')
+            else:
+                ai_upstream_calls_saved.inc('cache')
+            return [dict(book) for book in cached]
 
         # Error handling
         except OpenAIError as e:
@@ -64,6 +155,134 @@ class AIRecommendationService:
         except Exception as e:
             raise Exception(f"Error getting recommendations: {str(e)}")  # Generic errors
 
+    def _fetch_recommendations(self, cache_key: str, preferences: Dict) -> List[Dict]:
+        """Call the upstream API and cache the result (runs once per in-flight key)"""
+        # Another worker may have filled the shared cache while we held the lock
+        if self.singleflight.lock_dir:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                ai_upstream_calls_saved.inc('cache')
+                return cached
+
+        # Get AI response
+        self._count('upstream_calls')
+        response = self._upstream().chat.completions.create(**self._completion_request(preferences))
+
+        # Parse and validate response
+        recommendations = self._parse_recommendations(response.choices[0].message.content)
+
+        # Ensure valid format
+        if not isinstance(recommendations, list):
+            raise ValueError("Invalid recommendations format")
+
+        self.cache.set(cache_key, recommendations)
+        return recommendations
+
+    def stream_recommendations(self, preferences: Dict) -> Iterator[Dict]:
+        """Yield recommendations one at a time as the model generates them"""
+        if not preferences.get('genres') and not preferences.get('authors'):
+            raise ValueError("At least one genre or author must be provided")
+        self._count('requests')
+
+        if self.local_only or time.monotonic() < self.upstream_blocked_until:
+            ai_upstream_calls_saved.inc('local')
+            yield from self._local_recommendations(preferences)
+            return
+
+        cache_key = recommendation_cache_key(preferences)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            ai_upstream_calls_saved.inc('cache')
+            yield from (dict(book) for book in cached)
+            return
+
+        streamed = []
+        try:
+            complete = yield from self._stream_upstream(preferences, streamed)
+        except Exception as e:
+            # Books already sent cannot be taken back, so only fall back before the first
+            if streamed or not app.config['AI_LOCAL_FALLBACK']:
+                raise Exception(f"Error streaming recommendations: {str(e)}")
+            yield from self._fallback(e, preferences)
+            return
+        if complete:
+            self.cache.set(cache_key, streamed)
+
+    def _stream_upstream(self, preferences: Dict, streamed: List[Dict]) -> Iterator[Dict]:
+        """Stream a completion, yielding each book once its JSON object closes.
+        Returns whether the whole array arrived."""
+        self._count('upstream_calls')
+        stream = self._upstream().chat.completions.create(
+            **self._completion_request(preferences), stream=True)
+        parser = JSONArrayStreamParser()
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                for book in parser.feed(chunk.choices[0].delta.content or ''):
+                    if not self._is_recommendation(book):
+                        raise ValueError("Each book must have title, author, description and genre")
+                    streamed.append(book)
+                    yield dict(book)
+        finally:
+            stream.close()  # Frees the connection if the client went away mid-stream
+
+        if not parser.started:
+            raise ValueError("Response did not contain a JSON array")
+        if not parser.finished:
+            app.logger.warning("Recommendation stream ended before the JSON array closed")
+        return parser.finished
+
+    def _upstream(self) -> OpenAI:
+        """Client for one completion. With a local fallback available the upstream
+        gets a single attempt of AI_FALLBACK_TIMEOUT: the SDK's retries and their
+        backoff would otherwise multiply the wait before the fallback answers."""
+        if not app.config['AI_LOCAL_FALLBACK']:
+            return self.client
+        return self.client.with_options(max_retries=0, timeout=app.config['AI_FALLBACK_TIMEOUT'])
+
+    def _completion_request(self, preferences: Dict) -> Dict:
+        """Arguments for chat.completions.create"""
+        return dict(
+            model="gpt-3.5-turbo",  # Use GPT-3.5 model
+            messages=[{
+                "role": "system",  # System message for context
+                "content": "You are a knowledgeable book recommendation assistant. "
+                         "Provide recommendations in valid JSON format."
+            },
+            {
+                "role": "user",  # User prompt with preferences
+                "content": self._build_prompt(preferences)
+            }],
+            max_tokens=500,  # Limit response length
+            temperature=0.7  # Control randomness
+        )
+
+    @staticmethod
+    def _is_recommendation(book: object) -> bool:
+        """Whether a parsed item has every recommendation field"""
+        required_fields = {'title', 'author', 'description', 'genre'}
+        return isinstance(book, dict) and all(field in book for field in required_fields)
+
+    def _fallback(self, error: Exception, preferences: Dict) -> List[Dict]:
+        """Answer locally after an upstream failure; rate limits, timeouts and
+        outages also keep the upstream out of the path for a cooldown"""
+        app.logger.warning(f"Upstream recommendations failed, answering locally: {str(error)}")
+        if isinstance(error, OpenAIError):
+            self.upstream_blocked_until = time.monotonic() + app.config['AI_UPSTREAM_COOLDOWN']
+        return self._local_recommendations(preferences)
+
+    def _local_recommendations(self, preferences: Dict) -> List[Dict]:
+        self._count('local_answers')
+        return self.local.recommend(normalize_preferences(preferences))
+
+    @classmethod
+    def _count(cls, counter: str) -> None:
+        with cls._counter_lock:
+            setattr(cls, counter, getattr(cls, counter) + 1)
+        if counter == 'upstream_calls':
+            ai_upstream_calls.inc()
+
     def _build_prompt(self, preferences: Dict) -> str:
         """Build AI prompt from user preferences"""
         # Extract preferences
@@ -97,9 +316,8 @@ class AIRecommendationService:
                 raise ValueError("Recommendations must be a list")
                 
             # Check required fields
-            required_fields = {'title', 'author', 'description', 'genre'}
             for book in recommendations:
-                if not all(field in book for field in required_fields):
+                if not self._is_recommendation(book):
                     raise ValueError("Each book must have title, author, description and genre")
                     
             return recommendations
@@ -107,4 +325,4 @@ class AIRecommendationService:
         except json.JSONDecodeError:
             raise Exception("Failed to parse recommendations as JSON")
         except Exception as e:
-            raise Exception(f"Error parsing recommendations: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Error parsing recommendations: {str(e)}")
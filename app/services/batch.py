@@ -0,0 +1,166 @@
+# app/services/batch.py
+# Batch update and delete of books in one transaction.
+# All targets are loaded with a single IN query and checked for ownership
+# together; accepted items are written with bulk UPDATE/DELETE statements and
+# one commit, and every item gets its own result entry.
+
+# Standard library imports
+from typing import Callable, Dict, Iterable, List, Optional  # Type hints
+
+# Third party imports
+from sqlalchemy import delete, select, update  # Bulk statements
+
+# Local imports
+from app import app, db
+from app.models.book import Book
+from app.services.bulk_import import MAX_LENGTHS, parse_year
+
+# Fields a batch update may change
+UPDATABLE_FIELDS = ('title', 'author', 'isbn', 'year', 'genre')
+
+
+def validate_changes(raw: object) -> Dict:
+    """Return the cleaned fields of one change or raise ValueError"""
+    if not isinstance(raw, dict):
+        raise ValueError("Item must be an object")
+    unknown = set(raw) - set(UPDATABLE_FIELDS) - {'id'}
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    changes = {}
+    for field in ('title', 'author', 'isbn', 'genre'):
+        if field not in raw:
+            continue
+        value = raw[field]
+        value = str(value).strip() if value is not None else ''
+        if len(value) > MAX_LENGTHS[field]:
+            raise ValueError(f"{field} must be at most {MAX_LENGTHS[field]} characters")
+        if not value and field != 'genre':
+            raise ValueError(f"{field} cannot be empty")
+        changes[field] = value
+
+    if 'year' in raw:
+        changes['year'] = parse_year(raw['year'])
+
+    if not changes:
+        raise ValueError("No fields to update")
+    return changes
+
+
+def parse_ids(items: Iterable[object]) -> List[Optional[int]]:
+    """Item ids as integers; None marks an id that is not a positive integer"""
+    ids = []
+    for item in items:
+        value = item.get('id') if isinstance(item, dict) else item
+        ids.append(value if isinstance(value, int) and not isinstance(value, bool) and value > 0
+                   else None)
+    return ids
+
+
+class BatchResult:
+    """Per-item outcomes in request order"""
+
+    def __init__(self, ids: List[Optional[int]]):
+        self.results = [{'id': item_id, 'success': False, 'status': None, 'error': None}
+                        for item_id in ids]
+
+    def ok(self, index: int, status: int) -> None:
+        self.results[index].update(success=True, status=status)
+
+    def fail(self, index: int, status: int, message: str) -> None:
+        self.results[index].update(success=False, status=status, error=message)
+
+    def report(self) -> Dict:
+        succeeded = sum(1 for r in self.results if r['success'])
+        return {'succeeded': succeeded, 'failed': len(self.results) - succeeded,
+                'results': self.results}
+
+
+def _check_targets(user_id: int, ids: List[Optional[int]], result: BatchResult) -> List[int]:
+    """Load every target in one query; return the indexes the user may change"""
+    owners = dict(db.session.execute(
+        select(Book.id, Book.user_id).where(Book.id.in_({i for i in ids if i is not None}))
+    ).all())
+
+    accepted, seen = [], set()
+    for index, item_id in enumerate(ids):
+        if item_id is None:
+            result.fail(index, 400, "id must be a positive integer")
+        elif item_id in seen:
+            result.fail(index, 400, "Duplicate id in batch")
+        elif item_id not in owners:
+            result.fail(index, 404, "Book not found")
+        elif owners[item_id] != user_id:
+            result.fail(index, 403, "Not authorized to modify this book.")
+        else:
+            accepted.append(index)
+        if item_id is not None:
+            seen.add(item_id)
+    return accepted
+
+
+def _commit(result: BatchResult, indexes: List[int], status: int, label: str,
+            write: Callable[[], object]) -> None:
+    """Run the bulk statement and commit; any failure fails every item it covered"""
+    try:
+        write()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Batch {label} failed: {str(e)}")
+        for index in indexes:
+            result.fail(index, 500, f"Could not {label} book")
+        return
+    for index in indexes:
+        result.ok(index, status)
+
+
+def batch_update(user_id: int, items: List[object]) -> Dict:
+    """Apply partial updates to many books with one commit"""
+    ids = parse_ids(items)
+    result = BatchResult(ids)
+
+    pending = {}
+    for index in _check_targets(user_id, ids, result):
+        try:
+            pending[index] = validate_changes(items[index])
+        except ValueError as e:
+            result.fail(index, 400, str(e))
+
+    # ISBNs are unique across the whole table: one query for every new value
+    new_isbns = {changes['isbn'] for changes in pending.values() if 'isbn' in changes}
+    holders = dict(db.session.execute(
+        select(Book.isbn, Book.id).where(Book.isbn.in_(new_isbns))
+    ).all()) if new_isbns else {}
+    for index, changes in list(pending.items()):
+        isbn = changes.get('isbn')
+        if isbn is None:
+            continue
+        holder = holders.get(isbn)
+        if holder is not None and holder != ids[index]:
+            result.fail(index, 400, f"Book with ISBN {isbn} already exists.")
+            del pending[index]
+        else:
+            holders[isbn] = ids[index]  # Later items in the batch cannot claim it
+
+    if pending:
+        # Rows changing the same fields are adjacent so each group is one executemany
+        rows = sorted(({'id': ids[i], **changes} for i, changes in pending.items()),
+                      key=lambda row: sorted(row))
+        _commit(result, list(pending), 200, 'update',
+                lambda: db.session.execute(update(Book), rows))
+    return result.report()
+
+
+def batch_delete(user_id: int, items: List[object]) -> Dict:
+    """Delete many books with one DELETE statement and one commit"""
+    ids = parse_ids(items)
+    result = BatchResult(ids)
+
+    accepted = _check_targets(user_id, ids, result)
+    if accepted:
+        _commit(result, accepted, 204, 'delete', lambda: db.session.execute(
+            delete(Book).where(Book.id.in_([ids[i] for i in accepted])),
+            execution_options={'synchronize_session': False}
+        ))
+    return result.report()
@@ -0,0 +1,170 @@
+# app/services/bulk_import.py
+# Streaming bulk import of books from CSV or NDJSON request bodies.
+# Rows are parsed one line at a time, validated, and written in fixed-size
+# chunks with one executemany INSERT and one commit per chunk, so memory stays
+# bounded by the chunk size rather than the upload size.
+
+# Standard library imports
+import codecs  # Incremental UTF-8 decoding
+import csv  # CSV parsing
+import json  # NDJSON parsing
+from typing import Dict, IO, Iterable, Iterator, List, Optional, Tuple  # Type hints
+
+# Third party imports
+from sqlalchemy import insert, select  # Core statements for executemany
+
+# Local imports
+from app import app, db
+from app.models.book import Book
+
+# Supported request content types
+FORMATS = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/json-lines': 'ndjson',
+}
+
+# Column limits mirror the Book model
+MAX_LENGTHS = {'title': 100, 'author': 100, 'isbn': 13, 'genre': 50}
+MIN_YEAR, MAX_YEAR = -9999, 9999  # Keeps values well inside SQLite's 64-bit integers
+
+
+def parse_rows(stream: IO[bytes], fmt: str) -> Iterator[Tuple[int, object]]:
+    """Yield (row number, raw row) pairs; unparseable rows yield the error instead.
+    Input that cannot be decoded ends the stream with one error for the next row."""
+    lines = codecs.iterdecode(stream, 'utf-8')  # Decodes lazily, line by line
+    number = 0
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(lines)
+            for number, row in enumerate(reader, start=1):
+                yield number, row
+        else:
+            for number, line in enumerate(lines, start=1):
+                if not line.strip():
+                    continue  # Tolerate blank lines
+                try:
+                    yield number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield number, ValueError(f"Invalid JSON: {e.msg}")
+    except UnicodeDecodeError as e:
+        yield number + 1, ValueError(f"Invalid UTF-8 ({e.reason}); import stopped")
+    except csv.Error as e:
+        yield number + 1, ValueError(f"Invalid CSV: {e}; import stopped")
+
+
+def parse_year(value: object) -> int:
+    """Return a publication year as an integer or raise ValueError"""
+    try:
+        year = int(value)
+    except (TypeError, ValueError, OverflowError):  # OverflowError: 1e400 parses as inf
+        raise ValueError("year must be an integer")
+    if not MIN_YEAR <= year <= MAX_YEAR:
+        raise ValueError(f"year must be between {MIN_YEAR} and {MAX_YEAR}")
+    return year
+
+
+def validate_row(raw: object) -> Dict:
+    """Return a cleaned Book row or raise ValueError describing the problem"""
+    if isinstance(raw, Exception):
+        raise raw
+    if not isinstance(raw, dict):
+        raise ValueError("Row must be an object")
+
+    row = {}
+    for field in ('title', 'author', 'isbn', 'genre'):
+        value = raw.get(field)
+        value = str(value).strip() if value is not None else ''
+        if len(value) > MAX_LENGTHS[field]:
+            raise ValueError(f"{field} must be at most {MAX_LENGTHS[field]} characters")
+        row[field] = value
+
+    for field in ('title', 'author', 'isbn'):
+        if not row[field]:
+            raise ValueError(f"{field} is required")
+
+    row['year'] = parse_year(raw.get('year'))
+    return row
+
+
+class BulkImporter:
+    """Accumulates validated rows and flushes them to the database in chunks"""
+
+    def __init__(self, user_id: int, chunk_size: Optional[int] = None,
+                 max_errors: Optional[int] = None):
+        self.user_id = user_id
+        self.chunk_size = chunk_size or app.config['BULK_IMPORT_CHUNK_SIZE']
+        self.max_errors = max_errors or app.config['BULK_IMPORT_MAX_ERRORS']
+        self.created = 0
+        self.failed = 0
+        self.errors: List[Dict] = []
+        self._chunk: List[Tuple[int, Dict]] = []
+
+    def run(self, rows: Iterable[Tuple[int, object]]) -> Dict:
+        """Import every row and return the per-row report"""
+        for number, raw in rows:
+            try:
+                self._chunk.append((number, validate_row(raw)))
+            except ValueError as e:
+                self._fail(number, str(e))
+                continue
+            if len(self._chunk) >= self.chunk_size:
+                self._flush()
+        self._flush()
+        return self.report()
+
+    def report(self) -> Dict:
+        """Summarize the import; error details are capped at max_errors"""
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+    def _fail(self, number: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': number, 'error': message})
+
+    def _flush(self) -> None:
+        """Insert the pending chunk with one duplicate query and one commit"""
+        if not self._chunk:
+            return
+        chunk, self._chunk = self._chunk, []
+
+        # ISBNs are unique across the whole table, so check against all owners
+        isbns = [row['isbn'] for _, row in chunk]
+        taken = set(db.session.scalars(select(Book.isbn).where(Book.isbn.in_(isbns))))
+
+        pending = []
+        for number, row in chunk:
+            if row['isbn'] in taken:
+                self._fail(number, f"Book with ISBN {row['isbn']} already exists.")
+                continue
+            taken.add(row['isbn'])  # Catch duplicates within the upload
+            pending.append((number, {**row, 'user_id': self.user_id}))
+
+        if not pending:
+            return
+        try:
+            db.session.execute(insert(Book), [row for _, row in pending])  # Single executemany
+            db.session.commit()
+            self.created += len(pending)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Bulk import chunk failed, retrying row by row: {str(e)}")
+            self._insert_one_by_one(pending)
+
+    def _insert_one_by_one(self, pending: List[Tuple[int, Dict]]) -> None:
+        """Slow path after a failed chunk: keep every row that can be saved"""
+        for number, row in pending:
+            try:
+                db.session.execute(insert(Book), [row])
+                db.session.commit()
+                self.created += 1
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Bulk import row {number} failed: {str(e)}")
+                self._fail(number, "Could not save row")
@@ -0,0 +1,223 @@
+# app/services/cache.py
+# Small key/value caches with TTL expiry, LRU eviction and hit/miss counters.
+# MemoryCache lives inside one process; SQLiteCache stores entries in a file so
+# every worker process on the host shares them. Values must be JSON-serializable.
+
+# Standard library imports
+import json  # Value serialization for the SQLite backend
+import os  # Cache directory creation
+import sqlite3  # Shared cache storage
+import threading  # Locks and per-thread connections
+from abc import ABC, abstractmethod  # Backend interface
+import time  # Expiry timestamps
+from collections import OrderedDict  # LRU ordering
+from typing import Any, Dict, Optional  # Type hints
+
+
+class BaseCache(ABC):
+    """Common interface and counters for cache backends"""
+
+    def __init__(self, default_ttl: float = 3600, max_entries: int = 1024):
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # Guards the counters and any in-process state
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None when missing or expired"""
+        value = self._get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value for ttl seconds (default_ttl when omitted)"""
+        expires_at = time.time() + (self.default_ttl if ttl is None else ttl)
+        self._set(key, value, expires_at)
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Store a value only if the key is missing or expired, as one atomic
+        step; returns whether it was stored"""
+        expires_at = time.time() + (self.default_ttl if ttl is None else ttl)
+        return self._add(key, value, expires_at)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters for this process plus the current entry count"""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self)}
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[Any]:
+        """Return the stored value, or None when missing or expired"""
+
+    @abstractmethod
+    def _set(self, key: str, value: Any, expires_at: float) -> None:
+        """Store a value until the given timestamp"""
+
+    @abstractmethod
+    def _add(self, key: str, value: Any, expires_at: float) -> bool:
+        """Store a value unless a live entry exists; returns whether it was stored"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove one entry"""
+
+    @abstractmethod
+    def discard(self, key: str, value: Any) -> bool:
+        """Remove an entry only while it still holds the given value"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every entry"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of stored entries"""
+
+
+class MemoryCache(BaseCache):
+    """Thread-safe in-process LRU cache"""
+
+    def __init__(self, default_ttl: float = 3600, max_entries: int = 1024):
+        super().__init__(default_ttl, max_entries)
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+
+    def _get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)  # Mark as most recently used
+            return value
+
+    def _set(self, key: str, value: Any, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)  # Evict least recently used
+
+    def _add(self, key: str, value: Any, expires_at: float) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                return False
+        self._set(key, value, expires_at)
+        return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard(self, key: str, value: Any) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != value:
+                return False
+            del self._entries[key]
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(BaseCache):
+    """LRU cache stored in an SQLite file shared by all worker processes.
+    A hit refreshes the entry's LRU position at most once per touch_interval
+    seconds, so hot reads do not each turn into a write."""
+
+    def __init__(self, path: str, default_ttl: float = 3600, max_entries: int = 1024,
+                 touch_interval: float = 60):
+        super().__init__(default_ttl, max_entries)
+        self.path = path
+        self.touch_interval = touch_interval
+        self._local = threading.local()  # sqlite3 connections are per thread
+        with self._connection() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY, value TEXT NOT NULL,
+                expires_at REAL NOT NULL, accessed_at REAL NOT NULL)""")
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_accessed ON cache (accessed_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_expires ON cache (expires_at)')
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')  # Readers never wait on writers
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._connection() as conn:
+            row = conn.execute('SELECT value, accessed_at FROM cache WHERE key = ? AND expires_at > ?',
+                               (key, now)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] >= self.touch_interval:
+                conn.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (now, key))
+            return json.loads(row[0])
+
+    def _set(self, key: str, value: Any, expires_at: float) -> None:
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)',
+                         (key, json.dumps(value), expires_at, now))
+            conn.execute('DELETE FROM cache WHERE expires_at <= ?', (now,))
+            # Evict least recently used entries beyond the size bound
+            conn.execute("""DELETE FROM cache WHERE key IN (
+                SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)""",
+                         (self.max_entries,))
+
+    def _add(self, key: str, value: Any, expires_at: float) -> bool:
+        now = time.time()
+        with self._connection() as conn:
+            # Inserts, or replaces an expired entry; a live entry is left alone
+            stored = conn.execute("""
+                INSERT INTO cache VALUES (:key, :value, :expires_at, :now)
+                ON CONFLICT (key) DO UPDATE SET value = excluded.value,
+                    expires_at = excluded.expires_at, accessed_at = excluded.accessed_at
+                WHERE cache.expires_at <= :now""", {
+                    'key': key, 'value': json.dumps(value), 'expires_at': expires_at, 'now': now
+                }).rowcount == 1
+        return stored
+
+    def delete(self, key: str) -> None:
+        with self._connection() as conn:
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def discard(self, key: str, value: Any) -> bool:
+        with self._connection() as conn:
+            return conn.execute('DELETE FROM cache WHERE key = ? AND value = ?',
+                                (key, json.dumps(value))).rowcount == 1
+
+    def clear(self) -> None:
+        with self._connection() as conn:
+            conn.execute('DELETE FROM cache')
+
+    def __len__(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+
+def make_cache(backend: str, path: Optional[str] = None, **options) -> BaseCache:
+    """Build a cache from a backend name ('memory' or 'sqlite')"""
+    if backend == 'memory':
+        return MemoryCache(**options)
+    if backend == 'sqlite':
+        if not path:
+            raise ValueError("The sqlite cache backend needs a file path")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return SQLiteCache(path, **options)
+    raise ValueError(f"Unknown cache backend: {backend}")
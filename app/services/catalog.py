@@ -0,0 +1,104 @@
+# app/services/catalog.py
+# Per-user catalog versions and HTTP validators for conditional GETs.
+# catalog_version holds one row per user whose counter is bumped by triggers
+# on every insert, update and delete of that user's books, so list ETags can
+# be derived from a primary-key lookup instead of reading the list itself.
+
+# Standard library imports
+import hashlib  # ETag digests
+from datetime import datetime, timezone  # Last-Modified values
+from typing import Dict, Optional, Tuple  # Type hints
+
+# Third party imports
+from flask import Response, request  # Conditional request handling
+from sqlalchemy import text  # Raw lookup of the trigger-maintained table
+from sqlalchemy.engine import Connection  # Type hint for DDL helpers
+from werkzeug.http import http_date  # Last-Modified formatting
+
+# Local imports
+from app import db
+
+_NOW = "(julianday('now') - 2440587.5) * 86400.0"  # Unix time with fractions, in SQL
+
+
+def _bump(user_expr: str, condition: str) -> str:
+    """Upsert statement bumping the counter of one user inside a trigger"""
+    return f"""INSERT INTO catalog_version (user_id, version, modified_at)
+        SELECT {user_expr}, 1, {_NOW} WHERE {condition}
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1, modified_at = excluded.modified_at;"""
+
+
+CATALOG_DDL = [
+    """CREATE TABLE IF NOT EXISTS catalog_version (
+        user_id INTEGER PRIMARY KEY, version INTEGER NOT NULL, modified_at REAL NOT NULL
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS catalog_version_ai AFTER INSERT ON book BEGIN
+        {_bump('new.user_id', 'new.user_id IS NOT NULL')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS catalog_version_ad AFTER DELETE ON book BEGIN
+        {_bump('old.user_id', 'old.user_id IS NOT NULL')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS catalog_version_au AFTER UPDATE ON book BEGIN
+        {_bump('new.user_id', 'new.user_id IS NOT NULL')}
+        {_bump('old.user_id', 'old.user_id IS NOT NULL AND old.user_id IS NOT new.user_id')}
+    END""",
+]
+
+
+def install_catalog_version(conn: Connection) -> None:
+    """Create the version table and triggers, seeding users that have books"""
+    for statement in CATALOG_DDL:
+        conn.exec_driver_sql(statement)
+    conn.exec_driver_sql(f"""INSERT INTO catalog_version (user_id, version, modified_at)
+        SELECT user_id, 1, {_NOW} FROM book WHERE user_id IS NOT NULL GROUP BY user_id
+        ON CONFLICT (user_id) DO NOTHING""")
+
+
+def drop_catalog_version(conn: Connection) -> None:
+    """Remove the version table and its triggers"""
+    for trigger in ('catalog_version_ai', 'catalog_version_ad', 'catalog_version_au'):
+        conn.exec_driver_sql(f'DROP TRIGGER IF EXISTS {trigger}')
+    conn.exec_driver_sql('DROP TABLE IF EXISTS catalog_version')
+
+
+def catalog_version(user_id: int) -> Tuple[int, Optional[datetime]]:
+    """The user's catalog version and when it last changed (0, None before any book)"""
+    row = db.session.execute(
+        text('SELECT version, modified_at FROM catalog_version WHERE user_id = :user_id'),
+        {'user_id': user_id}).first()
+    if row is None:
+        return 0, None
+    return row.version, datetime.fromtimestamp(row.modified_at, timezone.utc)
+
+
+def make_etag(*parts: object) -> str:
+    """Strong entity tag for a representation identified by `parts`"""
+    return hashlib.sha1(':'.join(map(str, parts)).encode()).hexdigest()[:20]
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Naive datetimes from the database are stored in UTC"""
+    if value is not None and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime]) -> Dict[str, str]:
+    """ETag, Last-Modified and a Cache-Control that makes clients revalidate"""
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    return headers
+
+
+def not_modified(etag: str, last_modified: Optional[datetime]) -> Optional[Response]:
+    """A 304 response when the client's copy is current, otherwise None"""
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)  # If-None-Match uses weak comparison
+    elif request.if_modified_since and last_modified is not None:
+        fresh = last_modified.replace(microsecond=0) <= request.if_modified_since
+    else:
+        fresh = False
+    if not fresh:
+        return None
+    return Response(status=304, headers=validator_headers(etag, last_modified))
@@ -0,0 +1,90 @@
+# app/services/export.py
+# Streaming export of a user's catalog as NDJSON or CSV.
+# Rows are read in keyset-paginated batches of plain tuples (no ORM objects)
+# and encoded batch by batch, so memory use is bounded by the batch size and
+# the first bytes go out as soon as the first batch is read.
+
+# Standard library imports
+import csv  # CSV encoding
+import io  # In-memory buffer for one CSV batch
+import json  # NDJSON encoding
+import zlib  # Incremental gzip compression
+from typing import Iterable, Iterator, List, Optional, Tuple  # Type hints
+
+# Third party imports
+from sqlalchemy import select, tuple_  # Column-only keyset queries
+
+# Local imports
+from app import app, db
+from app.models.book import Book
+
+# Export columns, matching the keys of Book.to_dict()
+EXPORT_COLUMNS = ['id', 'title', 'author', 'year', 'isbn', 'genre', 'created_at', 'user_id']
+
+# Content type and file extension for each format
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+
+def iter_book_batches(user_id: int, batch_size: Optional[int] = None) -> Iterator[List[Tuple]]:
+    """Yield a user's books as lists of row tuples, one keyset page at a time"""
+    batch_size = batch_size or app.config['EXPORT_BATCH_SIZE']
+    columns = [getattr(Book, name) for name in EXPORT_COLUMNS]
+    created_at = EXPORT_COLUMNS.index('created_at')
+
+    last_key = None
+    while True:
+        query = select(*columns).where(Book.user_id == user_id)
+        if last_key:
+            query = query.where(tuple_(Book.created_at, Book.id) > last_key)
+        rows = db.session.execute(
+            query.order_by(Book.created_at, Book.id).limit(batch_size)).all()
+        if not rows:
+            return
+        yield rows
+        last_key = (rows[-1][created_at], rows[-1][0])
+
+
+def _jsonable(row: Tuple) -> dict:
+    record = dict(zip(EXPORT_COLUMNS, row))
+    if record['created_at'] is not None:
+        record['created_at'] = record['created_at'].isoformat()
+    return record
+
+
+def encode_ndjson(batches: Iterable[List[Tuple]]) -> Iterator[str]:
+    """Encode row batches as newline-delimited JSON, one chunk per batch"""
+    for rows in batches:
+        yield ''.join(json.dumps(_jsonable(row)) + '\n' for row in rows)
+
+
+def encode_csv(batches: Iterable[List[Tuple]]) -> Iterator[str]:
+    """Encode row batches as CSV with a header row, one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows(_jsonable(row).values() for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()  # Header only: the user has no books
+
+
+def gzip_stream(chunks: Iterable[str]) -> Iterator[bytes]:
+    """Compress text chunks into a gzip stream as they are produced"""
+    compressor = zlib.compressobj(wbits=31)  # 31 selects the gzip container
+    for chunk in chunks:
+        # Sync-flush every batch so it reaches the client now, not when zlib's buffer fills
+        yield compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def export_books(user_id: int, fmt: str, compress: bool = False) -> Iterable:
+    """Return the response body iterator for an export"""
+    encoder = encode_csv if fmt == 'csv' else encode_ndjson
+    chunks = encoder(iter_book_batches(user_id))
+    return gzip_stream(chunks) if compress else chunks
@@ -0,0 +1,76 @@
+# app/services/fragments.py
+# Rendered HTML for the books list page.
+# Whole pages are stored under the user's catalog version (bumped by triggers
+# on every insert, update and delete of their books) together with the cursor,
+# page size and search query, so a page is rendered once per change and every
+# later view replays the stored HTML. Each book's block is stored under its id
+# and updated_at, so rebuilding a page after a change renders only the books
+# that changed. Entries for old versions are never looked up again and age out
+# through the LRU bound. With FRAGMENT_CACHE_BACKEND='sqlite' all worker
+# processes share one cache.
+
+# Standard library imports
+from typing import Iterable, List  # Type hints
+
+# Third-party imports
+from flask import render_template  # Book fragments
+from markupsafe import Markup  # Pre-rendered HTML in templates
+
+# Local imports
+from app import app
+from app.models.book import Book
+from app.services.cache import BaseCache, make_cache
+from app.services.catalog import make_etag
+
+# Templates whose output is cached; a change to any of them starts a new namespace
+FRAGMENT_TEMPLATES = ('base.html', 'books/list.html', 'books/_book.html')
+
+
+def get_fragment_cache() -> BaseCache:
+    """Return the app-wide fragment cache, creating it on first use"""
+    cache = app.extensions.get('fragment_cache')
+    if cache is None:
+        cache = make_cache(
+            app.config['FRAGMENT_CACHE_BACKEND'],
+            path=app.config['FRAGMENT_CACHE_PATH'],
+            default_ttl=app.config['FRAGMENT_CACHE_TTL'],
+            max_entries=app.config['FRAGMENT_CACHE_MAX_ENTRIES']
+        )
+        app.extensions['fragment_cache'] = cache
+    return cache
+
+
+def template_digest() -> str:
+    """Digest of the cached templates, so a shared cache never serves HTML
+    rendered by an older deploy"""
+    digest = app.extensions.get('fragment_templates')
+    if digest is None:
+        env = app.jinja_env
+        digest = make_etag(*(env.loader.get_source(env, name)[0] for name in FRAGMENT_TEMPLATES))
+        app.extensions['fragment_templates'] = digest
+    return digest
+
+
+def page_key(user_id: int, etag: str) -> str:
+    """Cache key of a books page; the ETag covers version, cursor, limit and query"""
+    return f'books-page:{template_digest()}:{user_id}:{etag}'
+
+
+def book_key(book: Book) -> str:
+    """Cache key of one book's block, changing whenever the book is updated"""
+    stamp = book.updated_at or book.created_at
+    return f'book:{template_digest()}:{book.user_id}:{book.id}:{stamp.isoformat() if stamp else ""}'
+
+
+def render_books(books: Iterable[Book]) -> List[Markup]:
+    """Each book's block, rendered only when it is not cached yet"""
+    cache = get_fragment_cache()
+    fragments = []
+    for book in books:
+        key = book_key(book)
+        html = cache.get(key)
+        if html is None:
+            html = render_template('books/_book.html', book=book)
+            cache.set(key, html)
+        fragments.append(Markup(html))
+    return fragments
@@ -0,0 +1,92 @@
+# app/services/jobs.py
+# Background recommendation jobs.
+# A POST in job mode enqueues generate_recommendations and returns at once;
+# clients poll the job id for the result. A user's identical preference sets
+# share a single job while it is queued, running or recently finished; the
+# claim is one atomic insert on the shared registry file, so concurrent workers
+# cannot both start it. Jobs are visible only to the user who submitted them.
+
+# Standard library imports
+import uuid  # Job identifiers
+from typing import Dict, Optional  # Type hints
+
+# Third party imports
+from celery.result import AsyncResult  # Job state lookup
+
+# Local imports
+from app import app, celery
+from app.services.ai_service import recommendation_cache_key
+from app.services.cache import BaseCache, make_cache
+from app.tasks import generate_recommendations
+
+# Celery states mapped to the statuses reported to clients
+JOB_STATUSES = {
+    'PENDING': 'pending',
+    'RECEIVED': 'pending',
+    'STARTED': 'running',
+    'RETRY': 'running',
+    'SUCCESS': 'done',
+    'FAILURE': 'failed',
+    'REVOKED': 'failed',
+}
+
+
+def get_job_registry() -> BaseCache:
+    """Return the app-wide registry of submitted jobs. It is always the shared
+    file: a client may poll a different worker process than the one it posted to."""
+    registry = app.extensions.get('ai_jobs')
+    if registry is None:
+        registry = make_cache('sqlite', path=app.config['AI_JOB_PATH'],
+                              default_ttl=app.config['AI_JOB_TTL'])
+        app.extensions['ai_jobs'] = registry
+    return registry
+
+
+def submit_recommendation_job(preferences: Dict, user_id: int) -> str:
+    """Enqueue a recommendation job for a user, or return the id of their identical one"""
+    registry = get_job_registry()
+    request_key = f'request:{user_id}:' + recommendation_cache_key(preferences)
+
+    job_id = uuid.uuid4().hex
+    registry.set('job:' + job_id, user_id)  # Owner record, pollable once the claim below wins
+    while not registry.add(request_key, job_id):
+        existing = registry.get(request_key)
+        if existing is None:
+            continue  # Expired or released in between; claim it again
+        if AsyncResult(existing, app=celery).state not in ('FAILURE', 'REVOKED'):
+            registry.delete('job:' + job_id)
+            return existing  # Collapse onto the job already queued or finished
+        registry.discard(request_key, existing)  # Only if no other worker replaced it yet
+
+    generate_recommendations.apply_async(args=[preferences], task_id=job_id)
+    return job_id
+
+
+def job_accepted(job_id: str) -> Dict:
+    """Body of the 202 response returned when a job is submitted"""
+    return {
+        'success': True,
+        'job_id': job_id,
+        'status': 'pending',
+        'status_url': f'/api/ai/jobs/{job_id}'
+    }
+
+
+def wants_job_mode(args) -> bool:
+    """True when the request asks for background processing (?async=true)"""
+    return args.get('async', '').lower() in ('1', 'true', 'yes')
+
+
+def get_job(job_id: str, user_id: int) -> Optional[Dict]:
+    """Report the status of a user's job, with its result once done; None if
+    unknown or submitted by someone else"""
+    if get_job_registry().get('job:' + job_id) != user_id:
+        return None
+
+    result = AsyncResult(job_id, app=celery)
+    job = {'job_id': job_id, 'status': JOB_STATUSES.get(result.state, 'pending')}
+    if job['status'] == 'done':
+        job['recommendations'] = result.result
+    elif job['status'] == 'failed':
+        job['message'] = str(result.result)
+    return job
@@ -0,0 +1,65 @@
+# app/services/json_stream.py
+# Incremental parsing of a JSON array of objects arriving in arbitrary chunks.
+# Each element is decoded as soon as its closing brace arrives, so callers can
+# act on the first object long before the array is complete. Text before the
+# opening bracket (such as a Markdown code fence) is ignored.
+
+# Standard library imports
+import json  # Element decoding
+from typing import Any, List  # Type hints
+
+
+class JSONArrayStreamParser:
+    """Feed text chunks, get back every array element completed so far"""
+
+    def __init__(self):
+        self._buffer = ''
+        self._pos = 0  # Next character to scan
+        self._start = None  # Start of the current element
+        self._depth = 0  # Nesting depth inside the current element
+        self._in_string = False
+        self._escaped = False
+        self.started = False  # Seen the opening '['
+        self.finished = False  # Seen the closing ']'
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Consume a chunk and return the elements it completed"""
+        if self.finished or not chunk:
+            return []
+        self._buffer += chunk
+        completed = []
+        buffer, pos = self._buffer, self._pos
+        while pos < len(buffer):
+            char = buffer[pos]
+            if not self.started:
+                self.started = char == '['
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                if self._depth == 0:
+                    self._start = pos
+                self._depth += 1
+            elif char in '}]':
+                if self._depth == 0 and char == ']':
+                    self.finished = True
+                    break
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.append(json.loads(buffer[self._start:pos + 1]))
+                    self._start = None
+            pos += 1
+
+        # Keep only the unfinished element so the buffer stays small
+        keep_from = self._start if self._start is not None else pos
+        self._buffer = buffer[keep_from:]
+        if self._start is not None:
+            self._start = 0
+        self._pos = pos - keep_from
+        return completed
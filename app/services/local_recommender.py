@@ -0,0 +1,256 @@
+# app/services/local_recommender.py
+# Offline book recommendations from the catalogs of every user.
+# Books are grouped into works by (title, author) and indexed in sparse
+# posting lists: author -> works/users, genre -> works/users and title term
+# -> works with document frequencies for TF-IDF. A query scores works by
+# content match (preferred authors and genres, genre words in titles) plus
+# collaborative evidence from readers whose shelves share those tastes.
+# The index is built once per process in a background thread (started when
+# the recommender is created) and then refreshed incrementally: only users
+# whose catalog_version changed since the last refresh are re-read. Until the
+# first build finishes, recommend() answers with an empty list at once rather
+# than making the request that needed a fallback wait for it.
+
+# Standard library imports
+import heapq  # Most-shelved works per reader
+import math  # IDF and normalization
+import re  # Title tokenization
+import threading  # Serializes refreshes
+import time  # Refresh throttling
+from collections import Counter, defaultdict  # Sparse vectors
+from typing import Dict, Iterable, List, Optional, Tuple  # Type hints
+
+# Third party imports
+from sqlalchemy import select, text  # Catalog reads
+
+# Local imports
+from app import app, db
+from app.models.book import Book
+
+WorkKey = Tuple[str, str]  # (casefolded title, casefolded author)
+
+# Score weights
+AUTHOR_MATCH = 3.0  # Work by a preferred author
+GENRE_MATCH = 2.0  # Scaled by the share of copies shelved under the genre
+TITLE_MATCH = 0.5  # TF-IDF of genre words found in the title
+READER_MATCH = 1.0  # Per related reader, normalized by shelf size
+POPULARITY = 0.1  # log(1 + copies) tie-breaker
+RELATED_READERS = 50  # Readers considered for collaborative scoring
+READER_SHELF_WORKS = 200  # Works taken from each related reader's shelf (most shelved first)
+MAX_PER_AUTHOR = 2  # Keep one prolific author from filling the list
+
+STOP_WORDS = {'the', 'and', 'for', 'with', 'from', 'into', 'that', 'this', 'our', 'your'}
+
+
+def _norm(value: Optional[str]) -> str:
+    return ' '.join(str(value or '').split()).casefold()
+
+
+def title_terms(title: str) -> List[str]:
+    """Lowercase word tokens worth indexing"""
+    return [t for t in re.findall(r'\w+', _norm(title)) if len(t) > 2 and t not in STOP_WORDS]
+
+
+class LocalRecommender:
+    """In-memory recommendation index over all users' books"""
+
+    def __init__(self, refresh_interval: float = 0):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._ready = threading.Event()  # Set once the first full build is done
+        self._warm_thread: Optional[threading.Thread] = None
+        self._checked_at = float('-inf')
+        self._versions: Dict[int, int] = {}
+        self._shelves: Dict[int, List[Tuple[WorkKey, str]]] = {}  # user -> [(work, genre)]
+        self._user_works: Dict[int, Tuple[int, Tuple[WorkKey, ...]]] = {}  # user -> (distinct works, sample)
+        self._copies: Counter = Counter()  # work -> copies across users
+        self._display: Dict[WorkKey, Tuple[str, str]] = {}  # work -> (title, author) as entered
+        self._work_genres: Dict[WorkKey, Counter] = defaultdict(Counter)
+        self._author_works: Dict[str, Counter] = defaultdict(Counter)
+        self._genre_works: Dict[str, Counter] = defaultdict(Counter)
+        self._author_users: Dict[str, Counter] = defaultdict(Counter)
+        self._genre_users: Dict[str, Counter] = defaultdict(Counter)
+        self._term_works: Dict[str, Counter] = defaultdict(Counter)
+
+    # Index maintenance
+    @staticmethod
+    def _post(index: Dict[str, Counter], key: str, posting, delta: int) -> None:
+        """Adjust one posting, dropping it (and its list) once it reaches zero"""
+        postings = index[key]
+        postings[posting] += delta
+        if postings[posting] <= 0:
+            del postings[posting]
+            if not postings:
+                del index[key]
+
+    def _apply(self, user_id: int, shelf: Iterable[Tuple[WorkKey, str]], delta: int) -> None:
+        """Add (delta=1) or remove (delta=-1) one user's books from every posting list"""
+        for work, genre in shelf:
+            author = work[1]
+            self._copies[work] += delta
+            self._work_genres[work][genre] += delta
+            self._post(self._author_works, author, work, delta)
+            self._post(self._author_users, author, user_id, delta)
+            if genre:
+                self._post(self._genre_works, genre, work, delta)
+                self._post(self._genre_users, genre, user_id, delta)
+            if delta > 0 and self._copies[work] == 1:
+                for term in set(title_terms(work[0])):
+                    self._post(self._term_works, term, work, 1)
+            elif delta < 0 and self._copies[work] <= 0:
+                for term in set(title_terms(work[0])):
+                    self._post(self._term_works, term, work, -1)
+                del self._copies[work], self._display[work], self._work_genres[work]
+
+    def _load(self, user_ids: List[int]) -> None:
+        """Read the given users' books and add them to the index"""
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            shelves: Dict[int, List[Tuple[WorkKey, str]]] = {user_id: [] for user_id in chunk}
+            rows = db.session.execute(select(Book.user_id, Book.title, Book.author, Book.genre)
+                                      .where(Book.user_id.in_(chunk)))
+            for user_id, title, author, genre in rows:
+                work = (_norm(title), _norm(author))
+                self._display.setdefault(work, (title, author))
+                shelves[user_id].append((work, _norm(genre)))
+            for user_id, shelf in shelves.items():
+                self._shelves[user_id] = shelf
+                self._apply(user_id, shelf, 1)
+        for user_id in user_ids:  # Once every copy is counted
+            works = {work for work, _ in self._shelves[user_id]}
+            sample = heapq.nlargest(READER_SHELF_WORKS, works, key=lambda w: (self._copies[w], w))
+            self._user_works[user_id] = (len(works), tuple(sample))
+
+    def warm(self) -> None:
+        """Build the whole index now (needs an app context)"""
+        self.refresh()
+        self._ready.set()
+
+    def warm_in_background(self) -> None:
+        """Build the whole index in a daemon thread, once per recommender"""
+        with self._lock:
+            if self._warm_thread is not None:
+                return
+            self._warm_thread = threading.Thread(target=self._warm_with_context,
+                                                 name='local-recommender-warm', daemon=True)
+        self._warm_thread.start()
+
+    def _warm_with_context(self) -> None:
+        with app.app_context():
+            try:
+                self.warm()
+            except Exception as e:
+                app.logger.error(f"Building the local recommendation index failed: {str(e)}")
+                with self._lock:
+                    self._warm_thread = None  # Let the next request try again
+
+    def refresh(self) -> None:
+        """Re-index users whose catalog changed since the last refresh"""
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = now
+
+        versions = dict(db.session.execute(
+            text('SELECT user_id, version FROM catalog_version')).all())
+        stale = [u for u in self._versions if versions.get(u) != self._versions[u]]
+        for user_id in stale:
+            self._apply(user_id, self._shelves.pop(user_id, []), -1)
+            self._user_works.pop(user_id, None)
+            del self._versions[user_id]
+        changed = [u for u, v in versions.items() if self._versions.get(u) != v]
+        if changed:
+            self._load(changed)
+        self._versions.update((u, versions[u]) for u in changed)
+
+    # Queries
+    def _related_readers(self, authors: List[str], genres: List[str]) -> Counter:
+        readers: Counter = Counter()
+        for author in authors:
+            for user_id in self._author_users.get(author, ()):
+                readers[user_id] += 1.0
+        for genre in genres:
+            for user_id, count in self._genre_users.get(genre, {}).items():
+                readers[user_id] += count / max(len(self._shelves.get(user_id, ())), 1)
+        return Counter(dict(readers.most_common(RELATED_READERS)))
+
+    def score(self, preferences: Dict[str, List[str]]) -> Counter:
+        """Sparse work -> score vector for normalized preferences"""
+        authors, genres = preferences.get('authors', []), preferences.get('genres', [])
+        scores: Counter = Counter()
+
+        for author in authors:
+            for work in self._author_works.get(author, ()):
+                scores[work] += AUTHOR_MATCH
+        for genre in genres:
+            for work, count in self._genre_works.get(genre, {}).items():
+                scores[work] += GENRE_MATCH * count / self._copies[work]
+
+        total_works = max(len(self._copies), 1)
+        for term in {t for genre in genres for t in title_terms(genre)}:
+            postings = self._term_works.get(term, {})
+            idf = math.log(1 + total_works / (1 + len(postings)))
+            for work in postings:
+                scores[work] += TITLE_MATCH * idf / math.sqrt(len(title_terms(work[0])))
+
+        for user_id, weight in self._related_readers(authors, genres).items():
+            size, sample = self._user_works.get(user_id, (0, ()))
+            boost = READER_MATCH * weight / math.sqrt(size or 1)
+            for work in sample:
+                scores[work] += boost
+
+        for work in scores:
+            scores[work] += POPULARITY * math.log1p(self._copies[work])
+        return scores
+
+    def recommend(self, preferences: Dict[str, List[str]], limit: int = 5) -> List[Dict]:
+        """Top works as recommendation dicts (title, author, description, genre);
+        empty while the index is still being built"""
+        if not self._ready.is_set():
+            self.warm_in_background()
+            return []
+        authors = set(preferences.get('authors', []))
+        with self._lock:  # Refreshes change the posting lists being scored
+            self._refresh()
+            scores = self.score(preferences)
+
+            picks, per_author = [], Counter()
+            for work, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0])):
+                if per_author[work[1]] >= MAX_PER_AUTHOR:
+                    continue
+                per_author[work[1]] += 1
+                picks.append(self._describe(work, work[1] in authors))
+                if len(picks) == limit:
+                    break
+        return picks
+
+    def _describe(self, work: WorkKey, favorite_author: bool) -> Dict:
+        title, author = self._display[work]
+        genres = Counter({g: n for g, n in self._work_genres[work].items() if g and n > 0})
+        genre = genres.most_common(1)[0][0].title() if genres else ''
+        copies = self._copies[work]
+        if favorite_author:
+            description = f'More from {author}, one of your favorite authors.'
+        else:
+            description = f'On the shelves of {copies} reader{"s" if copies != 1 else ""} with similar tastes.'
+        return {'title': title, 'author': author, 'description': description, 'genre': genre}
+
+
+_recommender_lock = threading.Lock()
+
+
+def get_local_recommender() -> LocalRecommender:
+    """Return the app-wide local recommender, creating it on first use"""
+    recommender = app.extensions.get('ai_local')
+    if recommender is None:
+        with _recommender_lock:
+            recommender = app.extensions.get('ai_local')
+            if recommender is None:
+                recommender = LocalRecommender(app.config['AI_LOCAL_REFRESH_INTERVAL'])
+                recommender.warm_in_background()
+                app.extensions['ai_local'] = recommender
+    return recommender
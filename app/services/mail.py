@@ -0,0 +1,351 @@
+# app/services/mail.py
+# Outgoing mail pipeline.
+# Messages are queued in an SQLite outbox shared by every web and worker
+# process; a Celery flush task claims due messages in batches and sends them
+# over one reused SMTP connection. Failed sends are retried with exponential
+# backoff until MAIL_MAX_ATTEMPTS, permanent (5xx) rejections go straight to
+# 'dead', and each recipient domain is held to its own rate limit through the
+# same limits storage and strategy as the HTTP rate limiter.
+# For development, point MAIL_SERVER/MAIL_PORT at a local debugging server
+# (the smtpd module was removed in Python 3.12), for example:
+#   pip install aiosmtpd && python -m aiosmtpd -n -l localhost:1025
+# tests/test_mail.py has a minimal in-process DebuggingSMTPServer as well.
+
+# Standard library imports
+import json  # Id lists for single-statement updates
+import os  # Outbox directory creation
+import random  # Backoff jitter
+import smtplib  # SMTP delivery
+import sqlite3  # Outbox storage
+import threading  # Per-thread connections
+import time  # Scheduling and metrics
+from email.message import EmailMessage  # Message construction
+from typing import Dict, List, Optional, Tuple  # Type hints
+
+# Third-party imports
+import click  # CLI output
+from limits import parse as parse_limit  # Per-domain limits
+from limits.storage import storage_from_string  # Shared counter storage
+from limits.strategies import STRATEGIES  # Rate limiting strategies
+
+# Local imports
+from app import app
+from app import ratelimit  # noqa: F401 - registers the sqlite:// storage and sliding-window-counter strategy
+
+OUTBOX_DDL = [
+    """CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY,
+        recipient TEXT NOT NULL,
+        domain TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        body TEXT NOT NULL,
+        reply_to TEXT,
+        status TEXT NOT NULL DEFAULT 'queued',  -- queued, sent or dead
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        claimed_until REAL NOT NULL DEFAULT 0,  -- Lease held by the sending worker
+        last_error TEXT,
+        created_at REAL NOT NULL,
+        sent_at REAL
+    )""",
+    'CREATE INDEX IF NOT EXISTS ix_outbox_due ON outbox (status, next_attempt_at)',
+    'CREATE INDEX IF NOT EXISTS ix_outbox_sent ON outbox (sent_at) WHERE sent_at IS NOT NULL',
+    """CREATE TABLE IF NOT EXISTS outbox_meta (
+        name TEXT PRIMARY KEY, value REAL NOT NULL
+    )""",
+]
+
+COUNTERS = ('sent_total', 'retried_total', 'dead_total', 'deferred_total')
+
+
+class Outbox:
+    """Durable queue of outgoing messages in an SQLite file"""
+
+    PURGE_EVERY = 100  # Batches marked sent between sweeps of old sent rows
+
+    def __init__(self, path: str, sent_retention: float = 86400):
+        self.path = path
+        self.sent_retention = sent_retention
+        self._local = threading.local()
+        self._marked = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        for statement in OUTBOX_DDL:
+            conn.execute(statement)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit: each statement is its own short transaction
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    # Producers
+    def enqueue(self, recipient: str, subject: str, body: str, reply_to: Optional[str] = None) -> int:
+        """Queue a message for the next flush and return its id"""
+        now = time.time()
+        domain = recipient.rpartition('@')[2].strip().lower()
+        return self._connection().execute("""
+            INSERT INTO outbox (recipient, domain, subject, body, reply_to, next_attempt_at, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (recipient, domain, subject, body, reply_to, now, now)).lastrowid
+
+    def request_flush(self, lease: float) -> bool:
+        """True for the first caller since the last flush started (or since
+        `lease` seconds ago), so a burst of messages schedules one flush"""
+        now = time.time()
+        return self._connection().execute("""
+            INSERT INTO outbox_meta (name, value) VALUES ('flush_requested_at', :now)
+            ON CONFLICT (name) DO UPDATE SET value = :now WHERE value <= :now - :lease""",
+            {'now': now, 'lease': lease}).rowcount == 1
+
+    def flush_started(self) -> None:
+        """Let the next enqueued message schedule another flush"""
+        self._connection().execute("DELETE FROM outbox_meta WHERE name = 'flush_requested_at'")
+
+    # Consumers
+    def claim(self, limit: int, lease: float) -> List[Tuple]:
+        """Lease up to `limit` due messages: (id, recipient, domain, subject, body, reply_to, attempts).
+        Messages of a worker that dies mid-batch become due again once the lease runs out."""
+        now = time.time()
+        return self._connection().execute("""
+            UPDATE outbox SET claimed_until = :until
+            WHERE id IN (SELECT id FROM outbox
+                         WHERE status = 'queued' AND next_attempt_at <= :now AND claimed_until <= :now
+                         ORDER BY next_attempt_at, id LIMIT :limit)
+            RETURNING id, recipient, domain, subject, body, reply_to, attempts""",
+            {'now': now, 'until': now + lease, 'limit': limit}).fetchall()
+
+    def mark_sent(self, ids: List[int]) -> None:
+        if not ids:
+            return
+        now = time.time()
+        conn = self._connection()
+        conn.execute("""UPDATE outbox SET status = 'sent', sent_at = ?, claimed_until = 0
+            WHERE id IN (SELECT value FROM json_each(?))""", (now, json.dumps(ids)))
+        self._count('sent_total', len(ids))
+        self._marked += 1
+        if self._marked % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?",
+                         (now - self.sent_retention,))
+
+    def mark_failed(self, message_id: int, attempts: int, error: str, retry_in: Optional[float]) -> None:
+        """Record a failed attempt; retry after `retry_in` seconds, or give up when None"""
+        if retry_in is None:
+            self._connection().execute("""
+                UPDATE outbox SET status = 'dead', attempts = ?, last_error = ?, claimed_until = 0
+                WHERE id = ?""", (attempts, error, message_id))
+            self._count('dead_total')
+        else:
+            self._connection().execute("""
+                UPDATE outbox SET attempts = ?, last_error = ?, next_attempt_at = ?, claimed_until = 0
+                WHERE id = ?""", (attempts, error, time.time() + retry_in, message_id))
+            self._count('retried_total')
+
+    def defer(self, ids: List[int], until: float) -> None:
+        """Put messages back without using up an attempt (rate limited)"""
+        if not ids:
+            return
+        self._connection().execute("""UPDATE outbox SET next_attempt_at = ?, claimed_until = 0
+            WHERE id IN (SELECT value FROM json_each(?))""", (until, json.dumps(ids)))
+        self._count('deferred_total', len(ids))
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        self._connection().execute("""
+            INSERT INTO outbox_meta (name, value) VALUES (?, ?)
+            ON CONFLICT (name) DO UPDATE SET value = value + excluded.value""", (name, amount))
+
+    # Metrics
+    def metrics(self) -> Dict[str, float]:
+        """Queue depth, lifetime counters and recent throughput"""
+        now = time.time()
+        conn = self._connection()
+        due, waiting, in_flight, oldest = conn.execute("""
+            SELECT COALESCE(SUM(next_attempt_at <= :now AND claimed_until <= :now), 0),
+                   COALESCE(SUM(next_attempt_at > :now AND claimed_until <= :now), 0),
+                   COALESCE(SUM(claimed_until > :now), 0),
+                   MIN(created_at)
+            FROM outbox WHERE status = 'queued'""", {'now': now}).fetchone()
+        stats = {
+            'queued': due,  # Ready to send
+            'waiting': waiting,  # Backing off or rate limited
+            'in_flight': in_flight,  # Claimed by a worker
+            'dead': conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'dead'").fetchone()[0],
+            'oldest_queued_seconds': round(now - oldest, 3) if oldest is not None else 0,
+            'sent_last_minute': conn.execute(
+                'SELECT COUNT(*) FROM outbox WHERE sent_at >= ?', (now - 60,)).fetchone()[0],
+        }
+        counters = dict(conn.execute(
+            f"SELECT name, value FROM outbox_meta WHERE name IN ({','.join('?' * len(COUNTERS))})",
+            COUNTERS).fetchall())
+        stats.update({name: int(counters.get(name, 0)) for name in COUNTERS})
+        return stats
+
+    def clear(self) -> None:
+        conn = self._connection()
+        conn.execute('DELETE FROM outbox')
+        conn.execute('DELETE FROM outbox_meta')
+
+
+class DomainRateLimiter:
+    """Per-recipient-domain send budget shared by every worker"""
+
+    def __init__(self, storage_uri: str, strategy: str, default: str, overrides: Dict[str, str]):
+        self.limiter = STRATEGIES[strategy](storage_from_string(storage_uri))
+        self.default = parse_limit(default)
+        self.overrides = {domain.lower(): parse_limit(limit) for domain, limit in overrides.items()}
+
+    def acquire(self, domain: str) -> Optional[float]:
+        """None when a message to `domain` may go out now, else when to try again"""
+        item = self.overrides.get(domain, self.default)
+        if self.limiter.hit(item, 'mail', domain):
+            return None
+        return self.limiter.get_window_stats(item, 'mail', domain).reset_time
+
+
+class SMTPSession:
+    """One SMTP connection, opened on first use and reused for every message"""
+
+    def __init__(self, config):
+        self.config = config
+        self.connections = 0  # Connections opened, for tests and metrics
+        self._smtp: Optional[smtplib.SMTP] = None
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.config['MAIL_SERVER'], self.config['MAIL_PORT'],
+                            timeout=self.config['MAIL_TIMEOUT'])
+        if self.config['MAIL_USE_TLS']:
+            smtp.starttls()
+        if self.config['MAIL_USERNAME']:
+            smtp.login(self.config['MAIL_USERNAME'], self.config['MAIL_PASSWORD'])
+        self.connections += 1
+        return smtp
+
+    def send(self, message: EmailMessage) -> None:
+        """Send one message, reconnecting once if the server dropped the connection"""
+        if self._smtp is None:
+            self._smtp = self._connect()
+        try:
+            self._smtp.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            self._smtp = self._connect()
+            self._smtp.send_message(message)
+
+    def close(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
+
+
+def build_message(recipient: str, subject: str, body: str, reply_to: Optional[str] = None) -> EmailMessage:
+    message = EmailMessage()
+    message['From'] = app.config['MAIL_DEFAULT_SENDER']
+    message['To'] = recipient
+    message['Subject'] = subject
+    if reply_to:
+        message['Reply-To'] = reply_to
+    message.set_content(body)
+    return message
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with up to 10% jitter so retries do not arrive in lockstep"""
+    delay = min(app.config['MAIL_RETRY_BASE'] * 2 ** (attempts - 1), app.config['MAIL_RETRY_MAX'])
+    return delay * (1 + random.random() / 10)
+
+
+def smtp_error_code(error: Exception) -> Optional[int]:
+    """SMTP reply code carried by an error, if any"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return min(code for code, _ in error.recipients.values())
+    return getattr(error, 'smtp_code', None)
+
+
+def deliver_outbox(session: Optional[SMTPSession] = None) -> Dict[str, int]:
+    """Send due messages batch by batch over one connection until the outbox
+    is drained or MAIL_FLUSH_TIME_BUDGET runs out"""
+    config = app.config
+    outbox, limiter = get_outbox(), get_domain_limiter()
+    session = session or SMTPSession(config)
+    deadline = time.monotonic() + config['MAIL_FLUSH_TIME_BUDGET']
+    report = {'sent': 0, 'retried': 0, 'dead': 0, 'deferred': 0}
+
+    outbox.flush_started()
+    try:
+        while time.monotonic() < deadline:
+            batch = outbox.claim(config['MAIL_BATCH_SIZE'], config['MAIL_CLAIM_LEASE'])
+            if not batch:
+                break
+            sent, deferred, blocked = [], {}, {}  # blocked: domain -> retry time
+            for position, (message_id, recipient, domain, subject, body, reply_to, attempts) in enumerate(batch):
+                until = blocked.get(domain) or limiter.acquire(domain)
+                if until is not None:
+                    blocked[domain] = until
+                    deferred.setdefault(until, []).append(message_id)
+                    continue
+                try:
+                    session.send(build_message(recipient, subject, body, reply_to))
+                    sent.append(message_id)
+                except (smtplib.SMTPException, OSError) as error:
+                    attempts += 1
+                    code = smtp_error_code(error)
+                    permanent = code is not None and code >= 500
+                    give_up = permanent or attempts >= config['MAIL_MAX_ATTEMPTS']
+                    outbox.mark_failed(message_id, attempts, f'{type(error).__name__}: {error}',
+                                       None if give_up else retry_delay(attempts))
+                    report['dead' if give_up else 'retried'] += 1
+                    if code is None:  # Connection-level failure: the server is unreachable
+                        app.logger.warning(f"Mail server unavailable: {error}")
+                        outbox.defer([row[0] for row in batch[position + 1:]],
+                                     time.time() + retry_delay(1))
+                        session.close()
+                        deadline = 0
+                        break
+            outbox.mark_sent(sent)
+            for until, ids in deferred.items():
+                outbox.defer(ids, until)
+            report['sent'] += len(sent)
+            report['deferred'] += sum(len(ids) for ids in deferred.values())
+    finally:
+        session.close()
+    return report
+
+
+# Per-process singletons
+def get_outbox() -> Outbox:
+    """Return the app-wide outbox"""
+    outbox = app.extensions.get('mail_outbox')
+    if outbox is None:
+        outbox = Outbox(app.config['MAIL_OUTBOX_PATH'], app.config['MAIL_SENT_RETENTION'])
+        app.extensions['mail_outbox'] = outbox
+    return outbox
+
+
+def get_domain_limiter() -> DomainRateLimiter:
+    """Return the app-wide per-domain rate limiter"""
+    limiter = app.extensions.get('mail_limiter')
+    if limiter is None:
+        limiter = DomainRateLimiter(app.config['RATELIMIT_STORAGE_URI'], app.config['RATELIMIT_STRATEGY'],
+                                    app.config['MAIL_DOMAIN_RATE_LIMIT'], app.config['MAIL_DOMAIN_RATE_LIMITS'])
+        app.extensions['mail_limiter'] = limiter
+    return limiter
+
+
+# Command line entry points
+@app.cli.command('mail-flush')
+def mail_flush_command() -> None:
+    """Send every due message in the outbox now."""
+    click.echo(deliver_outbox())
+
+
+@app.cli.command('mail-status')
+def mail_status_command() -> None:
+    """Show outbox depth and delivery counters."""
+    for name, value in get_outbox().metrics().items():
+        click.echo(f"{name}: {value}")
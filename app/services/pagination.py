@@ -0,0 +1,74 @@
+# app/services/pagination.py
+# Keyset (cursor) pagination for book listings.
+# Pages are ordered by (created_at, id) and continued with an opaque cursor, so
+# fetching page 1000 costs the same as fetching page 1 (no OFFSET scans).
+
+# Standard library imports
+import base64  # Cursor encoding
+import json  # Cursor payload serialization
+from datetime import datetime  # Cursor timestamps
+from typing import List, Optional, Sequence, Tuple  # Type hints
+
+# Third party imports
+from sqlalchemy import select, tuple_  # Row-value comparison for keyset predicates
+
+# Local imports
+from app import app, db
+from app.models.book import Book
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(book) -> str:
+    """Build an opaque cursor pointing just after the given book (or row)"""
+    payload = json.dumps([book.created_at.isoformat(), book.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_cursor into (created_at, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)  # Restore stripped padding
+        created_at, book_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(book_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError("Invalid pagination cursor") from e
+
+
+def parse_limit(raw_limit: Optional[str]) -> int:
+    """Clamp a requested page size to the configured bounds"""
+    default = app.config['BOOKS_PER_PAGE']
+    maximum = app.config['BOOKS_MAX_PER_PAGE']
+    try:
+        limit = int(raw_limit) if raw_limit else default
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    return max(1, min(limit, maximum))
+
+
+def paginate_books(user_id: int, cursor: Optional[str] = None,
+                   limit: Optional[int] = None,
+                   columns: Optional[Sequence] = None) -> Tuple[List, Optional[str]]:
+    """Return one page of a user's books and the cursor for the next page.
+    With `columns` (which must include Book.id and Book.created_at) the page
+    holds row tuples of those columns instead of Book objects."""
+    limit = limit or app.config['BOOKS_PER_PAGE']
+
+    query = select(*columns) if columns else select(Book)
+    query = query.where(Book.user_id == user_id)
+    if cursor:
+        # Seek directly past the last row of the previous page
+        query = query.where(tuple_(Book.created_at, Book.id) > decode_cursor(cursor))
+
+    # Fetch one extra row to find out whether another page exists
+    query = query.order_by(Book.created_at, Book.id).limit(limit + 1)
+    result = db.session.execute(query)
+    books = result.all() if columns else result.scalars().all()
+
+    next_cursor = None
+    if len(books) > limit:
+        books = books[:limit]
+        next_cursor = encode_cursor(books[-1])
+    return books, next_cursor
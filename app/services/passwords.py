@@ -0,0 +1,77 @@
+# app/services/passwords.py
+# Password hashing with configurable cost.
+# PASSWORD_HASH_METHOD selects the werkzeug method and parameters (e.g.
+# "scrypt:16384:8:1" or "pbkdf2:sha256:600000"). Hashes stored with other
+# parameters still verify and are flagged for rehashing on the next login.
+# With PASSWORD_VERIFY_CONCURRENCY > 0 at most that many verifications run at
+# once per process and further logins wait their turn, so a login storm cannot
+# take every core. Verification stays on the request thread (hashlib releases
+# the GIL while deriving keys, so other request threads keep running).
+
+# Standard library imports
+import threading  # Concurrency limit
+from typing import Optional  # Type hints
+
+# Third-party imports
+from werkzeug.security import (  # Password hashing
+    DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+)
+
+# Local imports
+from app import app
+
+_semaphore_lock = threading.Lock()
+
+
+def canonical_method(method: str) -> str:
+    """Spell out werkzeug's defaults, matching the prefix stored in hashes"""
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        return 'scrypt:32768:8:1'
+    if name == 'pbkdf2' and len(args) < 2:
+        hash_name = args[0] if args else 'sha256'
+        return f'pbkdf2:{hash_name}:{DEFAULT_PBKDF2_ITERATIONS}'
+    return method
+
+
+def hash_password(password: str) -> str:
+    """Hash a password with the configured method and salt length"""
+    return generate_password_hash(
+        password,
+        method=app.config['PASSWORD_HASH_METHOD'],
+        salt_length=app.config['PASSWORD_HASH_SALT_LENGTH']
+    )
+
+
+def needs_rehash(pwhash: str) -> bool:
+    """True when a hash was made with other parameters than the configured ones"""
+    method, _, rest = pwhash.partition('$')
+    salt = rest.partition('$')[0]
+    return (method != canonical_method(app.config['PASSWORD_HASH_METHOD'])
+            or len(salt) != app.config['PASSWORD_HASH_SALT_LENGTH'])
+
+
+def get_verify_semaphore() -> Optional[threading.BoundedSemaphore]:
+    """Return the app-wide verification limit, or None when unlimited"""
+    limit = app.config['PASSWORD_VERIFY_CONCURRENCY']
+    if not limit:
+        return None
+    semaphore = app.extensions.get('password_semaphore')
+    if semaphore is None:
+        with _semaphore_lock:
+            semaphore = app.extensions.get('password_semaphore')
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(limit)
+                app.extensions['password_semaphore'] = semaphore
+    return semaphore
+
+
+def verify_password(pwhash: str, password: str) -> bool:
+    """Check a password against a stored hash"""
+    if not pwhash:
+        return False
+    semaphore = get_verify_semaphore()
+    if semaphore is None:
+        return check_password_hash(pwhash, password)
+    with semaphore:
+        return check_password_hash(pwhash, password)
@@ -0,0 +1,81 @@
+# app/services/search.py
+# Full-text search over book title/author/genre backed by an SQLite FTS5 table.
+# book_fts is an external-content index over the book table: it stores only the
+# inverted index and is kept in sync by triggers, so every write path (ORM,
+# bulk statements, raw SQL) updates it.
+
+# Standard library imports
+import re  # Query tokenization
+from typing import List  # Type hints
+
+# Third party imports
+from sqlalchemy import select, text  # Raw FTS statements mapped onto Book
+from sqlalchemy.engine import Connection  # Type hint for DDL helpers
+
+# Local imports
+from app import db
+from app.models.book import Book
+
+# user_id is indexed as a token so the per-user filter is resolved inside the
+# FTS index instead of by post-filtering every matching row.
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5(
+        title, author, genre, user_id,
+        content='book', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS book_fts_ai AFTER INSERT ON book BEGIN
+        INSERT INTO book_fts(rowid, title, author, genre, user_id)
+        VALUES (new.id, new.title, new.author, new.genre, new.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS book_fts_ad AFTER DELETE ON book BEGIN
+        INSERT INTO book_fts(book_fts, rowid, title, author, genre, user_id)
+        VALUES ('delete', old.id, old.title, old.author, old.genre, old.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS book_fts_au AFTER UPDATE OF title, author, genre, user_id ON book BEGIN
+        INSERT INTO book_fts(book_fts, rowid, title, author, genre, user_id)
+        VALUES ('delete', old.id, old.title, old.author, old.genre, old.user_id);
+        INSERT INTO book_fts(rowid, title, author, genre, user_id)
+        VALUES (new.id, new.title, new.author, new.genre, new.user_id);
+    END""",
+]
+
+# Ranked search: title matches weigh most, the user_id column not at all
+SEARCH_SQL = """
+    SELECT book.* FROM book_fts
+    JOIN book ON book.id = book_fts.rowid
+    WHERE book_fts MATCH :match
+    ORDER BY bm25(book_fts, 10.0, 5.0, 2.0, 0.0)
+    LIMIT :limit
+"""
+
+
+def install_fts(conn: Connection) -> None:
+    """Create the FTS table and sync triggers, then index existing rows"""
+    for statement in FTS_DDL:
+        conn.exec_driver_sql(statement)
+    conn.exec_driver_sql("INSERT INTO book_fts(book_fts) VALUES ('rebuild')")
+
+
+def drop_fts(conn: Connection) -> None:
+    """Drop the FTS table (its triggers go away with the book table)"""
+    conn.exec_driver_sql('DROP TABLE IF EXISTS book_fts')
+
+
+def build_match_expression(query: str, user_id: int) -> str:
+    """Turn free text into an FTS5 prefix query scoped to one user"""
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        raise ValueError("Search query must contain at least one word")
+    # Quote every term so FTS5 operators in user input are treated as text
+    words = ' '.join(f'"{term}"*' for term in terms)
+    return f'user_id : "{int(user_id)}" AND {{title author genre}} : ({words})'
+
+
+def search_books(user_id: int, query: str, limit: int) -> List[Book]:
+    """Return the user's books matching every term of the query, best first"""
+    statement = select(Book).from_statement(text(SEARCH_SQL))
+    return db.session.scalars(statement, {
+        'match': build_match_expression(query, user_id),
+        'limit': limit
+    }).all()
@@ -0,0 +1,85 @@
+# app/services/singleflight.py
+# Single-flight call deduplication.
+# Concurrent callers asking for the same key share one execution: the first
+# caller (the leader) runs the function, the rest wait for its result. With a
+# lock directory, leaders in different processes also take turns per key, so a
+# function that re-checks a shared cache runs upstream once per host.
+
+# Standard library imports
+import hashlib  # Lock file names
+import os  # Lock file paths
+import threading  # In-process coordination
+from typing import Any, Callable, Dict, Optional  # Type hints
+
+try:
+    import fcntl  # POSIX advisory file locks for cross-process coordination
+except ImportError:  # Windows: fall back to in-process deduplication only
+    fcntl = None
+
+
+class _Call:
+    """A single in-flight execution shared by the leader and its followers"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution"""
+
+    def __init__(self, lock_dir: Optional[str] = None):
+        self.lock_dir = lock_dir if fcntl else None
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.executions = 0  # Calls that ran the function
+        self.coalesced = 0  # Calls that waited for another caller's result
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run fn once for all concurrent callers with this key"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._execute(key, fn)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()  # Release followers
+
+    def _execute(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.executions += 1
+        if not self.lock_dir:
+            return fn()
+
+        # Serialize leaders across processes with a per-key lock file
+        name = hashlib.sha256(key.encode()).hexdigest()[:32] + '.lock'
+        with open(os.path.join(self.lock_dir, name), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                return fn()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stats(self) -> Dict[str, int]:
+        """Executions run versus calls that piggybacked on them"""
+        return {'executions': self.executions, 'coalesced': self.coalesced}
@@ -0,0 +1,106 @@
+# app/services/stats.py
+# Per-user catalog statistics from incrementally maintained counters.
+# book_stats holds one counter per (user, dimension, value), e.g. (1, 'genre',
+# 'Fantasy'), adjusted by triggers on every insert, update and delete of a
+# book. Reading the stats touches one row per group instead of every book.
+
+# Standard library imports
+from typing import Dict, List, Optional  # Type hints
+
+# Third party imports
+from sqlalchemy import select, text  # Counter reads, recent additions
+from sqlalchemy.engine import Connection  # Type hint for DDL helpers
+
+# Local imports
+from app import db
+from app.models.book import Book
+
+# Dimension name -> SQL expression over a book row alias ('' stands for "not set")
+DIMENSIONS = {
+    'total': "''",
+    'genre': "COALESCE({row}.genre, '')",
+    'author': "{row}.author",
+    'decade': "COALESCE(CAST({row}.year / 10 * 10 AS TEXT), '')",
+}
+
+
+def _adjust(row: str, delta: int) -> str:
+    """Trigger statements adding `delta` to every counter of one book row"""
+    return '\n'.join(f"""INSERT INTO book_stats (user_id, dimension, value, count)
+        SELECT {row}.user_id, '{name}', {expression.format(row=row)}, {delta}
+        WHERE {row}.user_id IS NOT NULL
+        ON CONFLICT (user_id, dimension, value) DO UPDATE SET count = count + excluded.count;"""
+        for name, expression in DIMENSIONS.items())
+
+
+STATS_DDL = [
+    """CREATE TABLE IF NOT EXISTS book_stats (
+        user_id INTEGER NOT NULL, dimension TEXT NOT NULL, value TEXT NOT NULL,
+        count INTEGER NOT NULL, PRIMARY KEY (user_id, dimension, value)
+    ) WITHOUT ROWID""",
+    f"""CREATE TRIGGER IF NOT EXISTS book_stats_ai AFTER INSERT ON book BEGIN
+        {_adjust('new', 1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS book_stats_ad AFTER DELETE ON book BEGIN
+        {_adjust('old', -1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS book_stats_au AFTER UPDATE OF genre, author, year, user_id ON book
+    WHEN old.genre IS NOT new.genre OR old.author IS NOT new.author
+      OR old.year IS NOT new.year OR old.user_id IS NOT new.user_id BEGIN
+        {_adjust('old', -1)}
+        {_adjust('new', 1)}
+    END""",
+]
+
+
+def rebuild_book_stats(conn: Connection, user_id: Optional[int] = None) -> None:
+    """Recompute counters from the book table, for one user or everyone"""
+    where = 'WHERE user_id = :user_id' if user_id is not None else ''
+    conn.execute(text(f'DELETE FROM book_stats {where}'), {'user_id': user_id})
+    book_filter = 'AND user_id = :user_id' if user_id is not None else ''
+    for name, expression in DIMENSIONS.items():
+        value = expression.format(row='book')
+        conn.execute(text(f"""INSERT INTO book_stats (user_id, dimension, value, count)
+            SELECT user_id, '{name}', {value}, COUNT(*) FROM book
+            WHERE user_id IS NOT NULL {book_filter} GROUP BY user_id, {value}"""),
+            {'user_id': user_id})
+
+
+def install_book_stats(conn: Connection) -> None:
+    """Create the counter table and triggers, then count existing books"""
+    for statement in STATS_DDL:
+        conn.exec_driver_sql(statement)
+    rebuild_book_stats(conn)
+
+
+def drop_book_stats(conn: Connection) -> None:
+    """Remove the counter table and its triggers"""
+    for trigger in ('book_stats_ai', 'book_stats_ad', 'book_stats_au'):
+        conn.exec_driver_sql(f'DROP TRIGGER IF EXISTS {trigger}')
+    conn.exec_driver_sql('DROP TABLE IF EXISTS book_stats')
+
+
+def _label(dimension: str, value: str) -> Optional[str]:
+    if value == '':
+        return None  # Books without a genre or year
+    return f'{value}s' if dimension == 'decade' else value
+
+
+def get_catalog_stats(user_id: int, recent: int = 5) -> Dict:
+    """Totals, per-group counts and the most recently added books"""
+    stats: Dict = {'total': 0, 'by_genre': [], 'by_author': [], 'by_decade': []}
+    rows = db.session.execute(text("""
+        SELECT dimension, value, count FROM book_stats
+        WHERE user_id = :user_id AND count > 0
+        ORDER BY dimension, count DESC, value"""), {'user_id': user_id})
+    for dimension, value, count in rows:
+        if dimension == 'total':
+            stats['total'] = count
+        else:
+            stats[f'by_{dimension}'].append({'value': _label(dimension, value), 'count': count})
+
+    # Newest first straight off the (user_id, created_at, id) index
+    stats['recent'] = db.session.scalars(
+        select(Book).where(Book.user_id == user_id)
+        .order_by(Book.created_at.desc(), Book.id.desc()).limit(recent)).all()
+    return stats
@@ -0,0 +1,177 @@
+# app/sessions.py - Secret key loading and server-side session storage
+# Every worker process must sign cookies with the same key, so the key comes
+# from the SECRET_KEY environment variable or from a key file in the instance
+# folder that the first worker creates atomically and the rest read back.
+# SQLiteSessionInterface keeps session data in a shared SQLite file and puts
+# only a short random session id in the cookie. The id is replaced whenever the
+# user logs in or out, so an id planted in a browser beforehand is worthless.
+
+# Standard library imports
+import os  # Key file creation
+import secrets  # Key and session id generation
+import sqlite3  # Session storage
+import threading  # Per-thread connections
+import time  # Expiry arithmetic
+from typing import Optional  # Type hints
+
+# Third-party imports
+from flask import session  # Current request's session
+from flask.json.tag import TaggedJSONSerializer  # Same encoding as cookie sessions
+from flask.sessions import SessionInterface, SessionMixin  # Session interface base classes
+from werkzeug.datastructures import CallbackDict  # Change tracking
+
+
+def load_secret_key(instance_path: str, filename: str = 'secret_key') -> str:
+    """Return the SECRET_KEY from the environment, or the instance key file,
+    creating it on first use. Concurrent workers all end up with the key of
+    whichever worker linked its file into place first."""
+    key = os.environ.get('SECRET_KEY')
+    if key:
+        return key
+
+    path = os.path.join(instance_path, filename)
+    if not os.path.exists(path):
+        os.makedirs(instance_path, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as tmp_file:
+            tmp_file.write(secrets.token_hex(32))
+        try:
+            os.link(tmp_path, path)  # Publishes a complete file or fails if one exists
+        except FileExistsError:
+            pass  # Another worker won the race; use its key
+        finally:
+            os.unlink(tmp_path)
+
+    with open(path) as key_file:
+        return key_file.read().strip()
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session data loaded from the store, identified by `sid`"""
+
+    def __init__(self, initial=None, sid: Optional[str] = None, new: bool = False):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.accessed = False
+        self.regenerate_sid = False
+
+    def regenerate(self) -> None:
+        """Move the data to a fresh id on save and discard the current one"""
+        self.regenerate_sid = True
+        self.modified = True
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+
+class SQLiteSessionInterface(SessionInterface):
+    """Sessions in an SQLite file shared by all workers on a host"""
+
+    session_class = ServerSideSession
+    serializer = TaggedJSONSerializer()
+    PURGE_EVERY = 1000  # Saves between sweeps of expired sessions
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._saves = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection().execute("""CREATE TABLE IF NOT EXISTS sessions (
+            sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)""")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def generate_sid() -> str:
+        """128 random bits in 22 URL-safe characters"""
+        return secrets.token_urlsafe(16)
+
+    def open_session(self, app, request) -> ServerSideSession:
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            row = self._connection().execute(
+                'SELECT data FROM sessions WHERE sid = ? AND expires_at > ?',
+                (sid, time.time())).fetchone()
+            if row:
+                return self.session_class(self.serializer.loads(row[0]), sid=sid)
+        return self.session_class(sid=self.generate_sid(), new=True)
+
+    def save_session(self, app, session: ServerSideSession, response) -> None:
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        partitioned = self.get_cookie_partitioned(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if session.regenerate_sid:
+            if not session.new:
+                self._connection().execute('DELETE FROM sessions WHERE sid = ?', (session.sid,))
+            session.sid = self.generate_sid()
+            session.regenerate_sid = False
+
+        # Emptied sessions are removed along with their cookie
+        if not session:
+            if session.modified:
+                self._connection().execute('DELETE FROM sessions WHERE sid = ?', (session.sid,))
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       partitioned=partitioned, samesite=samesite,
+                                       httponly=httponly)
+                response.vary.add('Cookie')
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        now = time.time()
+        stored_until = now + app.permanent_session_lifetime.total_seconds()
+        conn = self._connection()
+        if session.modified or session.new:
+            conn.execute("""INSERT INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (sid) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at""",
+                (session.sid, self.serializer.dumps(dict(session)), stored_until))
+        else:
+            conn.execute('UPDATE sessions SET expires_at = ? WHERE sid = ?', (stored_until, session.sid))
+
+        self._saves += 1
+        if self._saves % self.PURGE_EVERY == 0:
+            conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,))
+
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                            httponly=httponly, domain=domain, path=path, secure=secure,
+                            partitioned=partitioned, samesite=samesite)
+        response.vary.add('Cookie')
+
+
+def regenerate_session(sender, **extra) -> None:
+    """Flask-Login user_logged_in/user_logged_out receiver: guards against
+    session fixation with server-side sessions (signed cookies change anyway)"""
+    if isinstance(session, ServerSideSession):
+        session.regenerate()
@@ -1,29 +1,49 @@
-# app/tasks.py - Celery async task definitions for email handling
+# app/tasks.py - Celery async task definitions for email handling and AI jobs
 
 # Third-party imports
 from app import app, celery  # Flask app and Celery instance
-from time import sleep  # For simulating delays
+
+# Local imports
+from app.services.ai_service import get_ai_service  # AI recommendations
+from app.services.mail import deliver_outbox, get_outbox  # Batched email delivery
+
+def queue_email(recipient: str, subject: str, body: str, reply_to: str = None) -> int:
+    """Add a message to the outbox and make sure a flush is on its way"""
+    outbox = get_outbox()
+    message_id = outbox.enqueue(recipient, subject, body, reply_to)
+    # One flush per burst: later messages join the batch it sends
+    if outbox.request_flush(app.config['MAIL_CLAIM_LEASE']):
+        flush_outbox.apply_async(countdown=app.config['MAIL_FLUSH_DELAY'])
+    return message_id
+
+def queue_registration_email(user_email: str, username: str) -> int:
+    """Queue the welcome message for a new account"""
+    return queue_email(user_email, 'Welcome to Book Management System',
+                       f"Dear {username},\n\nThank you for registering!")
+
+def queue_contact_email(name: str, email: str, message: str) -> int:
+    """Queue a contact form submission for the site owner"""
+    return queue_email(app.config['MAIL_CONTACT_RECIPIENT'], f'Contact form message from {name}',
+                       f"From: {name} <{email}>\n\n{message}", reply_to=email)
+
+@celery.task
+def flush_outbox():
+    """Send queued messages in batches (also run periodically by celery beat for retries)"""
+    return deliver_outbox()
 
 @celery.task
 def send_registration_email(user_email, username):
-    """Mock function to simulate sending registration email"""
-    
-    # Simulate network delay
-    sleep(5)  # 5 second delay
-    
-    # Mock email sending process
-    print(f"Sending registration email to {user_email}")  # Log recipient
-    print(f"Subject: Welcome to Book Management System")  # Log subject
-    print(f"Dear {username},\n\nThank you for registering!")  # Log content
-    
+    """Queue the registration email (kept for tasks already on the broker)"""
+    queue_registration_email(user_email, username)
     return True  # Indicate success
 
 @celery.task
 def send_contact_email(name: str, email: str, message: str):
-    """Send contact form email (mock implementation)"""
-    
-    # Log contact form submission
-    print(f"Sending contact email from {name} ({email})")  # Log sender
-    print(f"Message: {message}")  # Log message content
-    
-    return True  # Indicate success
\ No newline at end of file
+    """Queue the contact form email (kept for tasks already on the broker)"""
+    queue_contact_email(name, email, message)
+    return True  # Indicate success
+
+@celery.task
+def generate_recommendations(preferences: dict):
+    """Produce AI book recommendations outside the web request"""
+    return get_ai_service().get_recommendations(preferences)
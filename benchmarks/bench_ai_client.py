@@ -0,0 +1,68 @@
+# benchmarks/bench_ai_client.py - Per-request vs shared OpenAI client latency
+# Runs offline against a local stub of the chat completions endpoint and counts
+# the TCP connections each strategy opens.
+#
+# usage: python -m benchmarks.bench_ai_client [--requests 200]
+
+# Standard library imports
+import argparse  # Command line options
+import json  # Report output
+import statistics  # Latency summaries
+import time  # Timing
+
+# Local imports
+from app import app
+from app.services.ai_service import AIRecommendationService, make_openai_client
+from app.services.cache import MemoryCache
+from app.services.singleflight import SingleFlight
+from benchmarks.stub_openai import StubHandler, start_stub_server
+
+
+def run(strategy: str, requests: int) -> dict:
+    """Time `requests` uncached recommendation calls with one client strategy"""
+    StubHandler.connections = 0
+    shared = AIRecommendationService(client=make_openai_client(), cache=MemoryCache(),
+                                     singleflight=SingleFlight())
+    latencies = []
+    for i in range(requests):
+        started = time.perf_counter()
+        if strategy == 'per-request':
+            # What BookRecommendation.post used to do: a new client and pool per call
+            service = AIRecommendationService(client=make_openai_client(), cache=MemoryCache(),
+                                              singleflight=SingleFlight())
+        else:
+            service = shared
+        service.get_recommendations({'genres': [f'genre-{i}']})  # Unique key: no cache hits
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    latencies.sort()
+    return {
+        'strategy': strategy,
+        'requests': requests,
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'p50_ms': round(latencies[len(latencies) // 2], 3),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        'tcp_connections': StubHandler.connections
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Per-request vs shared OpenAI client latency')
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    server = start_stub_server()
+    app.config['OPENAI_BASE_URL'] = f'http://127.0.0.1:{server.server_port}/v1'
+    try:
+        results = [run('per-request', args.requests), run('shared', args.requests)]
+    finally:
+        server.shutdown()
+
+    print(json.dumps(results, indent=2))
+    saved = results[0]['mean_ms'] - results[1]['mean_ms']
+    print(f"Shared client saves {saved:.3f} ms per request on loopback "
+          f"(TLS handshakes to api.openai.com add considerably more).")
+
+
+if __name__ == '__main__':
+    main()
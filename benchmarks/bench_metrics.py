@@ -0,0 +1,123 @@
+# benchmarks/bench_metrics.py - Cost of the metrics instrumentation
+# Times the request hooks and the SQL listeners on their own (microseconds per
+# request / per statement), then whole requests through the test client with
+# the hooks installed and removed. Flushes to the shared file are included at
+# their normal interval.
+#
+# usage: python -m benchmarks.bench_metrics [--requests 20000]
+
+# Standard library imports
+import argparse  # Command line options
+import json  # Report output
+import os  # Database and metrics file selection
+import tempfile  # Scratch metrics file
+import time  # Timing
+
+# Keep the benchmark away from the application database and metrics
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+os.environ.setdefault('METRICS_PATH', os.path.join(tempfile.mkdtemp(), 'metrics.db'))
+
+# Third-party imports
+from sqlalchemy import event, text  # Listener removal, probe query
+
+# Local imports
+from app import app, db
+from app import metrics
+
+
+def per_call_us(fn, count: int) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return round((time.perf_counter() - started) / count * 1e6, 2)
+
+
+def hook_cost(count: int) -> float:
+    """Start plus finish hook for one request, without the request itself"""
+    response = app.response_class('ok')
+    with app.test_request_context('/about'):
+        app.url_map.bind('localhost').match('/about')  # As during dispatch
+
+        def one_request():
+            metrics._start_request()
+            metrics._finish_request(response)
+        return per_call_us(one_request, count)
+
+
+def listener_cost(count: int) -> float:
+    """before/after_cursor_execute pair for one statement"""
+    class Context:
+        pass
+    context = Context()
+
+    def one_statement():
+        metrics._before_cursor_execute(None, None, 'SELECT 1', (), context, False)
+        metrics._after_cursor_execute(None, None, 'SELECT 1', (), context, False)
+    return per_call_us(one_statement, count)
+
+
+def request_cost(client, count: int, path: str) -> float:
+    client.get(path)  # Warm up
+    return per_call_us(lambda: client.get(path), count)
+
+
+def query_cost(count: int) -> float:
+    with app.app_context():
+        with db.engine.connect() as conn:
+            return per_call_us(lambda: conn.execute(text('SELECT 1')).scalar(), count)
+
+
+def set_instrumented(enabled: bool) -> None:
+    """Install or remove the request hooks and SQL listeners"""
+    before, after = app.before_request_funcs[None], app.after_request_funcs[None]
+    with app.app_context():
+        engine = db.engine
+    if enabled:
+        before.insert(0, metrics._start_request)
+        after.append(metrics._finish_request)
+        event.listen(engine, 'before_cursor_execute', metrics._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', metrics._after_cursor_execute)
+    else:
+        before.remove(metrics._start_request)
+        after.remove(metrics._finish_request)
+        event.remove(engine, 'before_cursor_execute', metrics._before_cursor_execute)
+        event.remove(engine, 'after_cursor_execute', metrics._after_cursor_execute)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Cost of the metrics instrumentation')
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=5, help='Alternating bare/instrumented rounds (best kept)')
+    args = parser.parse_args()
+
+    client = app.test_client()
+    report = {
+        'hooks_us_per_request': hook_cost(args.requests),
+        'sql_listeners_us_per_statement': listener_cost(args.requests * 5),
+    }
+
+    # Whole requests and statements, alternating so drift affects both equally
+    timings = {True: ([], []), False: ([], [])}
+    per_round = max(args.requests // args.rounds, 1)
+    for _ in range(args.rounds):
+        set_instrumented(False)
+        timings[False][0].append(request_cost(client, per_round, '/about'))
+        timings[False][1].append(query_cost(per_round))
+        set_instrumented(True)
+        timings[True][0].append(request_cost(client, per_round, '/about'))
+        timings[True][1].append(query_cost(per_round))
+    report.update({
+        'about_page_us_bare': min(timings[False][0]),
+        'about_page_us_instrumented': min(timings[True][0]),
+        'select_1_us_bare': min(timings[False][1]),
+        'select_1_us_instrumented': min(timings[True][1]),
+    })
+    report['request_overhead_us'] = round(
+        report['about_page_us_instrumented'] - report['about_page_us_bare'], 2)
+    report['statement_overhead_us'] = round(
+        report['select_1_us_instrumented'] - report['select_1_us_bare'], 2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# benchmarks/bench_password_hash.py - Login throughput per password hash setting
+# Times check_password_hash for each method, once on a single thread (logins
+# per second per core) and once across a thread pool sized to the machine
+# (hashlib releases the GIL, so this scales with cores).
+#
+# usage: python -m benchmarks.bench_password_hash [--seconds 2] [--methods scrypt:16384:8:1 ...]
+
+# Standard library imports
+import argparse  # Command line options
+import json  # Report output
+import os  # Core count
+import time  # Timing
+from concurrent.futures import ThreadPoolExecutor  # Parallel verification
+
+# Third-party imports
+from werkzeug.security import check_password_hash, generate_password_hash  # Hashing under test
+
+DEFAULT_METHODS = [
+    'scrypt:32768:8:1',  # werkzeug default
+    'scrypt:16384:8:1',
+    'pbkdf2:sha256:1000000',  # werkzeug pbkdf2 default
+    'pbkdf2:sha256:600000',
+]
+PASSWORD = 'Password123!'
+
+
+def verifies_per_second(pwhash: str, seconds: float, threads: int) -> float:
+    """Verify the password repeatedly for about `seconds` and return the rate"""
+    def worker(deadline: float) -> int:
+        count = 0
+        while time.perf_counter() < deadline:
+            check_password_hash(pwhash, PASSWORD)
+            count += 1
+        return count
+
+    started = time.perf_counter()
+    deadline = started + seconds
+    with ThreadPoolExecutor(threads) as pool:
+        total = sum(pool.map(worker, [deadline] * threads))
+    return total / (time.perf_counter() - started)
+
+
+def run(method: str, seconds: float, cores: int) -> dict:
+    pwhash = generate_password_hash(PASSWORD, method=method)
+    single = verifies_per_second(pwhash, seconds, 1)
+    pooled = verifies_per_second(pwhash, seconds, cores)
+    return {
+        'method': method,
+        'ms_per_login': round(1000 / single, 2),
+        'logins_per_sec_per_core': round(single, 1),
+        'logins_per_sec_pooled': round(pooled, 1),
+        'pool_threads': cores
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Login throughput per password hash setting')
+    parser.add_argument('--seconds', type=float, default=2.0, help='Time spent per measurement')
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    results = [run(method, args.seconds, cores) for method in args.methods]
+    print(json.dumps(results, indent=2))
+    print('Set PASSWORD_HASH_METHOD to the chosen method; existing users are rehashed at their next login.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/bench_serialization.py - Book list serialization: marshal vs fast path
+# Seeds an in-memory database and times loading plus encoding a user's books
+# as ORM entities run through flask_restx marshalling, and as column tuples
+# through the fast encoder (with orjson if installed, and without).
+#
+# usage: python -m benchmarks.bench_serialization [--sizes 1000 10000 100000] [--repeat 3]
+
+# Standard library imports
+import argparse  # Command line options
+import json  # Marshalled output encoding, report output
+import os  # Database selection
+import time  # Timing
+
+# Keep the benchmark away from the application database
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+# Third-party imports
+from flask_restx import marshal  # Generic marshalling path
+from sqlalchemy import delete, insert, select  # Seeding and queries
+
+# Local imports
+from app import app, db
+from app.api import book_model
+from app.models.book import Book
+from app.models.user import User
+import app.services.serialization as serialization
+
+
+def seed(user_id: int, count: int) -> None:
+    """Replace the user's books with `count` generated rows"""
+    db.session.execute(delete(Book))
+    db.session.execute(insert(Book), [
+        {'title': f'Book {i}', 'author': f'Author {i % 500}', 'isbn': f'{i:013d}',
+         'year': 1950 + i % 70, 'genre': None if i % 7 == 0 else f'Genre {i % 12}',
+         'user_id': user_id}
+        for i in range(count)
+    ])
+    db.session.commit()
+
+
+def marshal_path(user_id: int) -> bytes:
+    books = db.session.scalars(
+        select(Book).where(Book.user_id == user_id).order_by(Book.created_at, Book.id)).all()
+    return (json.dumps(marshal(books, book_model)) + '\n').encode()  # As flask_restx's output_json
+
+
+def fast_path(user_id: int) -> bytes:
+    rows = db.session.execute(
+        select(*serialization.BOOK_ROW_COLUMNS).where(Book.user_id == user_id)
+        .order_by(Book.created_at, Book.id)).all()
+    return serialization.encode_book_rows(rows)
+
+
+def best_of(fn, user_id: int, repeat: int) -> float:
+    """Fastest of `repeat` runs in milliseconds, each starting from an empty session"""
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()  # Do not let the identity map serve later runs
+        started = time.perf_counter()
+        fn(user_id)
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(min(timings), 2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Book list serialization: marshal vs fast path')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    orjson = serialization.orjson
+    results = []
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com')
+        db.session.add(user)
+        db.session.commit()
+
+        for size in args.sizes:
+            seed(user.id, size)
+            assert json.loads(marshal_path(user.id)) == json.loads(fast_path(user.id))
+            result = {'rows': size, 'marshal_ms': best_of(marshal_path, user.id, args.repeat)}
+            serialization.orjson = None
+            result['fast_stdlib_ms'] = best_of(fast_path, user.id, args.repeat)
+            serialization.orjson = orjson
+            if orjson is not None:
+                result['fast_orjson_ms'] = best_of(fast_path, user.id, args.repeat)
+            fastest = min(v for k, v in result.items() if k.startswith('fast'))
+            result['speedup'] = round(result['marshal_ms'] / fastest, 1)
+            results.append(result)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
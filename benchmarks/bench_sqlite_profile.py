@@ -0,0 +1,147 @@
+# benchmarks/bench_sqlite_profile.py - Concurrent reads and writes per SQLite profile
+# For each engine profile, creates a fresh database file with the application
+# schema, then runs reader and writer processes against it at the same time
+# (like gunicorn workers plus Celery). Readers fetch a page of a user's books;
+# writers add a book per short transaction. Reports operations per second and
+# "database is locked" errors, plus read latency percentiles (in rollback
+# journal mode a committing writer blocks every reader; in WAL mode it does not).
+#
+# usage: python -m benchmarks.bench_sqlite_profile [--readers 4] [--writers 2] [--seconds 5] [--dir /var/tmp]
+
+# Standard library imports
+import argparse  # Command line options
+import json  # Report output
+import multiprocessing  # Worker processes
+import os  # Database selection
+import tempfile  # Scratch database files
+import time  # Timing
+
+# Keep the benchmark away from the application database
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+# Third-party imports
+from sqlalchemy import create_engine, insert, select  # Engines and statements
+from sqlalchemy.exc import OperationalError  # Lock errors
+
+# Local imports
+from app import app, db
+from app.engine import SQLITE_PROFILES, install_sqlite_pragmas, sqlite_engine_options, sqlite_pragmas
+from app.models.book import Book
+from app.models.user import User
+
+USERS = 20
+BOOKS_PER_USER = 500
+
+
+def make_engine(path: str, profile: str):
+    config = {**app.config, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'SQLITE_PROFILE': profile}
+    engine = create_engine(config['SQLALCHEMY_DATABASE_URI'], **sqlite_engine_options(config))
+    install_sqlite_pragmas(engine, sqlite_pragmas(config))
+    return engine
+
+
+def setup(path: str, profile: str) -> None:
+    """Create the schema (with its triggers) and seed every user's shelf"""
+    engine = make_engine(path, profile)
+    with app.app_context():
+        db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{'username': f'user{u}', 'email': f'user{u}@example.com'}
+                                    for u in range(1, USERS + 1)])
+        conn.execute(insert(Book), [
+            {'title': f'Book {i}', 'author': f'Author {i % 50}', 'isbn': f'{u:04d}{i:09d}',
+             'year': 1950 + i % 70, 'genre': f'Genre {i % 12}', 'user_id': u}
+            for u in range(1, USERS + 1) for i in range(BOOKS_PER_USER)
+        ])
+    engine.dispose()
+
+
+def reader(path: str, profile: str, deadline: float, results) -> None:
+    engine = make_engine(path, profile)
+    latencies, errors = [], 0
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(select(Book).where(Book.user_id == len(latencies) % USERS + 1)
+                             .order_by(Book.created_at, Book.id).limit(50)).all()
+            latencies.append(time.perf_counter() - started)
+        except OperationalError:
+            errors += 1
+    results.put(('reads', latencies, errors))
+
+
+def writer(path: str, profile: str, deadline: float, worker: int, results) -> None:
+    engine = make_engine(path, profile)
+    done = errors = 0
+    while time.time() < deadline:
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(Book).values(
+                    title=f'New {worker}-{done}', author='Writer', isbn=f'9{worker:03d}{done + errors:09d}',
+                    year=2024, genre='New', user_id=(worker + done) % USERS + 1))
+            done += 1
+        except OperationalError:
+            errors += 1
+    results.put(('writes', done, errors))
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Value at `fraction` of the sorted list, in milliseconds"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * fraction))] * 1000, 2)
+
+
+def run(profile: str, readers: int, writers: int, seconds: float, directory: str) -> dict:
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        setup(path, profile)
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        deadline = time.time() + 1 + seconds  # One second for the processes to start
+        processes = [context.Process(target=reader, args=(path, profile, deadline, results))
+                     for _ in range(readers)]
+        processes += [context.Process(target=writer, args=(path, profile, deadline, w, results))
+                      for w in range(writers)]
+        for process in processes:
+            process.start()
+        totals = {'writes': 0, 'read_errors': 0, 'write_errors': 0}
+        latencies = []
+        for _ in processes:
+            kind, done, errors = results.get()
+            if kind == 'reads':
+                latencies.extend(done)
+            else:
+                totals['writes'] += done
+            totals[kind[:-1] + '_errors'] += errors
+        for process in processes:
+            process.join()
+    return {
+        'profile': profile,
+        'reads_per_sec': round(len(latencies) / seconds),
+        'read_p50_ms': percentile(latencies, 0.50),
+        'read_p99_ms': percentile(latencies, 0.99),
+        'read_max_ms': percentile(latencies, 1.0),
+        'writes_per_sec': round(totals['writes'] / seconds),
+        'read_errors': totals['read_errors'],
+        'write_errors': totals['write_errors'],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Concurrent reads and writes per SQLite profile')
+    parser.add_argument('--profiles', nargs='+', default=['legacy', 'concurrent'], choices=list(SQLITE_PROFILES))
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--dir', default=None, help='Where to create the database (use a real disk, not tmpfs)')
+    args = parser.parse_args()
+
+    results = [run(profile, args.readers, args.writers, args.seconds, args.dir) for profile in args.profiles]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
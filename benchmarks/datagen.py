@@ -0,0 +1,108 @@
+# benchmarks/datagen.py - Seeded synthetic catalog for benchmarks
+# Creates the application schema (with its migrations and triggers) in a fresh
+# SQLite file, then writes N users with M books each straight through sqlite3.
+# The same seed always produces the same rows, so runs on different commits
+# measure the same data. Every user's password is PASSWORD.
+#
+# usage: python -m benchmarks.datagen PATH [--users 100] [--books 1000] [--seed 42]
+
+# Standard library imports
+import argparse  # Command line options
+import json  # Report output
+import os  # Database selection
+import random  # Seeded generator
+import sqlite3  # Bulk inserts
+import time  # Timing
+from datetime import datetime, timedelta  # Book timestamps
+from typing import Dict, Iterator, Tuple  # Type hints
+
+# Keep the generator away from the application database
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+# Third-party imports
+from sqlalchemy import create_engine  # Schema creation on the target file
+
+# Local imports
+from app import app, db
+from app.services.passwords import hash_password
+
+PASSWORD = 'Password123!'
+CHUNK = 5000  # Rows per executemany
+EPOCH = datetime(2020, 1, 1)
+
+GENRES = ['Fiction', 'Fantasy', 'Science Fiction', 'Mystery', 'Thriller', 'Romance', 'History',
+          'Biography', 'Poetry', 'Horror', 'Philosophy', 'Travel', 'Science', 'Children']
+WORDS = ['Shadow', 'River', 'Winter', 'Garden', 'Empire', 'Silent', 'Glass', 'Iron', 'Summer',
+         'Harbor', 'Lantern', 'Forest', 'Storm', 'Crown', 'Letter', 'Mountain', 'Secret', 'Night',
+         'Orchard', 'Island', 'Memory', 'Stone', 'Bridge', 'Fire', 'Paper', 'Salt', 'Road', 'Star']
+FIRST_NAMES = ['Ada', 'Ben', 'Chloe', 'Dev', 'Elena', 'Farid', 'Grace', 'Hugo', 'Ines', 'Jonas',
+               'Kaya', 'Liam', 'Mira', 'Noah', 'Olga', 'Pablo', 'Quinn', 'Rosa', 'Sami', 'Tess']
+LAST_NAMES = ['Adler', 'Brooks', 'Castro', 'Dubois', 'Evans', 'Fischer', 'Garcia', 'Haddad',
+              'Ito', 'Jensen', 'Kowalski', 'Larsen', 'Moreau', 'Novak', 'Okafor', 'Patel']
+
+
+def create_schema(path: str) -> None:
+    """Fresh database file with the application's tables, indexes and triggers"""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    engine = create_engine(f'sqlite:///{path}')
+    with app.app_context():
+        db.metadata.create_all(engine)  # Runs the migrations through the after_create hook
+    engine.dispose()
+
+
+def book_rows(rng: random.Random, users: int, books_per_user: int) -> Iterator[Tuple]:
+    """Books grouped by user, with increasing creation times and unique ISBNs"""
+    authors = [f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}' for _ in range(max(books_per_user // 5, 20))]
+    serial = 0
+    for user_id in range(1, users + 1):
+        created = EPOCH + timedelta(days=user_id)
+        for _ in range(books_per_user):
+            serial += 1
+            created += timedelta(seconds=rng.randint(1, 3600), microseconds=rng.randint(0, 999999))
+            stamp = created.strftime('%Y-%m-%d %H:%M:%S.%f')
+            title = ' '.join(rng.sample(WORDS, rng.randint(1, 4)))
+            yield (title, rng.choice(authors), rng.randint(1900, 2024), f'978{serial:010d}',
+                   rng.choice(GENRES), stamp, stamp, user_id)
+
+
+def generate(path: str, users: int, books_per_user: int, seed: int = 42) -> Dict:
+    """Write the catalog and return its sizes and timings"""
+    started = time.perf_counter()
+    create_schema(path)
+    rng = random.Random(seed)
+    with app.app_context():
+        password_hash = hash_password(PASSWORD)  # One hash for everyone; logins still verify it
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute('BEGIN')
+        conn.executemany('INSERT INTO user (id, username, email, password_hash) VALUES (?, ?, ?, ?)',
+                         [(u, f'user{u}', f'user{u}@example.com', password_hash) for u in range(1, users + 1)])
+        rows = book_rows(rng, users, books_per_user)
+        while True:
+            chunk = [row for _, row in zip(range(CHUNK), rows)]
+            if not chunk:
+                break
+            conn.executemany('INSERT INTO book (title, author, year, isbn, genre, created_at, updated_at, user_id) '
+                             'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', chunk)
+        conn.execute('COMMIT')
+        conn.execute('ANALYZE')  # Planner statistics, as a long-running database would have
+    finally:
+        conn.close()
+    return {'path': path, 'seed': seed, 'users': users, 'books_per_user': books_per_user,
+            'books': users * books_per_user, 'seconds': round(time.perf_counter() - started, 2)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Seeded synthetic catalog for benchmarks')
+    parser.add_argument('path', help='SQLite file to (re)create')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--books', type=int, default=1000, help='Books per user')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    print(json.dumps(generate(args.path, args.users, args.books, args.seed), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/stub_openai.py - Local stand-in for the OpenAI chat completions API
+# Answers every POST with a fixed list of recommendations after a configurable
+# delay, as a plain JSON completion or, for "stream": true, as server-sent
+# chunks. Counts TCP connections so benchmarks can check connection reuse.
+#
+# usage: python -m benchmarks.stub_openai [--port 8001] [--latency-ms 800]
+#        then OPENAI_BASE_URL=http://127.0.0.1:8001/v1
+
+# Standard library imports
+import argparse  # Command line options
+import json  # Request and response bodies
+import threading  # Background server
+import time  # Simulated model latency
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # Stub server
+
+STUB_RECOMMENDATIONS = [
+    {'title': f'Stub Book {i}', 'author': f'Stub Author {i}', 'description': 'Stub.', 'genre': 'Fantasy'}
+    for i in range(1, 6)
+]
+STUB_CONTENT = json.dumps(STUB_RECOMMENDATIONS)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every POST with a fixed chat completion over keep-alive HTTP/1.1"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # Avoid delayed-ACK stalls on loopback
+    wbufsize = 1 << 16  # Send headers and body in one write
+    latency = 0.0  # Seconds before the answer (spread over the chunks when streaming)
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        StubHandler.connections += 1  # One handler instance per TCP connection
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if request.get('stream'):
+            self.stream()
+            return
+        time.sleep(self.latency)
+        body = json.dumps({
+            'id': 'chatcmpl-stub', 'object': 'chat.completion', 'created': 0,
+            'model': 'gpt-3.5-turbo',
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': STUB_CONTENT}}]
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream(self):
+        """Send the content in small deltas as server-sent events"""
+        pieces = [STUB_CONTENT[i:i + 16] for i in range(0, len(STUB_CONTENT), 16)]
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for piece in pieces + [None]:
+            time.sleep(self.latency / (len(pieces) + 1))
+            chunk = {'id': 'chatcmpl-stub', 'object': 'chat.completion.chunk', 'created': 0,
+                     'model': 'gpt-3.5-turbo',
+                     'choices': [{'index': 0, 'delta': {'content': piece} if piece else {},
+                                  'finish_reason': None if piece else 'stop'}]}
+            self.write_chunk(f'data: {json.dumps(chunk)}\n\n'.encode())
+        self.write_chunk(b'data: [DONE]\n\n')
+        self.write_chunk(b'')
+
+    def write_chunk(self, data: bytes):
+        self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass  # Keep benchmark output clean
+
+
+def start_stub_server(latency_ms: float = 0, port: int = 0) -> ThreadingHTTPServer:
+    """Start the stub API on a local port (a free one by default)"""
+    StubHandler.latency = latency_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Local stand-in for the OpenAI chat completions API')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency-ms', type=float, default=800)
+    args = parser.parse_args()
+
+    server = start_stub_server(args.latency_ms, args.port)
+    print(f'Stub OpenAI API on http://127.0.0.1:{server.server_port}/v1 ({args.latency_ms:g} ms per completion)')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
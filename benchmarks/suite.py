@@ -0,0 +1,316 @@
+# benchmarks/suite.py - End-to-end benchmark suite for the main request paths
+# Seeds a scratch SQLite catalog (benchmarks/datagen.py), points the OpenAI
+# client at a local stub with a fixed latency (benchmarks/stub_openai.py) and
+# times each scenario against the real endpoints: in-process through the Flask
+# test client by default, or with --http from several load-generating processes
+# over keep-alive HTTP connections, against the app served from this process or
+# an already running deployment (--url, seeded with the same options), one
+# scenario at a time.
+# Prints a JSON report with throughput and p50/p95/p99 latency per scenario.
+# With --baseline, a scenario whose p95 grew or whose throughput fell by more
+# than --tolerance against an earlier report is listed under "regressions".
+#
+# usage: python -m benchmarks.suite [--users 20] [--books 500] [--requests 200]
+#                                   [--scenarios list,get,create] [--ai-latency-ms 50]
+#                                   [--http [--processes 4] [--seconds 10] [--url URL]]
+#                                   [--output report.json] [--baseline old.json [--fail-on-regression]]
+
+# Standard library imports
+import argparse  # Command line options
+import http.client  # Load generator connections
+import json  # Request bodies and report output
+import logging  # Quiet server log
+import math  # Percentile ranks
+import multiprocessing  # Load generator processes
+import os  # Environment and paths
+import platform  # Report metadata
+import shutil  # Scratch directory cleanup
+import sqlite3  # Report metadata
+import subprocess  # Commit under test
+import sys  # Exit status and warnings
+import tempfile  # Scratch directory
+import threading  # In-process HTTP server
+import time  # Timing
+from datetime import datetime, timezone  # Report timestamp
+from typing import Dict, List, Optional, Tuple  # Type hints
+from urllib.parse import urlencode, urlsplit  # Form bodies and target URL
+
+# The suite recreates its database, so it never uses the configured one
+SCRATCH = tempfile.mkdtemp(prefix='bench-suite-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(SCRATCH, 'catalog.db')}"
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ.setdefault('CELERY_BROKER_URL', 'memory://')
+os.environ.setdefault('CELERY_RESULT_BACKEND', 'cache+memory://')
+os.environ.setdefault('RATELIMIT_STORAGE_URI', 'memory://')
+os.environ.setdefault('MAIL_OUTBOX_PATH', os.path.join(SCRATCH, 'mail_outbox.db'))
+os.environ.setdefault('METRICS_PATH', os.path.join(SCRATCH, 'metrics.db'))
+os.environ.setdefault('AI_JOB_PATH', os.path.join(SCRATCH, 'ai_jobs.db'))
+
+# Third-party imports
+from werkzeug.serving import make_server  # In-process HTTP server
+
+# Local imports
+from app import app, celery
+from app.routes import limiter
+from benchmarks.datagen import PASSWORD, WORDS, generate
+from benchmarks.stub_openai import start_stub_server
+
+SCENARIOS = ['login', 'list', 'books_page', 'get', 'search', 'stats', 'create', 'recommend', 'recommend_cached']
+
+
+def request_for(scenario: str, worker: int, i: int, users: int, books: int) -> Tuple[str, str, Optional[Dict], Optional[Dict]]:
+    """(method, path, JSON body, form body) for the i-th request of a scenario.
+    Worker w acts as user w + 1, whose books have ids (w * books, (w + 1) * books]."""
+    user = worker % users + 1
+    if scenario == 'login':
+        return 'POST', '/login', None, {'username': f'user{user}', 'password': PASSWORD}
+    if scenario == 'list':
+        return 'GET', '/api/books/?limit=50', None, None
+    if scenario == 'books_page':
+        return 'GET', '/books', None, None
+    if scenario == 'get':
+        return 'GET', f'/api/books/{(user - 1) * books + (i * 7919) % books + 1}', None, None
+    if scenario == 'search':
+        return 'GET', f'/api/books/search?q={WORDS[i % len(WORDS)].lower()}', None, None
+    if scenario == 'stats':
+        return 'GET', '/api/books/stats', None, None
+    if scenario == 'create':
+        return 'POST', '/api/books/', {'title': f'Benchmark Book {i}', 'author': 'Bench Author',
+                                       'isbn': f'979{worker:03d}{i:07d}', 'year': 2024, 'genre': 'Fiction'}, None
+    if scenario == 'recommend':  # New preferences each time, so the cache never answers
+        return 'POST', '/api/ai/book-recommendation', {'genres': [f'Genre {worker}-{i}']}, None
+    if scenario == 'recommend_cached':
+        return 'POST', '/api/ai/book-recommendation', {'genres': ['Fantasy'], 'authors': ['Ursula K. Le Guin']}, None
+    raise ValueError(f'Unknown scenario: {scenario}')
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    """Nearest-rank percentile of a sorted list"""
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(latencies: List[float], errors: int, seconds: float) -> Dict:
+    ordered = sorted(latencies)
+    summary = {'requests': len(ordered), 'errors': errors, 'seconds': round(seconds, 3),
+               'throughput_rps': round(len(ordered) / seconds, 1) if seconds else 0.0}
+    if ordered:
+        summary.update({
+            'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+            'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+            'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+            'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+            'max_ms': round(ordered[-1] * 1000, 3),
+        })
+    return summary
+
+
+# In-process driver
+def logged_in_client(user: int):
+    client = app.test_client()
+    response = client.post('/login', data={'username': f'user{user}', 'password': PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError(f'Login as user{user} failed with {response.status_code}')
+    return client
+
+
+def run_test_client(scenarios: List[str], args) -> Dict[str, Dict]:
+    """Each scenario in turn: warmup requests, then timed ones one at a time"""
+    client = logged_in_client(1)
+    results = {}
+    for scenario in scenarios:
+        latencies, errors = [], 0
+        total_started = time.perf_counter()
+        for i in range(-args.warmup, args.requests):
+            method, path, body, form = request_for(scenario, 0, i + args.warmup, args.users, args.books)
+            target = app.test_client() if scenario == 'login' else client  # Logins start anonymous
+            started = time.perf_counter()
+            response = target.open(path, method=method, json=body, data=form)
+            elapsed = time.perf_counter() - started
+            if i == -1:
+                total_started = time.perf_counter()
+            if i < 0:
+                continue
+            if response.status_code >= 400:
+                errors += 1
+            else:
+                latencies.append(elapsed)
+        results[scenario] = summarize(latencies, errors, time.perf_counter() - total_started)
+    return results
+
+
+# HTTP load generator
+def http_call(conn: http.client.HTTPConnection, method: str, path: str, body: Optional[Dict],
+              form: Optional[Dict], cookies: str) -> http.client.HTTPResponse:
+    headers = {'Cookie': cookies} if cookies else {}
+    payload = None
+    if body is not None:
+        payload, headers['Content-Type'] = json.dumps(body), 'application/json'
+    elif form is not None:
+        payload, headers['Content-Type'] = urlencode(form), 'application/x-www-form-urlencoded'
+    conn.request(method, path, body=payload, headers=headers)
+    response = conn.getresponse()
+    response.read()
+    return response
+
+
+def http_worker(url: str, worker: int, scenario: str, args, start_at: float, results) -> None:
+    """Log in, then repeat one scenario on a keep-alive connection until the deadline"""
+    target = urlsplit(url)
+
+    def connect():
+        return http.client.HTTPConnection(target.hostname, target.port, timeout=60)
+
+    conn = connect()
+    login = http_call(conn, *request_for('login', worker, 0, args.users, args.books), '')
+    cookies = '' if scenario == 'login' else '; '.join(  # Logins start anonymous
+        header.split(';', 1)[0] for header in login.msg.get_all('Set-Cookie') or [])
+    latencies, errors, i = [], 0, 0
+    time.sleep(max(start_at - time.time(), 0))
+    deadline = start_at + args.seconds
+    while time.time() < deadline:
+        method, path, body, form = request_for(scenario, worker, i, args.users, args.books)
+        started = time.perf_counter()
+        try:
+            failed = http_call(conn, method, path, body, form, cookies).status >= 400
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = connect()
+            failed = True
+        if failed:
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - started)
+        i += 1
+    conn.close()
+    results.put((latencies, errors))
+
+
+def run_http(scenarios: List[str], args) -> Dict[str, Dict]:
+    """Each scenario in turn, from --processes processes at once for --seconds"""
+    server = None
+    url = args.url
+    if not url:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)  # No access log
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}'
+    context = multiprocessing.get_context('fork')  # Workers only use http.client
+    report = {}
+    try:
+        for scenario in scenarios:
+            results = context.Queue()
+            start_at = time.time() + 1 + args.processes * 0.5  # Time for every worker to log in
+            workers = [context.Process(target=http_worker, args=(url, w, scenario, args, start_at, results))
+                       for w in range(args.processes)]
+            for worker in workers:
+                worker.start()
+            collected = [results.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+            report[scenario] = summarize([t for latencies, _ in collected for t in latencies],
+                                         sum(errors for _, errors in collected), args.seconds)
+    finally:
+        if server:
+            server.shutdown()
+    return report
+
+
+# Baseline comparison
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[Dict]:
+    """Scenarios whose p95 latency rose or whose throughput fell by more than the tolerance"""
+    regressions = []
+    for scenario, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(scenario)
+        if not previous or not current['requests'] or not previous['requests']:
+            continue
+        for metric, worse in (('p95_ms', lambda old, new: new > old * (1 + tolerance)),
+                              ('throughput_rps', lambda old, new: new < old * (1 - tolerance))):
+            old, new = previous[metric], current[metric]
+            if old and worse(old, new):
+                regressions.append({'scenario': scenario, 'metric': metric, 'baseline': old,
+                                    'current': new, 'change': f'{(new - old) / old:+.1%}'})
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(app.root_path),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='End-to-end benchmark suite for the main request paths')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--books', type=int, default=500, help='Books per user')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated subset of ' + ', '.join(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=200, help='Timed requests per scenario (test client)')
+    parser.add_argument('--warmup', type=int, default=20, help='Untimed requests per scenario (test client)')
+    parser.add_argument('--ai-latency-ms', type=float, default=50, help='Stub OpenAI response time')
+    parser.add_argument('--http', action='store_true', help='Load over HTTP from several processes')
+    parser.add_argument('--processes', type=int, default=4, help='Load generator processes (--http)')
+    parser.add_argument('--seconds', type=float, default=10, help='Load duration (--http)')
+    parser.add_argument('--url', help='Running deployment to load instead of an in-process server (--http)')
+    parser.add_argument('--output', help='Also write the report to this file')
+    parser.add_argument('--baseline', help='Earlier report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Allowed relative slowdown')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Exit with status 1 on regressions')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if args.url and not args.http:
+        parser.error('--url needs --http')
+
+    try:
+        catalog = None
+        if not args.url:
+            catalog = generate(os.path.join(SCRATCH, 'catalog.db'), args.users, args.books, args.seed)
+            stub = start_stub_server(args.ai_latency_ms)
+            app.config['OPENAI_BASE_URL'] = f'http://127.0.0.1:{stub.server_port}/v1'
+            limiter.enabled = False  # Hourly limits would end the run after a few requests
+            celery.conf.update(task_always_eager=True)  # No broker needed
+        report = {
+            'meta': {
+                'driver': 'http' if args.http else 'test_client',
+                'url': args.url, 'processes': args.processes if args.http else 1,
+                'seconds': args.seconds if args.http else None,
+                'requests': None if args.http else args.requests, 'warmup': args.warmup,
+                'seed': args.seed, 'users': args.users, 'books_per_user': args.books,
+                'ai_latency_ms': args.ai_latency_ms, 'seed_seconds': catalog and catalog['seconds'],
+                'commit': git_commit(), 'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                'platform': platform.platform(), 'cpus': os.cpu_count(),
+                'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            },
+            'scenarios': run_http(scenarios, args) if args.http else run_test_client(scenarios, args),
+        }
+    finally:
+        shutil.rmtree(SCRATCH, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for key in ('driver', 'users', 'books_per_user', 'seed', 'ai_latency_ms', 'processes'):
+            if baseline.get('meta', {}).get(key) != report['meta'][key]:
+                print(f"warning: baseline was run with {key}={baseline['meta'].get(key)!r}, "
+                      f"this run with {report['meta'][key]!r}", file=sys.stderr)
+        report['baseline'] = {'path': args.baseline, 'commit': baseline.get('meta', {}).get('commit'),
+                              'tolerance': args.tolerance}
+        report['regressions'] = compare(report, baseline, args.tolerance)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    if args.fail_on_regression and report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
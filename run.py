@@ -3,12 +3,15 @@
 # Third-party imports
 from flask import Flask  # Web framework
 from app import app, db  # Import Flask app and database instances
+from app.services.local_recommender import get_local_recommender  # Offline recommendation index
 
 # Main execution block
 if __name__ == '__main__':
     # Initialize database tables
     with app.app_context():
-        db.create_all()  # Create all defined models
+        db.create_all()  # Create all defined models and apply pending migrations
+        if app.config['AI_LOCAL_FALLBACK'] or app.config['AI_RECOMMENDER'] == 'local':
+            get_local_recommender()  # Starts building the fallback index in the background
     
     # Start Flask development server
     # Has been set to debug=False to test system as a regular user
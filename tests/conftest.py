@@ -0,0 +1,103 @@
+# tests/conftest.py
+# Environment and shared fixtures for the test run. Flask-SQLAlchemy binds its
+# engine when `app` is imported, so the database URL has to be set first.
+
+import os
+import tempfile
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+os.environ.setdefault('CELERY_BROKER_URL', 'memory://')
+os.environ.setdefault('CELERY_RESULT_BACKEND', 'cache+memory://')
+os.environ.setdefault('RATELIMIT_STORAGE_URI', 'memory://')
+os.environ.setdefault('SECRET_KEY', 'test-secret-key')
+os.environ.setdefault('MAIL_OUTBOX_PATH', os.path.join(tempfile.mkdtemp(), 'mail_outbox.db'))
+os.environ.setdefault('METRICS_PATH', os.path.join(tempfile.mkdtemp(), 'metrics.db'))
+os.environ.setdefault('AI_JOB_PATH', os.path.join(tempfile.mkdtemp(), 'ai_jobs.db'))
+
+import pytest
+from app import app, celery, db
+from app.models.user import User
+from app.profiling import QueryBudgetExceeded, request_checks
+from app.services.fragments import get_fragment_cache
+from app.routes import limiter
+
+# Default limits (10 per hour) would trip on the logins every test performs
+limiter.enabled = False
+
+# Run Celery tasks in-process and keep their results queryable by id
+celery.conf.update(task_always_eager=True, task_store_eager_result=True)
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'query_budget(n): most SQL statements one request may run')
+
+@pytest.fixture(scope='function')
+def test_client():
+    """Set up a test client with an in-memory database."""
+    app.config.update({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'LOGIN_DISABLED': False,
+        'WTF_CSRF_ENABLED': False,
+    })
+
+    with app.app_context():
+        db.create_all()
+        get_fragment_cache().clear()  # Catalog versions restart with every fresh database
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture(scope='function')
+def test_user():
+    """Create a test user."""
+    with app.app_context():
+        # Check if the user already exists and remove if necessary
+        existing_user = User.query.filter_by(email='test@example.com').first()
+        if existing_user:
+            db.session.delete(existing_user)
+            db.session.commit()
+
+        user = User(username='testuser', email='test@example.com')
+        user.set_password('Password123!')
+        db.session.add(user)
+        db.session.commit()
+        yield user
+        # Clean up after test
+        db.session.delete(user)
+        db.session.commit()
+
+@pytest.fixture(scope='function')
+def authenticated_client(test_client, test_user):
+    """Log in the test user."""
+    with test_client:
+        response = test_client.post('/login', data={
+            'username': test_user.username,
+            'password': 'Password123!'
+        }, follow_redirects=True)
+        assert response.status_code == 200
+        yield test_client
+
+@pytest.fixture(scope='function')
+def query_budget(request):
+    """Fail a request that runs more statements than its budget, or repeats one
+    N+1 style. The budget is SQL_QUERY_BUDGET unless the test is marked with
+    @pytest.mark.query_budget(n)."""
+    marker = request.node.get_closest_marker('query_budget')
+    budget = marker.args[0] if marker else app.config['SQL_QUERY_BUDGET']
+    threshold = app.config['SQL_N_PLUS_ONE_THRESHOLD']
+
+    def check(log):
+        if log.count > budget:
+            raise QueryBudgetExceeded(f'over the budget of {budget} statements\n{log.summary()}')
+        repeated = log.repeated(threshold)
+        if repeated:
+            statement, count, sites = repeated[0]
+            raise QueryBudgetExceeded(f'N+1: ran {count} times from {", ".join(sites)}\n{log.summary()}')
+
+    profiling = app.config['SQL_PROFILING']
+    app.config['SQL_PROFILING'] = True
+    request_checks.append(check)
+    yield budget
+    request_checks.remove(check)
+    app.config['SQL_PROFILING'] = profiling
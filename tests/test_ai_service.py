@@ -0,0 +1,524 @@
+# tests/test_ai_service.py
+# tested with: "pytest tests/test_ai_service.py -v"
+
+import json
+import threading
+import time
+from types import SimpleNamespace
+import httpx
+import pytest
+from app import app, db
+from app.metrics import registry
+from app.models.book import Book
+from app.models.user import User
+from app.services.ai_service import (AIRecommendationService, get_ai_service,
+                                     make_openai_client, recommendation_cache_key)
+from app.services.cache import MemoryCache, SQLiteCache
+from app.services.json_stream import JSONArrayStreamParser
+from app.services import local_recommender
+from app.services.local_recommender import LocalRecommender
+from app.services.singleflight import SingleFlight
+
+RECOMMENDATIONS = [
+    {'title': 'Elantris', 'author': 'Brandon Sanderson', 'description': 'A fallen city.', 'genre': 'Fantasy'}
+]
+
+class StubCompletions:
+    """Stands in for client.chat.completions and counts upstream calls."""
+
+    def __init__(self, content=None):
+        self.calls = 0
+        self.content = content or json.dumps(RECOMMENDATIONS)
+
+    def create(self, stream=False, **kwargs):
+        self.calls += 1
+        if stream:
+            return fake_chunk_stream(self.content)
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+def fake_chunk_stream(content, size=7, consumed=None):
+    """Yield the content as streamed completion chunks, recording how far it got."""
+    for start in range(0, len(content), size):
+        if consumed is not None:
+            consumed.append(start + size)
+        delta = SimpleNamespace(content=content[start:start + size])
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+class StubClient:
+    """Minimal OpenAI client replacement."""
+
+    def __init__(self, content=None):
+        self.completions = StubCompletions(content)
+        self.chat = SimpleNamespace(completions=self.completions)
+        self.options = {}
+
+    def with_options(self, **options):
+        self.options = options
+        return self
+
+@pytest.fixture
+def stub_client():
+    return StubClient()
+
+def test_repeat_preferences_served_from_cache(stub_client):
+    """Test that equivalent preference sets reach the upstream API once."""
+    service = AIRecommendationService(client=stub_client, cache=MemoryCache(),
+                                      singleflight=SingleFlight())
+    first = service.get_recommendations({'genres': ['Fantasy', 'Sci-Fi'], 'authors': []})
+    second = service.get_recommendations({'genres': [' sci-fi ', 'fantasy', 'Fantasy']})
+
+    assert first == second == RECOMMENDATIONS
+    assert stub_client.completions.calls == 1
+    assert service.cache.stats() == {'hits': 1, 'misses': 1, 'size': 1}
+
+def test_cache_key_ignores_order_and_case():
+    """Test cache key normalization."""
+    assert recommendation_cache_key({'genres': ['A', 'b'], 'authors': ['X  Y']}) == \
+        recommendation_cache_key({'genres': ['B', 'a', 'a'], 'authors': ['x y']})
+    assert recommendation_cache_key({'genres': ['a']}) != recommendation_cache_key({'authors': ['a']})
+
+def test_memory_cache_ttl_and_lru():
+    """Test expiry and least-recently-used eviction."""
+    cache = MemoryCache(default_ttl=60, max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+
+    cache.set('expired', 4, ttl=-1)
+    assert cache.get('expired') is None
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path, stub_client):
+    """Test that two services pointed at one cache file share responses."""
+    path = str(tmp_path / 'cache.db')
+    AIRecommendationService(client=stub_client, cache=SQLiteCache(path)).get_recommendations(
+        {'authors': ['Brandon Sanderson']})
+    other = AIRecommendationService(client=stub_client, cache=SQLiteCache(path))
+
+    started = time.perf_counter()
+    assert other.get_recommendations({'authors': ['brandon sanderson']}) == RECOMMENDATIONS
+    assert time.perf_counter() - started < 0.05
+    assert stub_client.completions.calls == 1
+
+def test_sqlite_cache_evicts_least_recently_used(tmp_path):
+    """Test the size bound of the shared cache."""
+    cache = SQLiteCache(str(tmp_path / 'cache.db'), max_entries=2, touch_interval=0)
+    cache.set('a', [1])
+    time.sleep(0.01)
+    cache.set('b', [2])
+    time.sleep(0.01)
+    cache.get('a')
+    time.sleep(0.01)
+    cache.set('c', [3])
+    assert cache.get('b') is None
+    assert cache.get('a') == [1]
+    assert len(cache) == 2
+
+def test_sqlite_cache_hits_within_touch_interval_do_not_write(tmp_path):
+    """Test that repeated hits refresh the LRU position at most once per interval."""
+    cache = SQLiteCache(str(tmp_path / 'cache.db'), touch_interval=60)
+    cache.set('a', [1])
+    conn = cache._connection()
+    writes = conn.total_changes
+    assert [cache.get('a') for _ in range(3)] == [[1]] * 3
+    assert conn.total_changes == writes
+    assert cache.stats()['hits'] == 3
+
+def test_cache_counters_are_thread_safe():
+    """Test that concurrent lookups lose no hit or miss counts."""
+    cache = MemoryCache()
+    cache.set('a', 1)
+    def lookup():
+        for _ in range(2000):
+            cache.get('a')
+            cache.get('missing')
+    threads = [threading.Thread(target=lookup) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert (cache.hits, cache.misses) == (8000, 8000)
+
+@pytest.fixture
+def ai_extensions():
+    """Start and finish with no app-wide AI service, cache or job registry."""
+    names = ('ai_service', 'ai_cache', 'ai_jobs', 'ai_singleflight', 'ai_local')
+    for name in names:
+        app.extensions.pop(name, None)
+    yield app.extensions
+    for name in names:
+        app.extensions.pop(name, None)
+
+@pytest.fixture
+def job_client(authenticated_client, stub_client, ai_extensions, tmp_path, monkeypatch):
+    """Route background jobs to the stub client with empty caches and registry."""
+    monkeypatch.setitem(app.config, 'AI_JOB_PATH', str(tmp_path / 'ai_jobs.db'))
+    ai_extensions['ai_service'] = AIRecommendationService(client=stub_client)
+    yield authenticated_client
+
+def test_recommendation_job_mode(job_client, stub_client):
+    """Test submitting a background job and polling for its result."""
+    response = job_client.post('/api/ai/book-recommendation?async=true',
+                               json={'genres': ['Fantasy'], 'authors': []})
+    assert response.status_code == 202
+    job = response.get_json()
+    assert response.headers['Location'] == job['status_url']
+
+    response = job_client.get(job['status_url'])
+    assert response.status_code == 200
+    assert response.get_json() == {'job_id': job['job_id'], 'status': 'done',
+                                   'recommendations': RECOMMENDATIONS}
+
+def test_identical_jobs_are_collapsed(job_client, stub_client):
+    """Test that identical requests reuse one job."""
+    first = job_client.post('/api/ai/book-recommendation?async=1', json={'genres': ['Fantasy']})
+    second = job_client.post('/api/ai/book-recommendation?async=1', json={'genres': [' fantasy']})
+    assert first.get_json()['job_id'] == second.get_json()['job_id']
+    assert stub_client.completions.calls == 1
+
+def test_jobs_are_visible_to_other_workers(job_client, stub_client, ai_extensions):
+    """Test polling and collapsing through a second registry on the same file."""
+    job = job_client.post('/api/ai/book-recommendation?async=1', json={'genres': ['Fantasy']}).get_json()
+    ai_extensions.pop('ai_jobs')  # As seen from another worker process
+    assert job_client.get(job['status_url']).get_json()['status'] == 'done'
+    again = job_client.post('/api/ai/book-recommendation?async=1', json={'genres': ['fantasy']})
+    assert again.get_json()['job_id'] == job['job_id']
+    assert stub_client.completions.calls == 1
+
+def test_jobs_belong_to_their_submitter(job_client, stub_client):
+    """Test that another user can neither poll a job nor be collapsed onto it."""
+    job = job_client.post('/api/ai/book-recommendation?async=1', json={'genres': ['Fantasy']}).get_json()
+    other = User(username='other_reader', email='other_reader@example.com')
+    other.set_password('Password123!')
+    db.session.add(other)
+    db.session.commit()
+    job_client.get('/logout')
+    job_client.post('/login', data={'username': 'other_reader', 'password': 'Password123!'})
+
+    assert job_client.get(job['status_url']).status_code == 404
+    again = job_client.post('/api/ai/book-recommendation?async=1', json={'genres': ['Fantasy']})
+    assert again.get_json()['job_id'] != job['job_id']
+
+def test_job_claim_is_atomic_across_registries(tmp_path):
+    """Test that only one of two registries on the same file can claim a request."""
+    first, second = SQLiteCache(str(tmp_path / 'jobs.db')), SQLiteCache(str(tmp_path / 'jobs.db'))
+    assert first.add('request:1:key', 'job-a')
+    assert not second.add('request:1:key', 'job-b')
+    assert not second.discard('request:1:key', 'job-b')
+    assert second.discard('request:1:key', 'job-a')
+    assert second.add('request:1:key', 'job-b') and first.get('request:1:key') == 'job-b'
+
+def test_unknown_job_is_not_found(job_client):
+    """Test polling an id that was never submitted."""
+    assert job_client.get('/api/ai/jobs/does-not-exist').status_code == 404
+
+class SlowStubClient(StubClient):
+    """Stub client whose completions take a while, like the real API."""
+
+    def __init__(self, delay=0.2):
+        super().__init__()
+        create = self.completions.create
+
+        def slow_create(**kwargs):
+            time.sleep(delay)
+            return create(**kwargs)
+        self.completions.create = slow_create
+
+def run_concurrently(services, preferences, count):
+    """Call get_recommendations from several threads at once."""
+    results = []
+    threads = [threading.Thread(target=lambda s=services[i % len(services)]:
+                                results.append(s.get_recommendations(preferences)))
+               for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_concurrent_identical_requests_share_one_call():
+    """Test single-flight deduplication across threads."""
+    client = SlowStubClient()
+    group = SingleFlight()
+    service = AIRecommendationService(client=client, cache=MemoryCache(), singleflight=group)
+
+    results = run_concurrently([service], {'genres': ['Fantasy']}, 10)
+    assert results == [RECOMMENDATIONS] * 10
+    assert client.completions.calls == 1
+    assert group.stats() == {'executions': 1, 'coalesced': 9}
+
+def test_saved_upstream_calls_are_exported(test_client):
+    """Test that /metrics reports upstream calls made and saved, by reason."""
+    registry.clear()
+    service = AIRecommendationService(client=SlowStubClient(), cache=MemoryCache(),
+                                      singleflight=SingleFlight())
+    run_concurrently([service], {'genres': ['Fantasy']}, 10)
+    service.get_recommendations({'genres': ['fantasy']})
+
+    text = test_client.get('/metrics').get_data(as_text=True)
+    assert 'ai_upstream_calls_total 1\n' in text
+    assert 'ai_upstream_calls_saved_total{reason="coalesced"} 9\n' in text
+    assert 'ai_upstream_calls_saved_total{reason="cache"} 1\n' in text
+
+def test_cross_process_lock_reuses_shared_cache(tmp_path):
+    """Test that leaders in separate groups (processes) wait on the lock file."""
+    client = SlowStubClient()
+    cache_path, lock_dir = str(tmp_path / 'cache.db'), str(tmp_path / 'locks')
+    services = [AIRecommendationService(client=client, cache=SQLiteCache(cache_path),
+                                        singleflight=SingleFlight(lock_dir=lock_dir))
+                for _ in range(3)]
+
+    results = run_concurrently(services, {'authors': ['Neil Gaiman']}, 6)
+    assert results == [RECOMMENDATIONS] * 6
+    assert client.completions.calls == 1
+
+def test_leader_errors_reach_followers():
+    """Test that a failed upstream call fails every waiting caller."""
+    group = SingleFlight()
+    started = threading.Event()
+
+    def failing():
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError('upstream down')
+
+    errors = []
+    def call():
+        try:
+            group.do('key', failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=call)
+    follower.start()
+    leader.join()
+    follower.join()
+    assert errors == ['upstream down'] * 2
+
+def completion_body(content):
+    """Chat completion payload as returned by the OpenAI API."""
+    return {
+        'id': 'chatcmpl-test', 'object': 'chat.completion', 'created': 0, 'model': 'gpt-3.5-turbo',
+        'choices': [{'index': 0, 'finish_reason': 'stop',
+                     'message': {'role': 'assistant', 'content': content}}]
+    }
+
+def test_service_is_created_once_per_app(ai_extensions):
+    """Test that every caller shares one service and connection pool."""
+    assert get_ai_service() is get_ai_service()
+
+def test_missing_api_key_fails_lazily(ai_extensions, monkeypatch):
+    """Test that a missing key surfaces on first use, not at import."""
+    monkeypatch.delenv('OPENAI_API_KEY')
+    with pytest.raises(ValueError):
+        get_ai_service()
+
+def test_pluggable_transport_with_retry_on_429(ai_extensions, monkeypatch):
+    """Test the real client over a mock transport that rate-limits once
+    (retries apply when there is no local fallback to answer instead)."""
+    monkeypatch.setitem(app.config, 'AI_LOCAL_FALLBACK', False)
+    attempts = []
+
+    def handler(request):
+        attempts.append(request.url.path)
+        if len(attempts) == 1:
+            return httpx.Response(429, headers={'retry-after-ms': '10'}, json={'error': {}})
+        return httpx.Response(200, json=completion_body(json.dumps(RECOMMENDATIONS)))
+
+    service = AIRecommendationService(client=make_openai_client(httpx.MockTransport(handler)),
+                                      cache=MemoryCache(), singleflight=SingleFlight())
+    assert service.get_recommendations({'genres': ['Fantasy']}) == RECOMMENDATIONS
+    assert attempts == ['/v1/chat/completions'] * 2
+
+@pytest.fixture
+def readers(test_client):
+    """Three readers' shelves; returns their user ids."""
+    shelves = {
+        'reader_a': [('Mistborn', 'Brandon Sanderson', 'Fantasy'),
+                     ('The Way of Kings', 'Brandon Sanderson', 'Fantasy'),
+                     ('The Eye of the World', 'Robert Jordan', 'Fantasy')],
+        'reader_b': [('Mistborn', 'Brandon Sanderson', 'Fantasy'),
+                     ('Elantris', 'Brandon Sanderson', 'Fantasy'),
+                     ('The Name of the Wind', 'Patrick Rothfuss', 'Fantasy')],
+        'reader_c': [('Dune', 'Frank Herbert', 'Science Fiction'),
+                     ('Hyperion', 'Dan Simmons', 'Science Fiction')],
+    }
+    ids = []
+    for name, books in shelves.items():
+        user = User(username=name, email=f'{name}@example.com')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add_all(Book(title=t, author=a, genre=g, user_id=user.id) for t, a, g in books)
+        ids.append(user.id)
+    db.session.commit()
+    return ids
+
+def warm_recommender():
+    recommender = LocalRecommender()
+    recommender.warm()
+    return recommender
+
+def test_local_recommender_uses_shared_tastes(readers):
+    """Test author matches first, then books shelved by like-minded readers."""
+    picks = warm_recommender().recommend({'authors': ['brandon sanderson'], 'genres': []})
+    # Two Sanderson books at most, then what his other readers shelve; Dune is unrelated
+    assert [p['title'] for p in picks] == ['Mistborn', 'Elantris', 'The Eye of the World',
+                                           'The Name of the Wind']
+    assert picks[0]['genre'] == 'Fantasy' and picks[0]['description']
+
+    picks = warm_recommender().recommend({'genres': ['science fiction'], 'authors': []})
+    assert {p['title'] for p in picks[:2]} == {'Dune', 'Hyperion'}
+
+def test_local_recommender_refreshes_changed_users_only(readers, monkeypatch):
+    """Test that a refresh re-reads only catalogs whose version moved."""
+    recommender = LocalRecommender()
+    loads = []
+    load = recommender._load
+    monkeypatch.setattr(recommender, '_load', lambda ids: (loads.append(sorted(ids)), load(ids)))
+
+    recommender.warm()
+    recommender.recommend({'genres': ['horror'], 'authors': []})
+    db.session.add(Book(title='The Shining', author='Stephen King', genre='Horror', user_id=readers[2]))
+    db.session.commit()
+    picks = recommender.recommend({'genres': ['horror'], 'authors': []})
+
+    assert loads == [sorted(readers), [readers[2]]]
+    assert [p['title'] for p in picks][:1] == ['The Shining']
+
+    Book.query.filter_by(title='The Shining').delete()
+    db.session.commit()
+    assert recommender.recommend({'genres': ['horror'], 'authors': []}) == []
+
+def test_local_recommender_builds_index_in_background(readers):
+    """Test that a cold recommender answers at once and builds its index off the request."""
+    recommender = LocalRecommender()
+    loads = []
+    load = recommender._load
+    recommender._load = lambda ids: (time.sleep(0.2), loads.append(len(ids)), load(ids))
+
+    started = time.monotonic()
+    assert recommender.recommend({'authors': ['frank herbert'], 'genres': []}) == []
+    assert time.monotonic() - started < 0.1
+    recommender._warm_thread.join()
+    assert loads == [3]
+    assert recommender.recommend({'authors': ['frank herbert'], 'genres': []})[0]['title'] == 'Dune'
+
+def test_related_reader_shelves_are_capped(readers, monkeypatch):
+    """Test that only a reader's most shelved works get collaborative credit."""
+    monkeypatch.setattr(local_recommender, 'READER_SHELF_WORKS', 1)
+    recommender = warm_recommender()
+    assert recommender._user_works[readers[0]] == (3, (('mistborn', 'brandon sanderson'),))
+    scores = recommender.score({'authors': [], 'genres': ['science fiction']})
+    assert set(scores) == {('dune', 'frank herbert'), ('hyperion', 'dan simmons')}
+
+def test_rate_limited_upstream_falls_back_locally(readers, ai_extensions):
+    """Test that a 429 is answered locally at once, despite the client's retry
+    setting, and that the upstream rests for a while."""
+    assert app.config['AI_MAX_RETRIES'] > 0
+    attempts = []
+
+    def handler(request):
+        attempts.append(request.url.path)
+        return httpx.Response(429, json={'error': {'message': 'quota'}})
+
+    service = AIRecommendationService(client=make_openai_client(httpx.MockTransport(handler)),
+                                      cache=MemoryCache(), singleflight=SingleFlight(),
+                                      local=warm_recommender())
+    local_answers = AIRecommendationService.local_answers
+    first = service.get_recommendations({'authors': ['Frank Herbert']})
+    second = service.get_recommendations({'genres': ['Fantasy']})
+
+    assert first[0]['title'] == 'Dune'
+    assert second and len(attempts) == 1  # No retries; the second request skipped the upstream
+    assert AIRecommendationService.local_answers == local_answers + 2
+
+def test_upstream_timeout_is_not_retried_before_fallback(readers, ai_extensions):
+    """Test that a timed-out attempt goes straight to the local answer."""
+    attempts = []
+
+    def handler(request):
+        attempts.append(request.extensions['timeout'])
+        raise httpx.ReadTimeout('upstream too slow', request=request)
+
+    service = AIRecommendationService(client=make_openai_client(httpx.MockTransport(handler)),
+                                      cache=MemoryCache(), singleflight=SingleFlight(),
+                                      local=warm_recommender())
+    started = time.monotonic()
+    assert service.get_recommendations({'authors': ['Frank Herbert']})[0]['title'] == 'Dune'
+    assert time.monotonic() - started < 0.5  # No SDK backoff sleeps
+    assert len(attempts) == 1 and attempts[0]['read'] == app.config['AI_FALLBACK_TIMEOUT']
+
+def test_offline_mode_needs_no_api_key(readers, ai_extensions, monkeypatch):
+    """Test AI_RECOMMENDER=local answers without an OpenAI client."""
+    monkeypatch.setitem(app.config, 'AI_RECOMMENDER', 'local')
+    monkeypatch.delenv('OPENAI_API_KEY')
+    service = get_ai_service()
+    service.local._warm_thread.join()  # Started when the service was created
+    assert service.client is None
+    assert service.get_recommendations({'genres': ['Science Fiction']})[0]['genre'] == 'Science Fiction'
+
+STREAMED = [
+    {'title': f'Book {i}', 'author': 'Author', 'description': 'Has "quotes" and {braces}.',
+     'genre': 'Fantasy'} for i in range(5)
+]
+
+def test_stream_parser_handles_any_chunking():
+    """Test that objects come out whole however the text is split."""
+    text = '```json\n' + json.dumps(STREAMED, indent=2) + '\n```'
+    for size in (1, 2, 3, 16, len(text)):
+        parser = JSONArrayStreamParser()
+        books = [b for i in range(0, len(text), size) for b in parser.feed(text[i:i + size])]
+        assert books == STREAMED and parser.finished
+
+def test_first_recommendation_arrives_before_the_stream_ends(stub_client):
+    """Test that each book is yielded as soon as its object closes."""
+    content, consumed = json.dumps(STREAMED), []
+    stub_client.completions.create = lambda **kwargs: fake_chunk_stream(content, consumed=consumed)
+    service = AIRecommendationService(client=stub_client, cache=MemoryCache(),
+                                      singleflight=SingleFlight())
+
+    books = service.stream_recommendations({'genres': ['Fantasy']})
+    assert next(books) == STREAMED[0]
+    assert consumed[-1] < len(content) / 4  # About a fifth of the text was needed
+    assert list(books) == STREAMED[1:]
+
+def test_completed_stream_is_cached(stub_client):
+    """Test that a fully streamed answer serves later requests without upstream."""
+    stub_client.completions.content = json.dumps(STREAMED)
+    service = AIRecommendationService(client=stub_client, cache=MemoryCache(),
+                                      singleflight=SingleFlight())
+    assert list(service.stream_recommendations({'genres': ['Fantasy']})) == STREAMED
+    assert list(service.stream_recommendations({'genres': ['fantasy']})) == STREAMED
+    assert service.get_recommendations({'genres': ['Fantasy']}) == STREAMED
+    assert stub_client.completions.calls == 1
+
+def test_stream_endpoint_ndjson_and_sse(job_client, stub_client):
+    """Test both wire formats of the streaming endpoint."""
+    stub_client.completions.content = json.dumps(STREAMED)
+    response = job_client.post('/api/ai/book-recommendation/stream', json={'genres': ['Fantasy']})
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert lines == STREAMED + [{'done': True, 'count': 5}]
+
+    response = job_client.post('/api/ai/book-recommendation/stream', json={'genres': ['Fantasy']},
+                               headers={'Accept': 'text/event-stream'})
+    assert response.mimetype == 'text/event-stream'
+    events = response.get_data(as_text=True).split('\n\n')
+    assert events[0] == 'event: recommendation\ndata: ' + json.dumps(STREAMED[0])
+    assert events[5] == 'event: done\ndata: {"done": true, "count": 5}'
+
+    assert job_client.post('/api/ai/book-recommendation/stream', json={}).status_code == 400
+
+def test_stream_falls_back_before_first_book(readers, ai_extensions):
+    """Test that an upstream failure before any output is answered locally."""
+    client = StubClient(content='Sorry, I cannot help with that.')
+    service = AIRecommendationService(client=client, cache=MemoryCache(),
+                                      singleflight=SingleFlight(), local=warm_recommender())
+    books = list(service.stream_recommendations({'authors': ['Frank Herbert']}))
+    assert books[0]['title'] == 'Dune'
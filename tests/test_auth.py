@@ -0,0 +1,201 @@
+# tests/test_auth.py
+# tested with: "pytest tests/test_auth.py -v"
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import pytest
+from flask import g
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from app import app, db
+from app.metrics import registry
+from app.models.user import User, user_cache
+from app.services import passwords
+from app.services.passwords import canonical_method, needs_rehash, verify_password
+from app.sessions import SQLiteSessionInterface, load_secret_key
+
+@contextmanager
+def captured_statements():
+    """Collect the SQL statements executed inside the block."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+def user_queries(statements):
+    """Statements that read the user table."""
+    return [s for s in statements if 'FROM user' in s]
+
+def fresh_get(client, url):
+    """GET as a new request would see it. The fixtures keep one app context
+    open, so Flask-Login's user and the session's identity map must be reset."""
+    g.pop('_login_user', None)
+    db.session.expunge_all()
+    response = client.get(url)
+    db.session.expunge_all()  # Leave no request-loaded instances behind
+    return response
+
+def test_repeat_requests_skip_user_query(authenticated_client, test_user):
+    """Test that only the first authenticated request loads the user."""
+    user_id = test_user.id
+    user_cache.clear()
+    hits = user_cache.hits
+
+    with captured_statements() as first:
+        assert fresh_get(authenticated_client, '/api/books/').status_code == 200
+    with captured_statements() as second:
+        assert fresh_get(authenticated_client, '/api/books/').status_code == 200
+
+    assert len(user_queries(first)) == 1
+    assert user_queries(second) == []
+    assert user_cache.hits == hits + 1
+
+def test_saved_user_queries_are_exported(authenticated_client, test_user):
+    """Test that /metrics counts user loads served from the cache and from the database."""
+    user_cache.clear()
+    registry.clear()
+    for _ in range(3):
+        fresh_get(authenticated_client, '/api/books/')
+    text = authenticated_client.get('/metrics').get_data(as_text=True)
+    assert 'user_loader_lookups_total{source="query"} 1\n' in text
+    assert 'user_loader_lookups_total{source="cache"} 2\n' in text
+
+def test_cached_user_is_usable(authenticated_client, test_user):
+    """Test that pages needing the user's attributes work from the cache."""
+    fresh_get(authenticated_client, '/books')
+    response = fresh_get(authenticated_client, '/books')
+    assert response.status_code == 200
+    assert 'Hello, testuser' in response.get_data(as_text=True)
+
+def test_user_changes_invalidate_cache(authenticated_client, test_user):
+    """Test that updating a user evicts its cached snapshot."""
+    user_id = test_user.id
+    fresh_get(authenticated_client, '/api/books/')
+    assert user_cache.get(user_id) is not None
+
+    user = db.session.get(User, user_id)
+    user.email = 'changed@example.com'
+    db.session.commit()
+
+    assert user_cache.get(user_id) is None
+    response = fresh_get(authenticated_client, '/books')
+    assert response.status_code == 200
+
+def test_secret_key_is_shared_through_instance_file(tmp_path, monkeypatch):
+    """Test that workers starting together agree on one persisted key."""
+    monkeypatch.delenv('SECRET_KEY', raising=False)
+    with ThreadPoolExecutor(8) as pool:
+        keys = set(pool.map(lambda _: load_secret_key(str(tmp_path)), range(8)))
+
+    assert len(keys) == 1
+    assert load_secret_key(str(tmp_path)) in keys  # Survives a restart
+    assert oct(os.stat(tmp_path / 'secret_key').st_mode & 0o777) == '0o600'
+    assert [p.name for p in tmp_path.iterdir()] == ['secret_key']
+
+def test_secret_key_environment_overrides_file(tmp_path, monkeypatch):
+    """Test that SECRET_KEY in the environment wins and writes no file."""
+    monkeypatch.setenv('SECRET_KEY', 'from-env')
+    assert load_secret_key(str(tmp_path)) == 'from-env'
+    assert not (tmp_path / 'secret_key').exists()
+
+@pytest.fixture
+def server_sessions(tmp_path, monkeypatch):
+    """Swap in the SQLite session store for one test."""
+    interface = SQLiteSessionInterface(str(tmp_path / 'sessions.db'))
+    monkeypatch.setattr(app, 'session_interface', interface)
+    return interface
+
+def test_server_side_session_survives_new_worker(test_client, test_user, server_sessions, tmp_path, monkeypatch):
+    """Test that the cookie holds only a short id and another store instance
+    (another worker) resolves it to the logged-in session."""
+    test_client.post('/login', data={'username': 'testuser', 'password': 'Password123!'})
+    sid = test_client.get_cookie('session').value
+    assert len(sid) == 22
+
+    monkeypatch.setattr(app, 'session_interface', SQLiteSessionInterface(str(tmp_path / 'sessions.db')))
+    g.pop('_login_user', None)
+    assert test_client.get('/books').status_code == 200
+
+    test_client.get('/logout')
+    g.pop('_login_user', None)
+    assert test_client.get('/books').status_code == 302  # Back to the login page
+
+def test_session_id_changes_on_login_and_logout(test_client, test_user, server_sessions):
+    """Test that an id issued before login is never the authenticated one (session fixation)."""
+    test_client.get('/books')  # The login-required flash saves an anonymous session
+    planted = test_client.get_cookie('session').value
+
+    test_client.post('/login', data={'username': 'testuser', 'password': 'Password123!'})
+    authenticated = test_client.get_cookie('session').value
+    assert authenticated != planted
+    g.pop('_login_user', None)
+    test_client.set_cookie('session', planted)
+    assert test_client.get('/books').status_code == 302  # The planted id was discarded
+
+    test_client.set_cookie('session', authenticated)
+    g.pop('_login_user', None)
+    assert test_client.get('/books').status_code == 200
+    test_client.get('/logout')
+    assert test_client.get_cookie('session').value != authenticated
+
+def test_login_upgrades_outdated_hash(test_client, test_user):
+    """Test that a hash made with old parameters is replaced at login."""
+    test_user.password_hash = generate_password_hash('Password123!', method='pbkdf2:sha256:1000')
+    db.session.commit()
+    assert test_user.password_needs_rehash()
+
+    response = test_client.post('/login', data={
+        'username': 'testuser', 'password': 'Password123!'
+    }, follow_redirects=True)
+    assert response.status_code == 200
+
+    user = db.session.get(User, test_user.id)
+    assert user.password_hash.startswith(canonical_method(app.config['PASSWORD_HASH_METHOD']) + '$')
+    assert not needs_rehash(user.password_hash)
+    assert user.check_password('Password123!')
+
+def test_hash_method_is_configurable(test_client, test_user, monkeypatch):
+    """Test that new hashes use the configured method."""
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:2000')
+    test_user.set_password('Password123!')
+    assert test_user.password_hash.startswith('pbkdf2:sha256:2000$')
+    assert not test_user.password_needs_rehash()
+
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'scrypt')
+    assert test_user.password_needs_rehash()
+
+def test_verify_concurrency_is_limited(monkeypatch):
+    """Test that no more than PASSWORD_VERIFY_CONCURRENCY verifications run at once."""
+    monkeypatch.setitem(app.config, 'PASSWORD_VERIFY_CONCURRENCY', 2)
+    monkeypatch.delitem(app.extensions, 'password_semaphore', raising=False)
+    pwhash = generate_password_hash('secret', method='pbkdf2:sha256:1000')
+    running, peak, lock = [0], [0], threading.Lock()
+    check = passwords.check_password_hash
+
+    def counting_check(*args):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return check(*args)
+    monkeypatch.setattr(passwords, 'check_password_hash', counting_check)
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda password: verify_password(pwhash, password), ['secret', 'wrong'] * 4))
+    assert results == [True, False] * 4
+    assert peak[0] <= 2
+    assert not verify_password(None, 'secret')
+    app.extensions.pop('password_semaphore')
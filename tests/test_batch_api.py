@@ -0,0 +1,112 @@
+# tests/test_batch_api.py
+# tested with: "pytest tests/test_batch_api.py -v"
+
+import pytest
+from tests.test_auth import captured_statements
+from app import app, db
+from app.models.user import User
+from app.models.book import Book
+
+@pytest.fixture(scope='function')
+def shelf(authenticated_client, test_user):
+    """Three books for the test user and one for another user; returns their ids."""
+    with app.app_context():
+        other = User(username='otheruser', email='other@example.com')
+        other.set_password('Password123!')
+        db.session.add(other)
+        db.session.commit()
+        books = [
+            Book(title=f'Book {i}', author='Author', isbn=f'400000000000{i}',
+                 year=2000 + i, genre='Fiction', user_id=test_user.id)
+            for i in range(3)
+        ] + [Book(title='Not Mine', author='Other', isbn='4000000000009',
+                  year=1999, genre='Fiction', user_id=other.id)]
+        db.session.add_all(books)
+        db.session.commit()
+        ids = [book.id for book in books]
+    return ids
+
+def test_batch_update_reports_each_item(authenticated_client, shelf):
+    """Test partial updates applied together with per-item failures."""
+    mine, theirs = shelf[:3], shelf[3]
+    response = authenticated_client.patch('/api/books/batch', json={'books': [
+        {'id': mine[0], 'genre': 'Fantasy'},
+        {'id': mine[1], 'title': 'Renamed', 'year': 1990},
+        {'id': mine[2], 'isbn': '4000000000000'},  # Held by mine[0]
+        {'id': theirs, 'title': 'Stolen'},
+        {'id': 999999, 'title': 'Missing'},
+        {'id': mine[0], 'year': 'soon'},
+    ]})
+    assert response.status_code == 200
+    report = response.get_json()
+    assert (report['succeeded'], report['failed']) == (2, 4)
+    assert [r['status'] for r in report['results']] == [200, 200, 400, 403, 404, 400]
+    assert 'already exists' in report['results'][2]['error']
+
+    with app.app_context():
+        first, second, third, other = (db.session.get(Book, i) for i in shelf)
+        assert first.genre == 'Fantasy'
+        assert (second.title, second.year, second.genre) == ('Renamed', 1990, 'Fiction')
+        assert third.isbn == '4000000000002'
+        assert other.title == 'Not Mine'
+
+def test_batch_update_uses_grouped_statements(authenticated_client, shelf):
+    """Test one ownership query, one executemany per change shape and one commit."""
+    mine = shelf[:3]
+    with captured_statements() as statements:
+        response = authenticated_client.patch('/api/books/batch', json={'books': [
+            {'id': mine[0], 'genre': 'A'}, {'id': mine[1], 'year': 1}, {'id': mine[2], 'genre': 'C'}
+        ]})
+    assert response.get_json()['succeeded'] == 3
+    assert len([s for s in statements if s.startswith('SELECT book.id, book.user_id')]) == 1
+    assert len([s for s in statements if s.startswith('UPDATE book')]) == 2
+
+def test_batch_delete(authenticated_client, shelf):
+    """Test deleting owned books with one statement while others are refused."""
+    mine, theirs = shelf[:3], shelf[3]
+    with captured_statements() as statements:
+        response = authenticated_client.delete('/api/books/batch',
+                                               json={'ids': [mine[0], mine[1], theirs, 'x']})
+    assert response.status_code == 200
+    assert [r['status'] for r in response.get_json()['results']] == [204, 204, 403, 400]
+    assert len([s for s in statements if s.startswith('DELETE FROM book')]) == 1
+
+    with app.app_context():
+        assert [b.id for b in Book.query.order_by(Book.id)] == [mine[2], theirs]
+
+def test_batch_rejects_malformed_body(authenticated_client):
+    """Test that bodies without the expected list are refused."""
+    assert authenticated_client.patch('/api/books/batch', json=[1, 2]).status_code == 400
+    assert authenticated_client.delete('/api/books/batch', json={'ids': []}).status_code == 400
+
+def test_batch_update_rejects_out_of_range_year(authenticated_client, shelf):
+    """Test that a year the column cannot hold fails only its own item."""
+    response = authenticated_client.patch('/api/books/batch', json={'books': [
+        {'id': shelf[0], 'year': 10**20}, {'id': shelf[1], 'year': 1984}]})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [r['status'] for r in results] == [400, 200]
+    assert 'year' in results[0]['error']
+
+def test_batch_write_failure_is_reported_per_item(authenticated_client, shelf):
+    """Test that a failing UPDATE or DELETE becomes per-item 500s and is rolled back."""
+    with app.app_context():
+        db.session.execute(db.text("""CREATE TRIGGER freeze_book BEFORE UPDATE ON book
+            BEGIN SELECT RAISE(ABORT, 'frozen'); END"""))
+        db.session.execute(db.text("""CREATE TRIGGER keep_book BEFORE DELETE ON book
+            BEGIN SELECT RAISE(ABORT, 'kept'); END"""))
+        db.session.commit()
+    response = authenticated_client.patch('/api/books/batch', json={'books': [
+        {'id': shelf[0], 'genre': 'Fantasy'}, {'id': shelf[1], 'genre': 'Fantasy'}]})
+    assert response.status_code == 200
+    assert [(r['status'], r['error']) for r in response.get_json()['results']] == \
+        [(500, 'Could not update book')] * 2
+
+    response = authenticated_client.delete('/api/books/batch', json={'ids': shelf[:2]})
+    assert [r['status'] for r in response.get_json()['results']] == [500, 500]
+    assert authenticated_client.get(f'/api/books/{shelf[0]}').get_json()['genre'] == 'Fiction'
+
+    with app.app_context():  # Let the fixtures clean up
+        db.session.execute(db.text('DROP TRIGGER freeze_book'))
+        db.session.execute(db.text('DROP TRIGGER keep_book'))
+        db.session.commit()
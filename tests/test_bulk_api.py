@@ -0,0 +1,160 @@
+# tests/test_bulk_api.py
+# tested with: "pytest tests/test_bulk_api.py -v"
+
+import csv
+import gzip
+import io
+import json
+import zlib
+from app import app, db
+from app.models.book import Book
+from app.services.export import gzip_stream
+
+def test_bulk_import_csv(authenticated_client, test_user):
+    """Test importing a CSV upload with a per-row error report."""
+    body = (
+        'title,author,isbn,year,genre\n'
+        'First Book,Author One,2000000000001,2001,Fiction\n'
+        'No Year,Author Two,2000000000002,,Fiction\n'
+        '"Comma, Book",Author Three,2000000000003,2003,\n'
+        'Duplicate,Author Four,2000000000001,2004,Fiction\n'
+    )
+    response = authenticated_client.post('/api/books/bulk', data=body, content_type='text/csv')
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['created'] == 2
+    assert report['failed'] == 2
+    assert [e['row'] for e in report['errors']] == [2, 4]
+    assert 'year' in report['errors'][0]['error']
+    assert 'already exists' in report['errors'][1]['error']
+
+    with app.app_context():
+        books = Book.query.filter_by(user_id=test_user.id).order_by(Book.id).all()
+        assert [b.title for b in books] == ['First Book', 'Comma, Book']
+
+def test_bulk_import_ndjson_in_chunks(authenticated_client, test_user):
+    """Test an NDJSON upload spanning several chunks, including existing ISBNs."""
+    with app.app_context():
+        db.session.add(Book(title='Existing', author='Author', isbn='3000000000005',
+                            year=2000, genre='Fiction', user_id=test_user.id))
+        db.session.commit()
+
+    lines = [json.dumps({'title': f'Book {i}', 'author': 'Author', 'isbn': f'30000000000{i:02d}',
+                         'year': 2000 + i, 'genre': 'Fiction'}) for i in range(12)]
+    lines.insert(3, '{not json')
+    app.config['BULK_IMPORT_CHUNK_SIZE'] = 5
+    try:
+        response = authenticated_client.post('/api/books/bulk', data='\n'.join(lines) + '\n',
+                                             content_type='application/x-ndjson')
+    finally:
+        app.config['BULK_IMPORT_CHUNK_SIZE'] = 1000
+
+    report = response.get_json()
+    assert report['created'] == 11
+    assert [e['row'] for e in report['errors']] == [4, 7]
+    with app.app_context():
+        assert Book.query.filter_by(user_id=test_user.id).count() == 12
+
+def test_bulk_import_rejects_unknown_content_type(authenticated_client):
+    """Test that only CSV and NDJSON bodies are accepted."""
+    response = authenticated_client.post('/api/books/bulk', json=[{'title': 'x'}])
+    assert response.status_code == 415
+
+def test_bulk_import_rejects_out_of_range_years(authenticated_client):
+    """Test that overflowing years are row errors that leave the rest of the chunk intact."""
+    lines = ['{"title": "Good", "author": "A", "isbn": "2100000000001", "year": 2001}',
+             '{"title": "Inf", "author": "A", "isbn": "2100000000002", "year": 1e400}',
+             '{"title": "Huge", "author": "A", "isbn": "2100000000003", "year": %d}' % 10**20,
+             '{"title": "Also Good", "author": "A", "isbn": "2100000000004", "year": 2004}']
+    response = authenticated_client.post('/api/books/bulk', data='\n'.join(lines),
+                                         content_type='application/x-ndjson')
+    report = response.get_json()
+    assert (report['created'], report['failed']) == (2, 2)
+    assert [e['row'] for e in report['errors']] == [2, 3]
+    assert all('year' in e['error'] for e in report['errors'])
+
+def test_bulk_import_retries_failed_chunk_row_by_row(authenticated_client, test_user):
+    """Test that one row the database rejects does not discard its whole chunk."""
+    with app.app_context():
+        db.session.execute(db.text("""CREATE TRIGGER reject_book BEFORE INSERT ON book
+            WHEN new.title = 'Rejected' BEGIN SELECT RAISE(ABORT, 'rejected'); END"""))
+        db.session.commit()
+    body = ('title,author,isbn,year,genre\n'
+            'Kept,Author,2200000000001,2001,\n'
+            'Rejected,Author,2200000000002,2002,\n'
+            'Also Kept,Author,2200000000003,2003,\n')
+    report = authenticated_client.post('/api/books/bulk', data=body, content_type='text/csv').get_json()
+    assert (report['created'], report['failed']) == (2, 1)
+    assert report['errors'] == [{'row': 2, 'error': 'Could not save row'}]
+    with app.app_context():
+        assert Book.query.filter_by(user_id=test_user.id).count() == 2
+
+def test_bulk_import_stops_cleanly_on_invalid_utf8(authenticated_client, test_user):
+    """Test that undecodable input ends the import with a report, keeping committed chunks."""
+    body = ('title,author,isbn,year,genre\n'
+            'Saved,Author,2300000000001,2001,\n'
+            'Saved Too,Author,2300000000002,2002,\n').encode() + b'Bad \xff\xfe,Author,2300000000003,2003,\n'
+    app.config['BULK_IMPORT_CHUNK_SIZE'] = 1
+    try:
+        response = authenticated_client.post('/api/books/bulk', data=body, content_type='text/csv')
+    finally:
+        app.config['BULK_IMPORT_CHUNK_SIZE'] = 1000
+    assert response.status_code == 200
+    report = response.get_json()
+    assert (report['created'], report['failed']) == (2, 1)
+    assert 'UTF-8' in report['errors'][0]['error']
+
+def add_books(user_id, count):
+    """Insert numbered books for a user."""
+    with app.app_context():
+        db.session.add_all([
+            Book(title=f'Export {i}', author='Author', isbn=f'40000000000{i:02d}',
+                 year=2000 + i, genre='Fiction', user_id=user_id)
+            for i in range(count)
+        ])
+        db.session.commit()
+
+def test_export_ndjson_streams_all_batches(authenticated_client, test_user):
+    """Test that an NDJSON export covers every book across batch boundaries."""
+    add_books(test_user.id, 7)
+    app.config['EXPORT_BATCH_SIZE'] = 3
+    try:
+        response = authenticated_client.get('/api/books/export')
+        lines = response.get_data(as_text=True).splitlines()
+    finally:
+        app.config['EXPORT_BATCH_SIZE'] = 1000
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    records = [json.loads(line) for line in lines]
+    assert [r['title'] for r in records] == [f'Export {i}' for i in range(7)]
+    assert set(records[0]) == {'id', 'title', 'author', 'year', 'isbn', 'genre', 'created_at', 'user_id'}
+
+def test_export_csv_gzip(authenticated_client, test_user):
+    """Test a gzip-compressed CSV export."""
+    add_books(test_user.id, 2)
+    response = authenticated_client.get('/api/books/export?format=csv',
+                                        headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    rows = list(csv.reader(io.StringIO(gzip.decompress(response.data).decode())))
+    assert rows[0] == ['id', 'title', 'author', 'year', 'isbn', 'genre', 'created_at', 'user_id']
+    assert [row[1] for row in rows[1:]] == ['Export 0', 'Export 1']
+
+def test_export_honours_refused_gzip(authenticated_client, test_user):
+    """Test that gzip;q=0 gets a plain export."""
+    add_books(test_user.id, 1)
+    response = authenticated_client.get('/api/books/export?format=csv',
+                                        headers={'Accept-Encoding': 'gzip;q=0, identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert 'Export 0' in response.get_data(as_text=True)
+
+def test_gzip_stream_flushes_every_batch():
+    """Test that each batch is decodable as soon as it is emitted."""
+    decompressor = zlib.decompressobj(wbits=31)
+    stream = gzip_stream(['first batch\n', 'second batch\n'])
+    assert decompressor.decompress(next(stream)) == b'first batch\n'
+    assert decompressor.decompress(next(stream)) == b'second batch\n'
+
+def test_export_rejects_unknown_format(authenticated_client):
+    """Test that unsupported export formats are rejected."""
+    assert authenticated_client.get('/api/books/export?format=xml').status_code == 400
@@ -1,57 +1,17 @@
 # tests/test_api_crud.py
 # tested with: "pytest tests/test_crud_api.py -v > logs/pytest.log"
 
+import json
 import pytest
+from flask_restx import marshal
 from app import app, db
-from app.models.user import User
+from app.api import book_model
 from app.models.book import Book
-from flask import url_for
-
-@pytest.fixture(scope='function')
-def test_client():
-    """Set up a test client with an in-memory database."""
-    app.config.update({
-        'TESTING': True,
-        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
-        'LOGIN_DISABLED': False,
-        'WTF_CSRF_ENABLED': False,
-    })
+import app.services.serialization as serialization
 
-    with app.app_context():
-        db.create_all()
-        yield app.test_client()
-        db.session.remove()
-        db.drop_all()
-
-@pytest.fixture(scope='function')
-def test_user():
-    """Create a test user."""
-    with app.app_context():
-        # Check if the user already exists and remove if necessary
-        existing_user = User.query.filter_by(email='test@example.com').first()
-        if existing_user:
-            db.session.delete(existing_user)
-            db.session.commit()
-
-        user = User(username='testuser', email='test@example.com')
-        user.set_password('Password123!')
-        db.session.add(user)
-        db.session.commit()
-        yield user
-        # Clean up after test
-        db.session.delete(user)
-        db.session.commit()
+# Every request in this module must stay within the SQL query budget
+pytestmark = pytest.mark.usefixtures('query_budget')
 
-@pytest.fixture(scope='function')
-def authenticated_client(test_client, test_user):
-    """Log in the test user."""
-    with test_client:
-        response = test_client.post('/login', data={
-            'username': test_user.username,
-            'password': 'Password123!'
-        }, follow_redirects=True)
-        assert response.status_code == 200
-        yield test_client
 
 def test_create_book(authenticated_client):
     """Test creating a new book."""
@@ -68,6 +28,16 @@ def test_create_book(authenticated_client):
     assert data['title'] == book_data['title']
     assert data['author'] == book_data['author']
 
+
+@pytest.mark.parametrize('year', [10**20, 'soon'])
+def test_create_book_rejects_invalid_year(authenticated_client, year):
+    """Test that a year the column cannot hold is a validation error."""
+    response = authenticated_client.post('/api/books/', json={
+        'title': 'Far Future', 'author': 'Author', 'isbn': '1234567890999', 'year': year})
+    assert response.status_code == 400
+    assert 'year' in response.get_json()['message']
+
+
 def test_read_books(authenticated_client, test_user):
     """Test reading the list of books."""
     with app.app_context():
@@ -89,6 +59,7 @@ def test_read_books(authenticated_client, test_user):
     assert len(data) == 1
     assert data[0]['title'] == 'Existing Book'
 
+
 def test_update_book(authenticated_client, test_user):
     """Test updating an existing book."""
     with app.app_context():
@@ -121,6 +92,7 @@ def test_update_book(authenticated_client, test_user):
     assert data['year'] == updated_data['year']
     print("\n✓ Successfully updated book")
 
+
 def test_delete_book(authenticated_client, test_user):
     """Test deleting a book."""
     with app.app_context():
@@ -143,4 +115,124 @@ def test_delete_book(authenticated_client, test_user):
     # Verify the book was deleted
     with app.app_context():
         deleted_book = Book.query.get(book_id)
-        assert deleted_book is None
\ No newline at end of file
+        assert deleted_book is None
+
+
+def test_list_books_paginates_with_cursor(authenticated_client, test_user):
+    """Test walking the book list page by page with the opaque cursor."""
+    with app.app_context():
+        for i in range(5):
+            db.session.add(Book(
+                title=f'Book {i}',
+                author='Author',
+                isbn=f'{i:013d}',
+                year=2000 + i,
+                genre='Fiction',
+                user_id=test_user.id
+            ))
+        db.session.commit()
+
+    response = authenticated_client.get('/api/books/?limit=2')
+    assert response.status_code == 200
+    assert [b['title'] for b in response.get_json()] == ['Book 0', 'Book 1']
+    cursor = response.headers['X-Next-Cursor']
+
+    titles = []
+    while cursor:
+        response = authenticated_client.get(f'/api/books/?limit=2&cursor={cursor}')
+        assert response.status_code == 200
+        titles += [b['title'] for b in response.get_json()]
+        cursor = response.headers.get('X-Next-Cursor')
+    assert titles == ['Book 2', 'Book 3', 'Book 4']
+
+
+def test_list_books_rejects_bad_cursor(authenticated_client):
+    """Test that a malformed cursor is reported as a client error."""
+    response = authenticated_client.get('/api/books/?cursor=not-a-cursor')
+    assert response.status_code == 400
+
+
+def test_list_books_revalidates_with_etag(authenticated_client, test_user):
+    """Test 304 for an unchanged list and a new ETag once a book changes."""
+    with app.app_context():
+        db.session.add(Book(title='Polled', author='Author', isbn='6666666666666',
+                            year=2020, genre='Fiction', user_id=test_user.id))
+        db.session.commit()
+
+    response = authenticated_client.get('/api/books/')
+    etag = response.headers['ETag']
+    assert response.headers['Last-Modified']
+
+    response = authenticated_client.get('/api/books/', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+    # A different page is a different representation
+    assert authenticated_client.get('/api/books/?limit=1', headers={'If-None-Match': etag}).status_code == 200
+
+    book_id = authenticated_client.get('/api/books/').get_json()[0]['id']
+    authenticated_client.patch('/api/books/batch', json={'books': [{'id': book_id, 'genre': 'Poetry'}]})
+    response = authenticated_client.get('/api/books/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()[0]['genre'] == 'Poetry'
+    assert response.headers['ETag'] != etag
+
+
+def test_get_book_revalidates_with_etag(authenticated_client, test_user):
+    """Test item ETags and Last-Modified follow updated_at."""
+    with app.app_context():
+        book = Book(title='Item', author='Author', isbn='7777777777777',
+                    year=2020, genre='Fiction', user_id=test_user.id)
+        db.session.add(book)
+        db.session.commit()
+        book_id = book.id
+
+    response = authenticated_client.get(f'/api/books/{book_id}')
+    etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+    assert response.get_json()['title'] == 'Item'
+    assert authenticated_client.get(f'/api/books/{book_id}',
+                                    headers={'If-None-Match': etag}).status_code == 304
+    assert authenticated_client.get(f'/api/books/{book_id}',
+                                    headers={'If-Modified-Since': last_modified}).status_code == 304
+
+    authenticated_client.put(f'/api/books/{book_id}', json={
+        'title': 'Item 2', 'author': 'Author', 'isbn': '7777777777777', 'year': 2020})
+    response = authenticated_client.get(f'/api/books/{book_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_books_page_revalidates_with_etag(authenticated_client, test_user):
+    """Test that the HTML list skips rendering when the catalog is unchanged."""
+    response = authenticated_client.get('/books')
+    etag = response.headers['ETag']
+    assert authenticated_client.get('/books', headers={'If-None-Match': etag}).status_code == 304
+
+    authenticated_client.post('/api/books/', json={
+        'title': 'New', 'author': 'Author', 'isbn': '8888888888888', 'year': 2021})
+    response = authenticated_client.get('/books', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'New' in response.get_data(as_text=True)
+
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_list_fast_path_matches_book_model(authenticated_client, test_user, monkeypatch, use_orjson):
+    """Test that the tuple encoder produces exactly what marshalling would."""
+    if not use_orjson:
+        monkeypatch.setattr(serialization, 'orjson', None)
+    assert serialization.BOOK_FIELD_NAMES == tuple(book_model.keys())
+    with app.app_context():
+        db.session.add_all([
+            Book(title='Plain', author='Author', isbn='1000000000011', year=2001,
+                 genre='Fiction', user_id=test_user.id),
+            Book(title='Quote " and \\ ünïcode ✓', author='Ä', isbn=None, year=None,
+                 genre=None, user_id=test_user.id),
+        ])
+        db.session.commit()
+        expected = marshal(Book.query.order_by(Book.created_at, Book.id).all(), book_model)
+
+    response = authenticated_client.get('/api/books/')
+    assert response.mimetype == 'application/json'
+    assert json.loads(response.data) == json.loads(json.dumps(expected))
+    assert [list(book) for book in json.loads(response.data)] == [list(book_model.keys())] * 2
@@ -0,0 +1,76 @@
+# tests/test_engine.py
+# tested with: "pytest tests/test_engine.py -v"
+
+import threading
+import time
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool, StaticPool
+from app import app, db
+from app.engine import install_sqlite_pragmas, sqlite_engine_options, sqlite_pragmas
+
+def profile_config(uri, **overrides):
+    return {**app.config, 'SQLALCHEMY_DATABASE_URI': uri, 'SQLITE_PRAGMAS': {}, **overrides}
+
+@pytest.fixture
+def file_engine(tmp_path):
+    config = profile_config(f"sqlite:///{tmp_path / 'books.db'}", SQLITE_PROFILE='concurrent')
+    engine = create_engine(config['SQLALCHEMY_DATABASE_URI'], **sqlite_engine_options(config))
+    install_sqlite_pragmas(engine, sqlite_pragmas(config))
+    with engine.begin() as conn:
+        conn.exec_driver_sql('CREATE TABLE t (x INTEGER)')
+    yield engine
+    engine.dispose()
+
+def test_every_connection_gets_the_profile(file_engine):
+    """Test pool sizing and that pragmas are set on each new connection."""
+    assert isinstance(file_engine.pool, QueuePool)
+    assert file_engine.pool.size() == app.config['SQLITE_POOL_SIZE']
+    with file_engine.connect() as first, file_engine.connect() as second:
+        for conn in (first, second):
+            pragma = lambda name: conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+            assert pragma('journal_mode') == 'wal'
+            assert pragma('synchronous') == 1  # NORMAL
+            assert pragma('busy_timeout') == 5000
+            assert pragma('temp_store') == 2  # MEMORY
+            assert pragma('cache_size') == -16000
+
+def test_memory_database_keeps_static_pool():
+    """Test that in-memory URLs get no pool options (StaticPool rejects them)."""
+    assert sqlite_engine_options(profile_config('sqlite:///:memory:')) == {}
+    assert sqlite_engine_options(profile_config('sqlite://')) == {}
+    with app.app_context():
+        assert isinstance(db.engine.pool, StaticPool)
+
+def test_profile_selection_and_overrides():
+    """Test pragma overrides and rejection of unknown profiles."""
+    assert sqlite_pragmas(profile_config('sqlite://', SQLITE_PROFILE='legacy')) == {}
+    pragmas = sqlite_pragmas(profile_config('sqlite://', SQLITE_PRAGMAS={'cache_size': -64000}))
+    assert pragmas['cache_size'] == -64000 and pragmas['journal_mode'] == 'WAL'
+    with pytest.raises(ValueError):
+        sqlite_pragmas(profile_config('sqlite://', SQLITE_PROFILE='fast'))
+
+def test_readers_proceed_and_writers_wait_during_a_write(file_engine):
+    """Test WAL reads during an open write and busy waiting instead of 'locked'."""
+    holding, release = threading.Event(), threading.Event()
+
+    def long_write():
+        with file_engine.begin() as conn:
+            conn.exec_driver_sql('INSERT INTO t VALUES (1)')
+            holding.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=long_write)
+    thread.start()
+    holding.wait(5)
+    with file_engine.connect() as conn:
+        assert conn.exec_driver_sql('SELECT COUNT(*) FROM t').scalar() == 0  # Not blocked
+
+    threading.Timer(0.2, release.set).start()
+    started = time.monotonic()
+    with file_engine.begin() as conn:
+        conn.exec_driver_sql('INSERT INTO t VALUES (2)')  # Waits for the lock
+    assert time.monotonic() - started >= 0.15
+    thread.join()
+    with file_engine.connect() as conn:
+        assert conn.exec_driver_sql('SELECT COUNT(*) FROM t').scalar() == 2
@@ -0,0 +1,99 @@
+# tests/test_fragments.py
+# tested with: "pytest tests/test_fragments.py -v"
+
+import pytest
+from flask import template_rendered
+from app import app
+from app.services.fragments import get_fragment_cache
+
+@pytest.fixture
+def rendered():
+    """Names of the templates rendered from the moment it is cleared."""
+    names = []
+    def record(sender, template, context, **extra):
+        names.append(template.name)
+    template_rendered.connect(record, app)
+    yield names
+    template_rendered.disconnect(record, app)
+
+def add_books(client, count, start=0):
+    ids = []
+    for n in range(start, start + count):
+        response = client.post('/api/books/', json={
+            'title': f'Shelf Book {n}', 'author': 'Author', 'isbn': f'{5550000000000 + n}', 'year': 2020})
+        assert response.status_code == 201
+        ids.append(response.get_json()['id'])
+    return ids
+
+def test_unchanged_page_is_rendered_once(authenticated_client, rendered):
+    """Test that repeat views replay the stored page with the same validators."""
+    add_books(authenticated_client, 3)
+    rendered.clear()
+    first = authenticated_client.get('/books')
+    assert rendered.count('books/list.html') == 1 and rendered.count('books/_book.html') == 3
+
+    rendered.clear()
+    second = authenticated_client.get('/books')
+    assert rendered == []
+    assert second.get_data() == first.get_data()
+    assert second.headers['ETag'] == first.headers['ETag']
+
+def test_changes_rerender_only_changed_books(authenticated_client, rendered):
+    """Test that API and form edits start a new version reusing unchanged book fragments."""
+    ids = add_books(authenticated_client, 3)
+    authenticated_client.get('/books')
+
+    authenticated_client.put(f'/api/books/{ids[0]}', json={
+        'title': 'Renamed', 'author': 'Author', 'isbn': '5550000000000', 'year': 2020})
+    rendered.clear()
+    page = authenticated_client.get('/books').get_data(as_text=True)
+    assert 'Renamed' in page and 'Shelf Book 0' not in page
+    assert rendered.count('books/list.html') == 1 and rendered.count('books/_book.html') == 1
+
+    authenticated_client.post('/books/add', data={
+        'title': 'From Form', 'author': 'Author', 'year': '2021', 'isbn': '5550000000099', 'genre': 'Fiction'})
+    rendered.clear()
+    assert 'From Form' in authenticated_client.get('/books').get_data(as_text=True)
+    assert rendered.count('books/_book.html') == 1
+
+    authenticated_client.get(f'/books/delete/{ids[1]}')
+    rendered.clear()
+    assert 'Shelf Book 1' not in authenticated_client.get('/books').get_data(as_text=True)
+    assert rendered == ['books/list.html']  # Every remaining book came from the cache
+
+def test_pages_with_flash_messages_are_not_cached(authenticated_client, rendered):
+    """Test that a one-off flash message is never replayed."""
+    add_books(authenticated_client, 1)
+    authenticated_client.post('/books/add', data={
+        'title': 'Duplicate', 'author': 'Author', 'year': '2021', 'isbn': '5550000000000', 'genre': 'Fiction'})
+    flashed = authenticated_client.get('/books')
+    assert 'already exists' in flashed.get_data(as_text=True) and 'ETag' not in flashed.headers
+
+    clean = authenticated_client.get('/books').get_data(as_text=True)
+    assert 'already exists' not in clean
+    rendered.clear()
+    assert authenticated_client.get('/books').get_data(as_text=True) == clean
+    assert rendered == []
+
+@pytest.fixture
+def sqlite_fragments(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'FRAGMENT_CACHE_BACKEND', 'sqlite')
+    monkeypatch.setitem(app.config, 'FRAGMENT_CACHE_PATH', str(tmp_path / 'fragments.db'))
+    app.extensions.pop('fragment_cache', None)
+    yield
+    app.extensions.pop('fragment_cache', None)
+
+def test_shared_backend_and_lru_bound(sqlite_fragments, authenticated_client, rendered, monkeypatch):
+    """Test that another worker reuses stored pages and that the entry count stays bounded."""
+    add_books(authenticated_client, 3)
+    authenticated_client.get('/books')
+    app.extensions.pop('fragment_cache')  # As seen from another worker process
+    rendered.clear()
+    authenticated_client.get('/books')
+    assert rendered == []
+
+    monkeypatch.setitem(app.config, 'FRAGMENT_CACHE_MAX_ENTRIES', 2)
+    app.extensions.pop('fragment_cache')
+    add_books(authenticated_client, 1, start=3)
+    authenticated_client.get('/books')
+    assert len(get_fragment_cache()) == 2
@@ -0,0 +1,167 @@
+# tests/test_mail.py
+# tested with: "pytest tests/test_mail.py -v"
+
+import socketserver
+import threading
+from email import message_from_bytes
+import pytest
+from app import app
+import app.tasks as tasks
+from app.services.mail import deliver_outbox, get_outbox
+
+class DebuggingSMTPServer(socketserver.ThreadingTCPServer):
+    """Minimal local SMTP server that records what it receives.
+    `replies` maps a recipient address to the reply sent for RCPT TO."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.messages = []
+        self.connections = 0
+        self.replies = {}
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost debugging server')
+        recipient = None
+        while line := self.rfile.readline().decode().rstrip('\r\n'):
+            command = line[:4].upper()
+            if command == 'EHLO':
+                self.reply('250 localhost')
+            elif command == 'RCPT':
+                recipient = line.partition(':')[2].strip('<> ')
+                self.reply(self.server.replies.get(recipient, '250 OK'))
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = b''.join(iter(self.rfile.readline, b'.\r\n'))
+                self.server.messages.append((recipient, message_from_bytes(data)))
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:  # MAIL, RSET, NOOP
+                self.reply('250 OK')
+
+@pytest.fixture
+def smtp_server():
+    server = DebuggingSMTPServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    port = app.config['MAIL_PORT']
+    app.config['MAIL_PORT'] = server.server_address[1]
+    yield server
+    app.config['MAIL_PORT'] = port
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(autouse=True)
+def outbox():
+    """Start every test with an empty outbox and fresh domain budgets."""
+    app.extensions.pop('mail_limiter', None)
+    outbox = get_outbox()
+    outbox.clear()
+    yield outbox
+    app.extensions.pop('mail_limiter', None)
+    app.config['MAIL_DOMAIN_RATE_LIMITS'] = {}
+
+def test_burst_is_sent_over_one_connection(smtp_server, outbox, monkeypatch):
+    """Test that thousands of queued messages go out in batches on one connection."""
+    for i in range(1500):
+        outbox.enqueue(f'user{i}@domain{i % 5}.example', 'Welcome', f'Hello {i}')
+    batches = []
+    claim = outbox.claim
+    monkeypatch.setattr(outbox, 'claim', lambda *args: batches.append(claim(*args)) or batches[-1])
+    report = deliver_outbox()
+
+    assert report['sent'] == 1500
+    assert smtp_server.connections == 1
+    assert len(smtp_server.messages) == 1500
+    assert [len(batch) for batch in batches] == [app.config['MAIL_BATCH_SIZE']] * 15 + [0]
+    expected = {f'user{i}@domain{i % 5}.example' for i in range(1500)}
+    assert {recipient for recipient, _ in smtp_server.messages} == expected
+    metrics = outbox.metrics()
+    assert metrics['queued'] == 0 and metrics['sent_total'] == 1500
+
+def test_one_flush_is_scheduled_per_burst(monkeypatch, outbox):
+    """Test that a signup spike queues messages, not one task per message."""
+    scheduled = []
+    monkeypatch.setattr(tasks.flush_outbox, 'apply_async', lambda **kwargs: scheduled.append(kwargs))
+    for i in range(50):
+        tasks.queue_registration_email(f'user{i}@example.com', f'user{i}')
+    assert scheduled == [{'countdown': app.config['MAIL_FLUSH_DELAY']}]
+    assert outbox.metrics()['queued'] == 50
+
+    outbox.flush_started()  # The flush picks up everything so far; later messages need a new one
+    tasks.queue_registration_email('late@example.com', 'late')
+    assert len(scheduled) == 2
+
+def test_transient_and_permanent_failures(smtp_server, outbox):
+    """Test that 4xx replies back off and retry while 5xx replies give up."""
+    smtp_server.replies = {'busy@example.com': '451 Try again later',
+                           'nobody@example.com': '550 No such user'}
+    for recipient in ('busy@example.com', 'nobody@example.com', 'ok@example.com'):
+        outbox.enqueue(recipient, 'Subject', 'Body')
+    report = deliver_outbox()
+    assert report == {'sent': 1, 'retried': 1, 'dead': 1, 'deferred': 0}
+
+    conn = outbox._connection()
+    rows = dict((r[0], r[1:]) for r in conn.execute(
+        'SELECT recipient, status, attempts, next_attempt_at - created_at FROM outbox'))
+    assert rows['busy@example.com'][:2] == ('queued', 1)
+    assert rows['busy@example.com'][2] >= app.config['MAIL_RETRY_BASE']
+    assert rows['nobody@example.com'][:2] == ('dead', 1)
+
+    # Once due again, the retry goes through on a new flush
+    conn.execute('UPDATE outbox SET next_attempt_at = 0')
+    smtp_server.replies = {}
+    assert deliver_outbox()['sent'] == 1
+    metrics = outbox.metrics()
+    assert (metrics['sent_total'], metrics['retried_total'], metrics['dead']) == (2, 1, 1)
+
+def test_unreachable_server_defers_the_batch(outbox):
+    """Test that a refused connection costs one attempt, not one per message."""
+    app.config['MAIL_PORT'], port = 1, app.config['MAIL_PORT']  # Nothing listens there
+    try:
+        for i in range(5):
+            outbox.enqueue(f'user{i}@example.com', 'Subject', 'Body')
+        report = deliver_outbox()
+    finally:
+        app.config['MAIL_PORT'] = port
+    assert report == {'sent': 0, 'retried': 1, 'dead': 0, 'deferred': 0}
+    attempts = [r[0] for r in outbox._connection().execute('SELECT attempts FROM outbox ORDER BY id')]
+    assert attempts == [1, 0, 0, 0, 0]
+    assert outbox.metrics()['waiting'] == 5
+
+def test_per_domain_rate_limit(smtp_server, outbox):
+    """Test that a slow domain is deferred without holding back the others."""
+    app.config['MAIL_DOMAIN_RATE_LIMITS'] = {'slow.example': '3 per minute'}
+    for i in range(6):
+        outbox.enqueue(f'user{i}@slow.example', 'Subject', 'Body')
+        outbox.enqueue(f'user{i}@fast.example', 'Subject', 'Body')
+    report = deliver_outbox()
+    assert report['sent'] == 9 and report['deferred'] == 3
+    assert sorted(r for r, _ in smtp_server.messages if r.endswith('slow.example')) == [
+        'user0@slow.example', 'user1@slow.example', 'user2@slow.example']
+    metrics = outbox.metrics()
+    assert metrics['waiting'] == 3 and metrics['deferred_total'] == 3
+
+def test_registration_and_contact_mail(smtp_server, test_client):
+    """Test that the signup and contact forms deliver through the outbox."""
+    test_client.post('/register', data={
+        'username': 'reader', 'email': 'reader@example.com',
+        'password': 'Password123!', 'confirm_password': 'Password123!'})
+    test_client.post('/contact', data={
+        'name': 'Ada', 'email': 'ada@example.com', 'message': 'Hello there'})
+
+    (welcome_to, welcome), (contact_to, contact) = smtp_server.messages
+    assert welcome_to == 'reader@example.com'
+    assert welcome['Subject'] == 'Welcome to Book Management System'
+    assert 'Dear reader' in welcome.get_payload()
+    assert contact_to == app.config['MAIL_CONTACT_RECIPIENT']
+    assert contact['Reply-To'] == 'ada@example.com'
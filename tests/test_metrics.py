@@ -0,0 +1,85 @@
+# tests/test_metrics.py
+# tested with: "pytest tests/test_metrics.py -v"
+
+import multiprocessing
+import re
+import pytest
+from app import app
+from app.metrics import registry, http_requests
+from app.tasks import flush_outbox
+
+def scrape(client, **kwargs):
+    response = client.get('/metrics', **kwargs)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    return response.get_data(as_text=True)
+
+def sample(text, name, **labels):
+    """Value of one sample in the exposition text, or None."""
+    label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+    pattern = re.escape(f'{name}{{{label_text}}}' if labels else name) + r' (\S+)$'
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    registry.clear()
+    yield
+    app.config['METRICS_TOKEN'] = None
+
+def test_request_latency_and_query_counts(authenticated_client):
+    """Test per-route counters, latency histograms and per-request SQL counts."""
+    for _ in range(3):
+        authenticated_client.get('/api/books/')
+    authenticated_client.get('/no-such-page')
+    text = scrape(authenticated_client)
+
+    route = {'method': 'GET', 'route': '/api/books/'}
+    assert sample(text, 'http_requests_total', **route, status='200') == 3
+    assert sample(text, 'http_requests_total', method='GET', route='unmatched', status='404') == 1
+    assert sample(text, 'http_request_duration_seconds_count', **route) == 3
+    assert sample(text, 'http_request_duration_seconds_bucket', **route, le='+Inf') == 3
+    assert sample(text, 'http_request_duration_seconds_sum', **route) > 0
+    queries = sample(text, 'http_request_db_queries_sum', **route)
+    assert queries >= 3  # At least the page query per request
+    assert sample(text, 'db_query_duration_seconds_count', operation='SELECT') >= queries
+    assert '# TYPE http_request_duration_seconds histogram' in text
+
+def test_histogram_buckets_are_cumulative(test_client):
+    """Test bucket ordering and that le="+Inf" equals the count."""
+    for _ in range(5):
+        test_client.get('/about')
+    text = scrape(test_client)
+    buckets = re.findall(r'http_request_duration_seconds_bucket\{method="GET",route="/about",le="([^"]+)"\} (\S+)', text)
+    bounds = [float(le) for le, _ in buckets]
+    counts = [float(count) for _, count in buckets]
+    assert bounds == sorted(bounds) and bounds[-1] == float('inf')
+    assert counts == sorted(counts) and counts[-1] == 5
+
+def test_task_runs_and_outbox_gauges(test_client):
+    """Test Celery signal metrics and scrape-time outbox gauges."""
+    flush_outbox.delay()
+    text = scrape(test_client)
+    assert sample(text, 'celery_tasks_total', task='app.tasks.flush_outbox', state='SUCCESS') == 1
+    assert sample(text, 'celery_task_duration_seconds_count', task='app.tasks.flush_outbox') == 1
+    assert sample(text, 'mail_outbox_messages', state='queued') == 0
+
+def record_in_child():
+    http_requests.inc('GET', '/child', '200', amount=2)
+    registry.flush()
+
+def test_totals_are_summed_across_processes(test_client):
+    """Test that a forked worker adds only its own observations."""
+    http_requests.inc('GET', '/child', '200', amount=3)  # Not yet flushed when the child forks
+    child = multiprocessing.get_context('fork').Process(target=record_in_child)
+    child.start()
+    child.join()
+    assert child.exitcode == 0
+    text = scrape(test_client)
+    assert sample(text, 'http_requests_total', method='GET', route='/child', status='200') == 5
+
+def test_scrape_token(test_client):
+    """Test that a configured token is required to scrape."""
+    app.config['METRICS_TOKEN'] = 'secret'
+    assert test_client.get('/metrics').status_code == 401
+    scrape(test_client, headers={'Authorization': 'Bearer secret'})
@@ -0,0 +1,73 @@
+# tests/test_migrations.py
+# tested with: "pytest tests/test_migrations.py -v"
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from app import app, db
+from app.migrations import MIGRATIONS, current_version, upgrade, unindexed_hot_queries
+
+# Schema of a database created before migrations existed
+LEGACY_SCHEMA = [
+    """CREATE TABLE user (
+        id INTEGER NOT NULL, username VARCHAR(64) NOT NULL, email VARCHAR(120) NOT NULL,
+        password_hash VARCHAR(128), PRIMARY KEY (id), UNIQUE (username), UNIQUE (email))""",
+    """CREATE TABLE book (
+        id INTEGER NOT NULL, title VARCHAR(100) NOT NULL, author VARCHAR(100) NOT NULL,
+        year INTEGER, isbn VARCHAR(13), genre VARCHAR(50), created_at DATETIME,
+        user_id INTEGER, PRIMARY KEY (id), UNIQUE (isbn),
+        FOREIGN KEY(user_id) REFERENCES user (id))""",
+    """INSERT INTO user (id, username, email) VALUES (1, 'legacy', 'legacy@example.com')""",
+    """INSERT INTO book (title, author, isbn, year, genre, created_at, user_id)
+       VALUES ('Old Book', 'Old Author', '1111111111111', 1999, 'Fiction',
+               '2024-11-18 03:01:37.908584', 1)""",
+]
+
+@pytest.fixture(scope='function')
+def legacy_engine(tmp_path):
+    """Create a file database with the pre-migration schema."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.exec_driver_sql(statement)
+    yield engine
+    engine.dispose()
+
+def test_upgrade_legacy_database_in_place(legacy_engine):
+    """Test that migrations add the indexes without recreating the table."""
+    with legacy_engine.begin() as conn:
+        assert current_version(conn) == 0
+        assert unindexed_hot_queries(conn)
+        upgrade(conn)
+
+    with legacy_engine.connect() as conn:
+        assert current_version(conn) == MIGRATIONS[-1][0]
+        assert unindexed_hot_queries(conn) == []
+        assert conn.exec_driver_sql('SELECT title FROM book').scalar() == 'Old Book'
+        assert conn.exec_driver_sql('SELECT updated_at FROM book').scalar() == '2024-11-18 03:01:37.908584'
+        assert conn.exec_driver_sql('SELECT version FROM catalog_version WHERE user_id = 1').scalar() == 1
+
+def test_upgrade_is_idempotent(legacy_engine):
+    """Test that a second upgrade has nothing left to apply."""
+    with legacy_engine.begin() as conn:
+        upgrade(conn)
+    with legacy_engine.begin() as conn:
+        assert upgrade(conn) == []
+
+def test_upgrade_backfills_and_requires_created_at(legacy_engine):
+    """Test that rows without created_at are backfilled and new ones are refused."""
+    with legacy_engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO book (title, author, user_id) VALUES ('Undated', 'Author', 1)")
+        upgrade(conn)
+    with legacy_engine.connect() as conn:
+        assert conn.exec_driver_sql('SELECT COUNT(*) FROM book WHERE created_at IS NULL').scalar() == 0
+        with pytest.raises(IntegrityError):
+            conn.exec_driver_sql("INSERT INTO book (title, author, user_id) VALUES ('Undated', 'Author', 1)")
+        with pytest.raises(IntegrityError):
+            conn.exec_driver_sql('UPDATE book SET created_at = NULL')
+
+def test_create_all_schema_uses_indexes(test_client):
+    """Test that a freshly created schema serves every hot query from an index."""
+    with db.engine.connect() as conn:
+        assert current_version(conn) == MIGRATIONS[-1][0]
+        assert unindexed_hot_queries(conn) == []
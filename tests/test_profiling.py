@@ -0,0 +1,55 @@
+# tests/test_profiling.py
+# tested with: "pytest tests/test_profiling.py -v"
+
+import logging
+import pytest
+from app import app, db
+from app.models.book import Book
+from app.models.user import User
+from app.profiling import QueryBudgetExceeded, profile_queries
+
+@pytest.fixture
+def readers(test_client):
+    """Six users with two books each."""
+    users = [User(username=f'reader{i}', email=f'reader{i}@example.com') for i in range(6)]
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all(Book(title=f'Book {u.id}-{n}', author='Author', user_id=u.id)
+                       for u in users for n in range(2))
+    db.session.commit()
+    return users
+
+def test_dynamic_relationship_loop_is_flagged(readers):
+    """Test that a per-user query in a loop is reported as N+1 with its call site."""
+    names = [user.username for user in readers]  # Reload the users expired by the commit
+    with profile_queries('shelf sizes') as log:
+        sizes = [user.books.count() for user in readers]
+    assert sizes == [2] * len(names)
+    (statement, count, sites), = log.repeated(app.config['SQL_N_PLUS_ONE_THRESHOLD'])
+    assert 'FROM book' in statement and count == 6
+    assert len(sites) == 1 and sites[0].startswith('tests/test_profiling.py:') and sites[0].endswith('<listcomp>')
+
+    with profile_queries('one query') as log:
+        db.session.query(Book.user_id, db.func.count()).group_by(Book.user_id).all()
+    assert log.count == 1 and log.repeated(app.config['SQL_N_PLUS_ONE_THRESHOLD']) == []
+
+def test_slow_queries_are_logged_with_plan(authenticated_client, caplog, monkeypatch):
+    """Test the slow query log, its query plan and the per-request headers."""
+    monkeypatch.setitem(app.config, 'SQL_PROFILING', True)
+    monkeypatch.setitem(app.config, 'SQL_SLOW_QUERY_MS', 0)
+    with caplog.at_level(logging.WARNING, logger=app.logger.name):
+        response = authenticated_client.get('/api/books/')
+    assert int(response.headers['X-SQL-Queries']) >= 2
+    assert response.headers['X-SQL-Time'].endswith('ms')
+    page_query = [r.message for r in caplog.records if 'app/services/pagination.py' in r.message]
+    assert page_query and 'plan: SEARCH book USING INDEX ix_book_user_created' in page_query[0]
+
+def test_profiling_is_off_by_default(authenticated_client):
+    """Test that nothing is recorded unless profiling is enabled."""
+    assert 'X-SQL-Queries' not in authenticated_client.get('/api/books/').headers
+
+@pytest.mark.query_budget(1)
+def test_query_budget_fails_the_request(authenticated_client, query_budget):
+    """Test that a request over its budget raises inside the test."""
+    with pytest.raises(QueryBudgetExceeded, match='over the budget of 1 statements'):
+        authenticated_client.get('/api/books/')
@@ -0,0 +1,95 @@
+# tests/test_ratelimit.py
+# tested with: "pytest tests/test_ratelimit.py -v"
+
+import threading
+import pytest
+from flask_login import login_user
+from limits import parse
+from limits.storage import storage_from_string
+from app import app
+import app.ratelimit as ratelimit
+from app.ratelimit import SlidingWindowCounterRateLimiter, SQLiteStorage, rate_limit_key
+
+class FakeClock:
+    """Replaces the time module inside app.ratelimit."""
+
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock(60 * 1000.0)
+    monkeypatch.setattr(ratelimit, 'time', fake)
+    return fake
+
+@pytest.fixture
+def storage_uri(tmp_path):
+    return f"sqlite:///{tmp_path / 'ratelimit.db'}"
+
+def test_sqlite_scheme_is_registered(storage_uri):
+    """Test that Flask-Limiter can build the storage from its URI."""
+    assert isinstance(storage_from_string(storage_uri), SQLiteStorage)
+
+def test_counters_are_shared_between_workers(storage_uri):
+    """Test that two storage instances (two processes) see one counter."""
+    first, second = SQLiteStorage(storage_uri), SQLiteStorage(storage_uri)
+    assert first.incr('key', 60) == 1
+    assert second.incr('key', 60) == 2
+    assert first.get('key') == 2
+
+def test_counter_restarts_after_expiry(storage_uri, clock):
+    """Test that an expired counter starts again from the increment."""
+    storage = SQLiteStorage(storage_uri)
+    storage.incr('key', 60, amount=5)
+    clock.now += 61
+    assert storage.get('key') == 0
+    assert storage.incr('key', 60) == 1
+
+def test_sliding_window_weights_previous_window(storage_uri, clock):
+    """Test that hits late in one window still count early in the next."""
+    limiter = SlidingWindowCounterRateLimiter(SQLiteStorage(storage_uri))
+    limit = parse('10/minute')
+
+    clock.now = 60 * 1000 + 59  # End of a window
+    assert all(limiter.hit(limit, 'user:1') for _ in range(10))
+    assert not limiter.hit(limit, 'user:1')
+
+    clock.now = 60 * 1001 + 30  # Halfway through the next window: 5 still count
+    assert [limiter.hit(limit, 'user:1') for _ in range(6)] == [True] * 5 + [False]
+    assert limiter.get_window_stats(limit, 'user:1').remaining == 0
+
+    clock.now = 60 * 1003  # Both windows have passed
+    assert limiter.test(limit, 'user:1')
+
+def test_sliding_window_hit_is_one_statement(storage_uri, clock):
+    """Test that a hit checks and counts in a single SQLite statement."""
+    storage = SQLiteStorage(storage_uri)
+    limiter = SlidingWindowCounterRateLimiter(storage)
+    statements = []
+    storage._connection().set_trace_callback(statements.append)
+    assert limiter.hit(parse('10/minute'), 'user:1')
+    assert len(statements) == 1
+
+def test_sliding_window_is_atomic_across_workers(storage_uri):
+    """Test that concurrent workers together never pass more hits than the limit."""
+    limit = parse('50/day')
+    accepted = []
+    def worker():
+        limiter = SlidingWindowCounterRateLimiter(SQLiteStorage(storage_uri))
+        accepted.extend(limiter.hit(limit, 'user:1') for _ in range(20))
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert accepted.count(True) == 50
+
+def test_limits_are_per_user(test_client, test_user):
+    """Test that signed-in users are keyed by account, others by IP."""
+    with app.test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        assert rate_limit_key() == 'ip:10.0.0.1'
+        login_user(test_user)
+        assert rate_limit_key() == f'user:{test_user.id}'
@@ -0,0 +1,68 @@
+# tests/test_search.py
+# tested with: "pytest tests/test_search.py -v"
+
+import pytest
+from app import app, db
+from app.models.user import User
+from app.models.book import Book
+
+@pytest.fixture(scope='function')
+def library(authenticated_client, test_user):
+    """Give the test user a small catalog and another user a lookalike book."""
+    with app.app_context():
+        other = User(username='otheruser', email='other@example.com')
+        other.set_password('Password123!')
+        db.session.add(other)
+        db.session.commit()
+        db.session.add_all([
+            Book(title='The Way of Kings', author='Brandon Sanderson', isbn='1000000000001',
+                 year=2010, genre='Fantasy', user_id=test_user.id),
+            Book(title='Mistborn', author='Brandon Sanderson', isbn='1000000000002',
+                 year=2006, genre='Fantasy', user_id=test_user.id),
+            Book(title='Dune', author='Frank Herbert', isbn='1000000000003',
+                 year=1965, genre='Science Fiction', user_id=test_user.id),
+            Book(title='Kingdom of Ash', author='Sarah J. Maas', isbn='1000000000004',
+                 year=2018, genre='Fantasy', user_id=other.id),
+        ])
+        db.session.commit()
+    yield authenticated_client
+
+def search_titles(client, query):
+    response = client.get('/api/books/search', query_string={'q': query})
+    assert response.status_code == 200
+    return [book['title'] for book in response.get_json()]
+
+def test_search_matches_prefixes_within_user(library):
+    """Test prefix matching that never leaks another user's books."""
+    assert search_titles(library, 'king') == ['The Way of Kings']
+    assert sorted(search_titles(library, 'sander')) == ['Mistborn', 'The Way of Kings']
+
+def test_search_ranks_title_matches_first(library):
+    """Test that a title hit outranks a genre hit."""
+    with app.app_context():
+        db.session.add(Book(title='Fiction Writing Guide', author='Some Author', isbn='1000000000005',
+                            year=2000, genre='Reference', user_id=Book.query.first().user_id))
+        db.session.commit()
+    assert search_titles(library, 'fiction') == ['Fiction Writing Guide', 'Dune']
+
+def test_search_index_follows_updates_and_deletes(library):
+    """Test that the FTS index stays in sync with edits and deletions."""
+    with app.app_context():
+        dune = Book.query.filter_by(title='Dune').first()
+        dune.title = 'Children of Dune'
+        db.session.commit()
+        db.session.delete(Book.query.filter_by(title='Mistborn').first())
+        db.session.commit()
+
+    assert search_titles(library, 'children') == ['Children of Dune']
+    assert search_titles(library, 'mistborn') == []
+
+def test_search_ignores_fts_syntax_in_query(library):
+    """Test that FTS5 operators in user input are treated as plain words."""
+    assert search_titles(library, 'dune OR "') == []
+    assert search_titles(library, 'dune*') == ['Dune']
+
+def test_search_requires_a_word(library):
+    """Test that an empty query is rejected."""
+    response = library.get('/api/books/search', query_string={'q': '  '})
+    assert response.status_code == 400
@@ -0,0 +1,76 @@
+# tests/test_stats_api.py
+# tested with: "pytest tests/test_stats_api.py -v"
+
+from tests.test_auth import captured_statements
+from app import app, db
+from app.models.book import Book
+from app.services.stats import rebuild_book_stats
+
+def stored_counters():
+    with db.engine.connect() as conn:
+        return conn.exec_driver_sql(
+            'SELECT user_id, dimension, value, count FROM book_stats WHERE count > 0 '
+            'ORDER BY user_id, dimension, value').fetchall()
+
+def test_stats_follow_every_write_path(authenticated_client, test_user):
+    """Test counters after API creates, bulk imports, batch edits and deletes."""
+    authenticated_client.post('/api/books/', json={
+        'title': 'Dune', 'author': 'Frank Herbert', 'isbn': '5000000000001',
+        'year': 1965, 'genre': 'Science Fiction'})
+    authenticated_client.post('/api/books/bulk', content_type='application/x-ndjson', data=(
+        '{"title": "Mistborn", "author": "Brandon Sanderson", "isbn": "5000000000002", "year": 2006, "genre": "Fantasy"}\n'
+        '{"title": "Elantris", "author": "Brandon Sanderson", "isbn": "5000000000003", "year": 2005, "genre": "Fantasy"}\n'
+        '{"title": "Untitled", "author": "Anonymous", "isbn": "5000000000004", "year": 1969}\n'))
+    with app.app_context():
+        ids = {b.title: b.id for b in Book.query.all()}
+    authenticated_client.patch('/api/books/batch', json={'books': [
+        {'id': ids['Dune'], 'genre': 'Fantasy'}]})
+    authenticated_client.delete(f"/api/books/{ids['Untitled']}")
+
+    response = authenticated_client.get('/api/books/stats?recent=2')
+    assert response.status_code == 200
+    stats = response.get_json()
+    assert stats['total'] == 3
+    assert stats['by_genre'] == [{'value': 'Fantasy', 'count': 3}]
+    assert stats['by_author'] == [{'value': 'Brandon Sanderson', 'count': 2},
+                                  {'value': 'Frank Herbert', 'count': 1}]
+    assert stats['by_decade'] == [{'value': '2000s', 'count': 2}, {'value': '1960s', 'count': 1}]
+    assert [b['title'] for b in stats['recent']] == ['Elantris', 'Mistborn']
+
+def test_books_without_genre_or_year(authenticated_client, test_user):
+    """Test that missing genre and year are grouped under null."""
+    with app.app_context():
+        db.session.add(Book(title='Bare', author='Someone', user_id=test_user.id))
+        db.session.commit()
+    stats = authenticated_client.get('/api/books/stats').get_json()
+    assert stats['by_genre'] == [{'value': None, 'count': 1}]
+    assert stats['by_decade'] == [{'value': None, 'count': 1}]
+
+def test_rebuild_matches_incremental_counters(authenticated_client, test_user):
+    """Test that a rebuild repairs drift and agrees with the triggers."""
+    with app.app_context():
+        db.session.add_all([
+            Book(title=f'Book {i}', author=f'Author {i % 3}', isbn=f'60000000000{i:02d}',
+                 year=1990 + i, genre=['A', 'B', None][i % 3], user_id=test_user.id)
+            for i in range(12)
+        ])
+        db.session.commit()
+        Book.query.filter(Book.year < 1995).update({'genre': 'C'})
+        db.session.commit()
+        incremental = stored_counters()
+
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('UPDATE book_stats SET count = 99')  # Simulated drift
+            rebuild_book_stats(conn, test_user.id)
+        assert stored_counters() == incremental
+
+def test_stats_read_does_not_scan_books(authenticated_client, test_user):
+    """Test that the stats read aggregates nothing over the book table."""
+    with captured_statements() as statements:
+        assert authenticated_client.get('/api/books/stats').status_code == 200
+    assert not [s for s in statements if 'count(' in s.lower() or 'GROUP BY' in s]
+    with db.engine.connect() as conn:
+        plan = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT dimension, value, count FROM book_stats "
+            "WHERE user_id = 1 AND count > 0 ORDER BY dimension, count DESC, value").fetchall()
+    assert any('PRIMARY KEY' in row[-1] for row in plan)